@@ -0,0 +1,332 @@
+# apps/accounts/assignment.py
+"""
+Automatic agent assignment for leads and site visits.
+
+Policies (settings.ASSIGNMENT_DEFAULT_POLICY picks the default):
+
+- ``round_robin``: the agent assigned least recently.
+- ``least_loaded``: fewest open leads plus ASSIGNMENT_VISIT_WEIGHT x open
+  visits, from the AgentWorkload counters (see workload.py).
+- ``affinity``: among agents within ASSIGNMENT_AFFINITY_SLACK of the
+  lightest load, the one who has handled the same property most or whose
+  ``specialties`` match its type/location; otherwise least loaded.
+
+More policies can be registered in settings.ASSIGNMENT_POLICIES as
+``{'name': 'dotted.path.to.PolicyClass'}``.
+
+An ``AgentPool`` loads every active agent and their counters in one query.
+An ``Assigner`` keeps the agents in a heap ordered by the policy's key and
+re-pushes only the agent it just picked (stale entries are skipped when
+popped), so a bulk run over n leads and a agents costs O(n log a) in memory
+(affinity also scores the agents within its slack for each item) plus a
+handful of queries for reading, ``bulk_update`` and the counters.
+"""
+import heapq
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import Count
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .workload import apply_workload_deltas, lead_is_open
+
+NEVER = float('-inf')
+
+
+class AgentState:
+    """One agent's counters as the assigner sees them."""
+
+    def __init__(self, id, open_leads=0, open_visits=0, last_assigned=NEVER, specialties=()):
+        self.id = id
+        self.open_leads = open_leads
+        self.open_visits = open_visits
+        self.last_assigned = last_assigned
+        self.specialties = {str(s).strip().lower() for s in specialties or () if str(s).strip()}
+        # Bumped on every change; heap entries with an older version are stale
+        self.version = 0
+
+
+class AgentPool:
+    def __init__(self, agents):
+        self.agents = {agent.id: agent for agent in agents}
+        self.visit_weight = getattr(settings, 'ASSIGNMENT_VISIT_WEIGHT', 1)
+        self._clock = max((agent.last_assigned for agent in agents), default=0)
+        self._clock = max(self._clock, timezone.now().timestamp())
+
+    @classmethod
+    def load(cls, agent_ids=None):
+        """Active agents (optionally only ``agent_ids``) with their workload, in one query."""
+        User = get_user_model()
+        queryset = User.objects.filter(role='agent', is_active=True)
+        if agent_ids is not None:
+            queryset = queryset.filter(pk__in=agent_ids)
+        rows = queryset.values_list(
+            'pk', 'workload__open_leads', 'workload__open_visits', 'workload__last_assigned_at', 'specialties'
+        )
+        return cls([
+            AgentState(pk, open_leads or 0, open_visits or 0,
+                       last_assigned.timestamp() if last_assigned else NEVER, specialties)
+            for pk, open_leads, open_visits, last_assigned, specialties in rows
+        ])
+
+    def load_of(self, agent):
+        return agent.open_leads + self.visit_weight * agent.open_visits
+
+    def record(self, agent, kind):
+        if kind == 'lead':
+            agent.open_leads += 1
+        else:
+            agent.open_visits += 1
+        self._clock += 1e-3
+        agent.last_assigned = self._clock
+        agent.version += 1
+
+    def __len__(self):
+        return len(self.agents)
+
+    def __iter__(self):
+        return iter(self.agents.values())
+
+
+class AssignmentItem:
+    """What a policy may look at when choosing an agent for a lead or visit."""
+
+    def __init__(self, property_id=None, property_type='', location='', text=''):
+        self.property_id = property_id
+        self.tokens = [value.strip().lower() for value in (property_type or '', location or '', text or '') if value.strip()]
+
+    @classmethod
+    def for_property(cls, property, text=''):
+        if property is None:
+            return cls(text=text)
+        return cls(property.pk, property.property_type, property.location, text)
+
+
+class AssignmentPolicy:
+    """Base policy: agents are tried in ascending ``key`` order."""
+    name = None
+
+    def key(self, pool, agent):
+        raise NotImplementedError
+
+    def prepare(self, pool, items):
+        """Load whatever the policy needs for ``items`` before a run."""
+
+    def preferred(self, assigner, item, exclude):
+        """An agent to pick ahead of the heap order, or None."""
+        return None
+
+    def assigned(self, agent, item):
+        """Called after ``agent`` was picked for ``item``."""
+
+
+class RoundRobinPolicy(AssignmentPolicy):
+    name = 'round_robin'
+
+    def key(self, pool, agent):
+        return (agent.last_assigned, agent.id)
+
+
+class LeastLoadedPolicy(AssignmentPolicy):
+    name = 'least_loaded'
+
+    def key(self, pool, agent):
+        return (pool.load_of(agent), agent.last_assigned, agent.id)
+
+
+class AffinityPolicy(LeastLoadedPolicy):
+    name = 'affinity'
+    # Weight of one matching specialty against one earlier lead/visit on the property
+    specialty_weight = 3
+
+    def __init__(self):
+        self.history = defaultdict(Counter)
+        self.slack = getattr(settings, 'ASSIGNMENT_AFFINITY_SLACK', 5)
+        self._specialists_of, self._specialists = None, []
+
+    def prepare(self, pool, items):
+        """Who has handled each property, from leads and visits, in two queries."""
+        from apps.leads.models import Lead
+        from apps.site_visits.models import SiteVisit
+
+        property_ids = {item.property_id for item in items if item.property_id}
+        self.history = defaultdict(Counter)
+        if not property_ids or not len(pool):
+            return
+        for model, agent_field in ((Lead, 'assigned_to'), (SiteVisit, 'agent')):
+            rows = model.objects.filter(
+                property_id__in=property_ids, **{f'{agent_field}__in': list(pool.agents)}
+            ).order_by().values_list('property_id', f'{agent_field}_id').annotate(n=Count('pk'))
+            for property_id, agent_id, n in rows:
+                self.history[property_id][agent_id] += n
+
+    def score(self, agent, item):
+        score = self.history[item.property_id][agent.id] if item.property_id else 0
+        if agent.specialties:
+            score += self.specialty_weight * sum(
+                any(specialty in token for token in item.tokens) for specialty in agent.specialties
+            )
+        return score
+
+    def preferred(self, assigner, item, exclude):
+        lightest = assigner.peek(exclude)
+        if lightest is None:
+            return None
+        pool = assigner.pool
+        if self._specialists_of is not pool:
+            self._specialists_of = pool
+            self._specialists = [agent.id for agent in pool if agent.specialties]
+        # Only earlier handlers of the property and specialists can score
+        candidates = set(self._specialists)
+        if item.property_id:
+            candidates.update(self.history[item.property_id])
+
+        ceiling = pool.load_of(lightest) + self.slack
+        best, best_key = None, None
+        for agent_id in candidates:
+            agent = pool.agents.get(agent_id)
+            if agent is None or agent_id in exclude or pool.load_of(agent) > ceiling:
+                continue
+            score = self.score(agent, item)
+            if score <= 0:
+                continue
+            key = (-score, self.key(pool, agent))
+            if best_key is None or key < best_key:
+                best, best_key = agent, key
+        return best
+
+    def assigned(self, agent, item):
+        if item.property_id:
+            self.history[item.property_id][agent.id] += 1
+
+
+POLICIES = {policy.name: policy for policy in (RoundRobinPolicy, LeastLoadedPolicy, AffinityPolicy)}
+
+
+def policy_names():
+    return [*POLICIES, *getattr(settings, 'ASSIGNMENT_POLICIES', {})]
+
+
+def get_policy(name=None):
+    """A fresh policy instance; raises ValueError for unknown names."""
+    name = name or getattr(settings, 'ASSIGNMENT_DEFAULT_POLICY', 'least_loaded')
+    if name in POLICIES:
+        return POLICIES[name]()
+    extra = getattr(settings, 'ASSIGNMENT_POLICIES', {})
+    if name in extra:
+        return import_string(extra[name])()
+    raise ValueError(f"Unknown assignment policy '{name}'. Choose from: {', '.join(policy_names())}.")
+
+
+class Assigner:
+    """Picks agents for a sequence of items under one policy, updating the pool as it goes."""
+
+    def __init__(self, pool, policy, kind='lead'):
+        self.pool = pool
+        self.policy = policy
+        self.kind = kind
+        self._heap = [(policy.key(pool, agent), agent.id, agent.version) for agent in pool]
+        heapq.heapify(self._heap)
+
+    def peek(self, exclude=()):
+        """The agent at the front of the policy order, skipping ``exclude``."""
+        skipped = []
+        found = None
+        while self._heap:
+            _, agent_id, version = self._heap[0]
+            agent = self.pool.agents[agent_id]
+            if version != agent.version:
+                heapq.heappop(self._heap)
+            elif agent_id in exclude:
+                skipped.append(heapq.heappop(self._heap))
+            else:
+                found = agent
+                break
+        for entry in skipped:
+            heapq.heappush(self._heap, entry)
+        return found
+
+    def choose(self, item, exclude=(), count=1):
+        """Pick an agent for ``item`` (``count`` leads/visits); returns the agent id or None."""
+        agent = self.policy.preferred(self, item, exclude) or self.peek(exclude)
+        if agent is None:
+            return None
+        for _ in range(count):
+            self.pool.record(agent, self.kind)
+        self.policy.assigned(agent, item)
+        heapq.heappush(self._heap, (self.policy.key(self.pool, agent), agent.id, agent.version))
+        return agent.id
+
+
+def choose_agent(kind, property=None, text='', policy=None, exclude=()):
+    """
+    The agent id a single new lead or visit should go to, or None when no
+    active agent is available. The counters are updated by the signals once
+    the lead/visit is saved.
+    """
+    pool = AgentPool.load()
+    policy = get_policy(policy)
+    item = AssignmentItem.for_property(property, text)
+    policy.prepare(pool, [item])
+    return Assigner(pool, policy, kind).choose(item, exclude=set(exclude))
+
+
+def bulk_assign_leads(queryset, policy=None, dry_run=False, notify=True):
+    """
+    Assign every unassigned lead in ``queryset`` in one pass: the leads are
+    read once, agents picked in memory, written with ``bulk_update`` and the
+    workload counters updated with one UPDATE. Agents get one digest email
+    each instead of one per lead. Returns a report.
+    """
+    from apps.leads.models import Lead
+    from apps.leads.utils import lead_assignment_digest
+    from apps.core.email import queue_emails
+
+    policy = get_policy(policy)
+    with transaction.atomic():
+        rows = list(
+            queryset.filter(assigned_to=None).select_for_update(skip_locked=True, of=('self',))
+            .order_by('created_at', 'pk')
+            .values_list('pk', 'status', 'name', 'phone', 'interest',
+                         'property_id', 'property__property_type', 'property__location')
+        )
+        pool = AgentPool.load()
+        items = [AssignmentItem(row[5], row[6], row[7], row[4]) for row in rows]
+        policy.prepare(pool, items)
+        assigner = Assigner(pool, policy, 'lead')
+
+        now = timezone.now()
+        updates = []
+        deltas = defaultdict(Counter)
+        per_agent = defaultdict(list)
+        for row, item in zip(rows, items):
+            agent_id = assigner.choose(item)
+            if agent_id is None:
+                break
+            updates.append(Lead(pk=row[0], assigned_to_id=agent_id, updated_at=now))
+            if lead_is_open(row[1]):
+                deltas[agent_id]['open_leads'] += 1
+            per_agent[agent_id].append({'name': row[2], 'phone': row[3], 'status': row[1], 'interest': row[4]})
+
+        report = {
+            'policy': policy.name,
+            'dry_run': dry_run,
+            'assigned': len(updates),
+            'unassigned': len(rows) - len(updates),
+            'agents': {agent_id: len(leads) for agent_id, leads in per_agent.items()},
+        }
+        if dry_run or not updates:
+            return report
+
+        # bulk_update skips the signals that keep counters and send emails
+        Lead.objects.bulk_update(updates, ['assigned_to', 'updated_at'], batch_size=1000)
+        apply_workload_deltas(deltas, assigned=list(per_agent))
+        if notify:
+            User = get_user_model()
+            agents = User.objects.filter(pk__in=list(per_agent)).exclude(email='').values('pk', 'first_name', 'username', 'email')
+            queue_emails([lead_assignment_digest(agent, per_agent[agent['pk']]) for agent in agents],
+                         'lead assignment digests')
+    return report
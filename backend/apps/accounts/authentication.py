@@ -1,14 +1,90 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import DEFAULT_DB_ALIAS
+from django.utils.translation import gettext_lazy as _
 from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+from .user_cache import user_cache
+
+# Claims added by CustomTokenObtainPairSerializer.get_token
+CLAIM_FIELDS = ('username', 'email', 'role', 'is_superuser')
+
+
+def user_from_claims(validated_token):
+    """
+    Build a ``User`` from the token claims without touching the database.
+    Every other field is deferred; the first access to one loads the whole
+    row from the user cache (see User.refresh_from_db).
+    """
+    User = get_user_model()
+    field_names = ['id', *CLAIM_FIELDS, 'is_active']
+    values = [validated_token[api_settings.USER_ID_CLAIM], *(validated_token[claim] for claim in CLAIM_FIELDS), True]
+    return User.from_db(DEFAULT_DB_ALIAS, field_names, values)
+
 
 class CookieJWTAuthentication(JWTAuthentication):
+    """
+    Reads the access token from the Authorization header, falling back to the
+    access_token cookie.
+
+    The validated token is memoized on the request, so authenticating the
+    same request twice (e.g. the profiling middleware and then the view)
+    decodes it once. How the user is resolved depends on
+    settings.AUTH_USER_RESOLUTION:
+
+    - 'db': one SELECT per request (SimpleJWT default)
+    - 'cache': process-local TTL cache of user rows
+    - 'claims': built from the token claims, no query unless the view reads
+      a field the token does not carry; falls back to 'cache' when the user
+      was changed in this process after the token was issued. The user is
+      taken as active and CHECK_USER_IS_ACTIVE/CHECK_REVOKE_TOKEN are not
+      applied, so deactivation or a password change in another process only
+      takes effect when the access token expires.
+    """
+
     def authenticate(self, request):
-        # Try to get the token from the Authorization header first
         header = self.get_header(request)
         if header is not None:
-            return super().authenticate(request)
-        # If not present, try to get the token from the cookie
-        raw_token = request.COOKIES.get('access_token')
-        if raw_token is not None:
-            validated_token = self.get_validated_token(raw_token)
-            return self.get_user(validated_token), validated_token
-        return None
+            raw_token = self.get_raw_token(header)
+        else:
+            raw_token = request.COOKIES.get(settings.SIMPLE_JWT.get('AUTH_COOKIE', 'access_token'))
+        if raw_token is None:
+            return None
+
+        validated_token = self.get_validated_token_once(request, raw_token)
+        return self.get_user(validated_token), validated_token
+
+    def get_validated_token_once(self, request, raw_token):
+        http_request = getattr(request, '_request', request)
+        validated = http_request.__dict__.setdefault('_validated_jwt', {})
+        if raw_token not in validated:
+            validated[raw_token] = self.get_validated_token(raw_token)
+        return validated[raw_token]
+
+    def get_user(self, validated_token):
+        mode = getattr(settings, 'AUTH_USER_RESOLUTION', 'cache')
+        if mode == 'db':
+            return super().get_user(validated_token)
+
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(_("Token contained no recognizable user identification"))
+
+        if (mode == 'claims'
+                and all(claim in validated_token for claim in CLAIM_FIELDS)
+                and not user_cache.changed_since(user_id, validated_token.get('iat'))):
+            return user_from_claims(validated_token)
+
+        user = user_cache.get(user_id)
+        if user is None:
+            raise AuthenticationFailed(_("User not found"), code="user_not_found")
+        if api_settings.CHECK_USER_IS_ACTIVE and not user.is_active:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+        if api_settings.CHECK_REVOKE_TOKEN and \
+                validated_token.get(api_settings.REVOKE_TOKEN_CLAIM) != get_md5_hash_password(user.password):
+            raise AuthenticationFailed(_("The user's password has been changed."), code="password_changed")
+        return user
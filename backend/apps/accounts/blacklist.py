@@ -0,0 +1,238 @@
+# apps/accounts/blacklist.py
+"""
+Bounded refresh-token blacklist.
+
+Every refresh rotates the token and blacklists the old one, so SimpleJWT's
+OutstandingToken/BlacklistedToken tables grow with every login forever and
+each refresh checks them with a join. Two things keep that flat:
+
+- ``prune_expired_tokens`` deletes rows whose token has expired (an expired
+  token is rejected by its ``exp`` claim anyway). It runs from the
+  ``prune_token_blacklist`` command and, at most once per
+  TOKEN_BLACKLIST_PRUNE_INTERVAL, in a background thread after a refresh.
+- ``token_blacklist`` keeps a Bloom filter of the JTIs of unexpired
+  blacklisted tokens. A token the filter has never seen is not blacklisted,
+  so only filter hits (real ones and the rare false positive) reach the DB.
+  Tokens blacklisted by other worker processes are picked up by an indexed
+  ``id > last seen id`` query every TOKEN_BLACKLIST_SYNC_INTERVAL seconds;
+  set it to 0 to sync before every check.
+"""
+import hashlib
+import math
+import threading
+import time
+
+from django.conf import settings
+from django.db import connection, connections
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+from rest_framework_simplejwt.tokens import RefreshToken
+
+
+class BloomFilter:
+    """Fixed-size Bloom filter over strings (double hashing on a BLAKE2b digest)."""
+
+    def __init__(self, capacity, error_rate=0.001):
+        self.capacity = max(int(capacity), 1)
+        self.error_rate = error_rate
+        self.size = max(int(-self.capacity * math.log(error_rate) / math.log(2) ** 2), 8)
+        self.hashes = max(int(round(self.size / self.capacity * math.log(2))), 1)
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, item):
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        first, second = int.from_bytes(digest[:8], 'little'), int.from_bytes(digest[8:], 'little') | 1
+        return ((first + i * second) % self.size for i in range(self.hashes))
+
+    def add(self, item):
+        for position in self._positions(item):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, item):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(item))
+
+    def estimated_error_rate(self):
+        return (1 - math.exp(-self.hashes * self.count / self.size)) ** self.hashes
+
+
+class TokenBlacklist:
+    """Process-local filter of blacklisted JTIs, backed by the BlacklistedToken table."""
+
+    def __init__(self):
+        self._filter = None
+        self._last_id = 0
+        self._synced_at = 0.0
+        self._built_at = 0.0
+        self._lock = threading.Lock()
+        self.db_checks = 0
+        self.filtered_checks = 0
+
+    @property
+    def sync_interval(self):
+        return getattr(settings, 'TOKEN_BLACKLIST_SYNC_INTERVAL', 5)
+
+    @property
+    def rebuild_interval(self):
+        # Expired JTIs can't be removed from a Bloom filter; rebuilding once
+        # per refresh lifetime drops them
+        return jwt_settings.REFRESH_TOKEN_LIFETIME.total_seconds()
+
+    def _rebuild(self):
+        # Rows past ``last_id`` are left to _sync, so none can be missed in between
+        last_id = BlacklistedToken.objects.order_by('-id').values_list('id', flat=True).first() or 0
+        active = BlacklistedToken.objects.filter(id__lte=last_id, token__expires_at__gt=timezone.now())
+        rows = list(active.values_list('id', 'token__jti'))
+        capacity = max(getattr(settings, 'TOKEN_BLACKLIST_FILTER_CAPACITY', 100000), 2 * len(rows))
+        bloom = BloomFilter(capacity, getattr(settings, 'TOKEN_BLACKLIST_FILTER_ERROR_RATE', 0.001))
+        for _, jti in rows:
+            bloom.add(jti)
+        self._filter = bloom
+        self._last_id = last_id
+        self._built_at = self._synced_at = time.monotonic()
+
+    def _sync(self):
+        now = time.monotonic()
+        if self._filter is None or now - self._built_at >= self.rebuild_interval:
+            self._rebuild()
+            return
+        if now - self._synced_at < self.sync_interval:
+            return
+        rows = BlacklistedToken.objects.filter(id__gt=self._last_id).order_by('id').values_list('id', 'token__jti')
+        for pk, jti in rows:
+            self._filter.add(jti)
+            self._last_id = pk
+        self._synced_at = now
+        if self._filter.count > self._filter.capacity:
+            self._rebuild()
+
+    def might_contain(self, jti):
+        with self._lock:
+            self._sync()
+            return jti in self._filter
+
+    def add(self, jti):
+        with self._lock:
+            if self._filter is not None:
+                self._filter.add(jti)
+
+    def is_blacklisted(self, jti):
+        if not self.might_contain(jti):
+            self.filtered_checks += 1
+            return False
+        self.db_checks += 1
+        return BlacklistedToken.objects.filter(token__jti=jti).exists()
+
+    def reset(self):
+        with self._lock:
+            self._filter = None
+            self._last_id = 0
+
+    def stats(self):
+        bloom = self._filter
+        return {
+            'insertions': bloom.count if bloom else 0,
+            'capacity': bloom.capacity if bloom else 0,
+            'size_bytes': len(bloom.bits) if bloom else 0,
+            'hashes': bloom.hashes if bloom else 0,
+            'estimated_error_rate': round(bloom.estimated_error_rate(), 6) if bloom else 0,
+            'checks_answered_in_memory': self.filtered_checks,
+            'checks_sent_to_db': self.db_checks,
+        }
+
+
+token_blacklist = TokenBlacklist()
+
+
+class FilteredRefreshToken(RefreshToken):
+    """RefreshToken whose blacklist check goes through ``token_blacklist`` first."""
+
+    def check_blacklist(self):
+        if token_blacklist.is_blacklisted(self.payload[jwt_settings.JTI_CLAIM]):
+            raise TokenError(_("Token is blacklisted"))
+
+    def blacklist(self):
+        result = super().blacklist()
+        token_blacklist.add(self.payload[jwt_settings.JTI_CLAIM])
+        return result
+
+
+def prune_expired_tokens(batch_size=5000, dry_run=False):
+    """
+    Delete outstanding tokens (and their blacklist rows) that have expired,
+    ``batch_size`` rows per statement so a large backlog never holds long
+    locks. Returns ``{'outstanding': n, 'blacklisted': n}``.
+    """
+    expired = OutstandingToken.objects.filter(expires_at__lte=timezone.now())
+    if dry_run:
+        return {
+            'outstanding': expired.count(),
+            'blacklisted': BlacklistedToken.objects.filter(token__in=expired).count(),
+        }
+
+    deleted = {'outstanding': 0, 'blacklisted': 0}
+    while True:
+        ids = list(expired.order_by('id').values_list('id', flat=True)[:batch_size])
+        if not ids:
+            break
+        deleted['blacklisted'] += BlacklistedToken.objects.filter(token_id__in=ids).delete()[0]
+        deleted['outstanding'] += OutstandingToken.objects.filter(id__in=ids).delete()[0]
+    return deleted
+
+
+_last_prune = 0.0
+_prune_lock = threading.Lock()
+
+
+def _prune_in_background():
+    try:
+        prune_expired_tokens(getattr(settings, 'TOKEN_BLACKLIST_PRUNE_BATCH_SIZE', 5000))
+    except Exception as e:
+        print(f"Token blacklist pruning failed: {e}")
+    finally:
+        connections.close_all()
+
+
+def maybe_prune():
+    """Start a background prune if this process hasn't run one in TOKEN_BLACKLIST_PRUNE_INTERVAL seconds."""
+    global _last_prune
+    interval = getattr(settings, 'TOKEN_BLACKLIST_PRUNE_INTERVAL', 3600)
+    if not interval:
+        return False
+    with _prune_lock:
+        now = time.monotonic()
+        if _last_prune and now - _last_prune < interval:
+            return False
+        _last_prune = now
+    threading.Thread(target=_prune_in_background, name='token-blacklist-prune', daemon=True).start()
+    return True
+
+
+def _table_bytes(model):
+    if connection.vendor != 'postgresql':
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT pg_total_relation_size(%s)", [model._meta.db_table])
+        return cursor.fetchone()[0]
+
+
+def blacklist_stats():
+    """Row counts and on-disk size of the token tables, plus the in-memory filter state."""
+    now = timezone.now()
+    return {
+        'outstanding_tokens': {
+            'rows': OutstandingToken.objects.count(),
+            'expired': OutstandingToken.objects.filter(expires_at__lte=now).count(),
+            'table_bytes': _table_bytes(OutstandingToken),
+        },
+        'blacklisted_tokens': {
+            'rows': BlacklistedToken.objects.count(),
+            'active': BlacklistedToken.objects.filter(token__expires_at__gt=now).count(),
+            'table_bytes': _table_bytes(BlacklistedToken),
+        },
+        'filter': token_blacklist.stats(),
+    }
@@ -0,0 +1,62 @@
+# apps/accounts/hashing.py
+"""
+Password hashing in a pool of worker processes.
+
+Kept free of model imports: the workers import this module before Django is
+set up. They are started through forkserver (or spawn), so they never
+inherit the parent's database connections.
+"""
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+
+# Below this many passwords, handing work to other processes costs more than it saves
+PROCESS_POOL_MIN_PASSWORDS = 8
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _init_worker(settings_module):
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', settings_module)
+    import django
+    django.setup()
+
+
+def worker_count():
+    return getattr(settings, 'USER_PROVISIONING_HASH_WORKERS', None) or os.cpu_count() or 1
+
+
+def _get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            methods = multiprocessing.get_all_start_methods()
+            context = multiprocessing.get_context('forkserver' if 'forkserver' in methods else 'spawn')
+            _pool = ProcessPoolExecutor(
+                max_workers=worker_count(),
+                mp_context=context,
+                initializer=_init_worker,
+                initargs=(os.environ.get('DJANGO_SETTINGS_MODULE', 'crmSrc.settings'),),
+            )
+        return _pool
+
+
+def hash_passwords(passwords):
+    """``make_password`` for each password, spread across worker processes."""
+    global _pool
+    if len(passwords) < PROCESS_POOL_MIN_PASSWORDS or worker_count() < 2:
+        return [make_password(password) for password in passwords]
+    try:
+        pool = _get_pool()
+        chunksize = max(1, len(passwords) // (pool._max_workers * 4))
+        return list(pool.map(make_password, passwords, chunksize=chunksize))
+    except Exception as e:
+        print(f"Password hashing pool failed, hashing in process: {e}")
+        with _pool_lock:
+            _pool = None
+        return [make_password(password) for password in passwords]
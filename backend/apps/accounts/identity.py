@@ -0,0 +1,238 @@
+# apps/accounts/identity.py
+"""
+Client identity resolution for site-visit bookings.
+
+Client users carry a normalized phone (E.164) and lowercased email in
+``phone_normalized``/``email_normalized``, both unique, so a booking finds
+its client with one indexed lookup. ``resolve_client`` reads the ids of the
+identity match and the usernames a new client could clash with in the same
+query (only those columns: common names share a prefix with many users),
+then loads the matched client or inserts a new one; the unique indexes make
+concurrent bookings for the same person end up on the same row.
+
+Saving an existing user never fails on those indexes: a phone/email another
+user already has is left empty (``User.drop_taken_identity``), and profile
+edits that would take one over are rejected by ``UserSerializer``.
+"""
+import re
+import uuid
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+
+# Generated for clients booked without an email; never used to identify anyone
+PLACEHOLDER_EMAIL_DOMAIN = 'example.com'
+
+_NON_DIGITS = re.compile(r'\D')
+
+
+def normalize_phone(raw, country_code=None):
+    """
+    Return ``raw`` in E.164 form ('+919812345678'), or None if it doesn't
+    look like a phone number. Numbers without a country code get
+    DEFAULT_PHONE_COUNTRY_CODE; a leading trunk '0' is dropped.
+    """
+    if not raw:
+        return None
+    raw = str(raw).strip()
+    digits = _NON_DIGITS.sub('', raw)
+    if raw.startswith('+'):
+        pass
+    elif digits.startswith('00'):
+        digits = digits[2:]
+    else:
+        country_code = country_code or getattr(settings, 'DEFAULT_PHONE_COUNTRY_CODE', '91')
+        digits = country_code + digits.lstrip('0')
+    if not 8 <= len(digits) <= 15 or digits.startswith('0'):
+        return None
+    return f'+{digits}'
+
+
+def normalize_email(raw):
+    if not raw or '@' not in raw:
+        return None
+    email = str(raw).strip().lower()
+    if email.endswith('@' + PLACEHOLDER_EMAIL_DOMAIN):
+        return None
+    return email
+
+
+def username_base(name):
+    base = name.strip().lower().replace(" ", "_").replace("@", "_at_").replace(".", "_dot_")
+    base = re.sub(r'[^\w+-]', '', base)
+    return base[:140] or 'client'
+
+
+def next_free_username(base, taken):
+    """``base``, or ``base_N`` with N one past the highest suffix in ``taken``."""
+    if base not in taken:
+        return base
+    pattern = re.compile(rf'^{re.escape(base)}_(\d+)$')
+    suffixes = [int(match.group(1)) for match in map(pattern.match, taken) if match]
+    return f"{base}_{max(suffixes, default=0) + 1}"
+
+
+def _lookup(phone, email, base):
+    """
+    Users matching the phone/email, and usernames starting with ``base``: one
+    query for the ids and usernames, one more for the matched users.
+    """
+    User = get_user_model()
+    condition = Q(username__startswith=base)
+    if phone:
+        condition |= Q(phone_normalized=phone)
+    if email:
+        condition |= Q(email_normalized=email)
+    # Common names share a prefix with many users: read only what's compared
+    matched, taken = {}, set()
+    for pk, username, user_phone, user_email in User.objects.filter(condition).values_list(
+        'pk', 'username', 'phone_normalized', 'email_normalized',
+    ):
+        taken.add(username)
+        if phone and user_phone == phone:
+            matched['phone'] = pk
+        if email and user_email == email:
+            matched['email'] = pk
+    matches = {}
+    if matched:
+        users = User.objects.in_bulk(set(matched.values()))
+        matches = {key: users[pk] for key, pk in matched.items() if pk in users}
+    return matches, taken
+
+
+def taken_identity(user):
+    """
+    The normalized identity fields of ``user`` ('phone_normalized',
+    'email_normalized') that another user already has.
+    """
+    condition = Q()
+    if user.phone_normalized:
+        condition |= Q(phone_normalized=user.phone_normalized)
+    if user.email_normalized:
+        condition |= Q(email_normalized=user.email_normalized)
+    if not condition:
+        return set()
+    taken = set()
+    others = get_user_model().objects.filter(condition).exclude(pk=user.pk)
+    for phone, email in others.values_list('phone_normalized', 'email_normalized'):
+        if phone and phone == user.phone_normalized:
+            taken.add('phone_normalized')
+        if email and email == user.email_normalized:
+            taken.add('email_normalized')
+    return taken
+
+
+def _new_client(name, username, phone, email, raw_phone, raw_email):
+    User = get_user_model()
+    parts = name.split(' ')
+    client = User(
+        username=username,
+        first_name=parts[0],
+        last_name=" ".join(parts[1:]),
+        email=raw_email.strip() if email else f'{username}@{PLACEHOLDER_EMAIL_DOMAIN}',
+        phone_number=(raw_phone or '').strip()[:20] if phone else '',
+        role='client',
+    )
+    client.set_unusable_password()
+    return client
+
+
+def resolve_client(name, phone=None, email=None):
+    """
+    Find the client user for a booking by phone or email, creating one if
+    needed. Returns ``(user, created)``.
+
+    An existing client costs two queries (lookup and load), a new one two
+    (lookup and INSERT).
+    The unique indexes settle races: if a concurrent booking inserted the
+    same phone/email or took the username first, the INSERT fails inside a
+    savepoint and the lookup runs again, finding that client or falling back
+    to a random username suffix.
+    """
+    normalized_phone = normalize_phone(phone)
+    normalized_email = normalize_email(email)
+    base = username_base(name)
+
+    for attempt in range(3):
+        matches, taken = _lookup(normalized_phone, normalized_email, base)
+        existing = matches.get('phone') or matches.get('email')
+        if existing:
+            return existing, False
+
+        username = next_free_username(base, taken) if attempt == 0 else f"{base}_{uuid.uuid4().hex[:8]}"
+        client = _new_client(name, username, normalized_phone, normalized_email, phone, email)
+        try:
+            with transaction.atomic():
+                client.save()
+        except IntegrityError:
+            continue
+        return client, True
+    raise IntegrityError(f"Could not create a client user for '{name}'")
+
+
+def resolve_clients(entries):
+    """
+    Batch form of ``resolve_client`` for bulk bookings. ``entries`` are
+    (name, phone, email) tuples; returns ``[(user, created), ...]`` in the
+    same order, with repeated people mapped to one user.
+
+    The ids of existing clients and the usernames new ones could clash with
+    are read in one query, the matched clients loaded in another and the new
+    clients inserted with one ``bulk_create``. If a
+    concurrent booking wins a unique index in between, the batch falls back
+    to ``resolve_client`` per entry.
+    """
+    User = get_user_model()
+    normalized = [(name, normalize_phone(phone), normalize_email(email), phone, email) for name, phone, email in entries]
+    phones = {phone for _, phone, _, _, _ in normalized if phone}
+    emails = {email for _, _, email, _, _ in normalized if email}
+    bases = {username_base(name) for name, *_ in normalized}
+
+    condition = Q(phone_normalized__in=phones) | Q(email_normalized__in=emails)
+    for base in bases:
+        condition |= Q(username__startswith=base)
+    phone_ids, email_ids, taken = {}, {}, set()
+    for pk, username, user_phone, user_email in User.objects.filter(condition).values_list(
+        'pk', 'username', 'phone_normalized', 'email_normalized',
+    ):
+        taken.add(username)
+        if user_phone in phones:
+            phone_ids[user_phone] = pk
+        if user_email in emails:
+            email_ids[user_email] = pk
+    # Full rows only for the clients actually returned
+    users = User.objects.in_bulk({*phone_ids.values(), *email_ids.values()}) if phone_ids or email_ids else {}
+    by_phone = {phone: users[pk] for phone, pk in phone_ids.items() if pk in users}
+    by_email = {email: users[pk] for email, pk in email_ids.items() if pk in users}
+
+    results, new_clients = [], []
+    for name, phone, email, raw_phone, raw_email in normalized:
+        user = (phone and by_phone.get(phone)) or (email and by_email.get(email))
+        if user:
+            results.append((user, False))
+            continue
+        username = next_free_username(username_base(name), taken)
+        taken.add(username)
+        user = _new_client(name, username, phone, email, raw_phone, raw_email)
+        user.sync_identity()  # bulk_create skips save()
+        new_clients.append(user)
+        if phone:
+            by_phone[phone] = user
+        if email:
+            by_email[email] = user
+        results.append((user, True))
+
+    if new_clients:
+        try:
+            with transaction.atomic():
+                User.objects.bulk_create(new_clients)
+        except IntegrityError:
+            return [resolve_client(name, phone, email) for name, phone, email in entries]
+        if any(user.pk is None for user in new_clients):
+            # Backends that can't return primary keys from bulk inserts
+            ids = dict(User.objects.filter(username__in=[user.username for user in new_clients]).values_list('username', 'id'))
+            for user in new_clients:
+                user.pk = ids[user.username]
+    return results
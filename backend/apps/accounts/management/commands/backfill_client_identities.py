@@ -0,0 +1,44 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = "Fill the normalized phone/email columns of client users (after upgrading, or after raw bulk imports)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        User = get_user_model()
+        taken_phones = set(User.objects.exclude(phone_normalized=None).values_list('phone_normalized', flat=True))
+        taken_emails = set(User.objects.exclude(email_normalized=None).values_list('email_normalized', flat=True))
+
+        updated, duplicates, batch = 0, [], []
+        clients = User.objects.filter(role='client', phone_normalized=None, email_normalized=None).order_by('pk')
+        for user in clients.only('pk', 'username', 'role', 'phone_number', 'email').iterator(chunk_size=options['batch_size']):
+            user.sync_identity()
+            # The oldest client keeps a shared phone/email; later ones are reported for merging
+            if user.phone_normalized in taken_phones or user.email_normalized in taken_emails:
+                duplicates.append(user.username)
+                if user.phone_normalized in taken_phones:
+                    user.phone_normalized = None
+                if user.email_normalized in taken_emails:
+                    user.email_normalized = None
+            if user.phone_normalized is None and user.email_normalized is None:
+                continue
+            if user.phone_normalized:
+                taken_phones.add(user.phone_normalized)
+            if user.email_normalized:
+                taken_emails.add(user.email_normalized)
+            batch.append(user)
+            if len(batch) >= options['batch_size']:
+                updated += User.objects.bulk_update(batch, ['phone_normalized', 'email_normalized'])
+                batch = []
+        if batch:
+            updated += User.objects.bulk_update(batch, ['phone_normalized', 'email_normalized'])
+
+        self.stdout.write(self.style.SUCCESS(f"Filled client identity for {updated} users."))
+        if duplicates:
+            self.stdout.write(self.style.WARNING(
+                f"{len(duplicates)} clients share a phone or email with an older client: {', '.join(duplicates[:20])}"
+            ))
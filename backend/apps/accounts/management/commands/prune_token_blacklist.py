@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+
+from apps.accounts.blacklist import blacklist_stats, prune_expired_tokens
+
+
+class Command(BaseCommand):
+    help = "Delete expired outstanding and blacklisted refresh tokens and report the token table sizes."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=5000, help="Rows deleted per statement")
+        parser.add_argument('--dry-run', action='store_true', help="Only count what would be deleted")
+        parser.add_argument('--stats', action='store_true', help="Only report table sizes")
+
+    def handle(self, *args, **options):
+        if not options['stats']:
+            result = prune_expired_tokens(options['batch_size'], dry_run=options['dry_run'])
+            verb = "Would delete" if options['dry_run'] else "Deleted"
+            self.stdout.write(self.style.SUCCESS(
+                f"{verb} {result['outstanding']} expired outstanding tokens "
+                f"({result['blacklisted']} blacklisted)."
+            ))
+
+        stats = blacklist_stats()
+        for table in ('outstanding_tokens', 'blacklisted_tokens'):
+            sizes = stats[table]
+            size = f", {sizes['table_bytes'] / 1024:.0f} KiB" if sizes['table_bytes'] is not None else ''
+            extra = ', '.join(f"{key} {value}" for key, value in sizes.items() if key not in ('rows', 'table_bytes'))
+            self.stdout.write(f"{table}: {sizes['rows']} rows ({extra}{size})")
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from apps.accounts.workload import reconcile_agent_workloads
+
+
+class Command(BaseCommand):
+    help = "Recompute per-agent open lead and open site-visit counters from the source tables."
+
+    def handle(self, *args, **options):
+        updated = reconcile_agent_workloads()
+        self.stdout.write(self.style.SUCCESS(f"Reconciled workload counters for {updated} agents."))
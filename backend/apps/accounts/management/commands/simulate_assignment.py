@@ -0,0 +1,160 @@
+import json
+import time
+from collections import Counter, defaultdict
+
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+
+from apps.accounts.assignment import (
+    NEVER, AffinityPolicy, AgentPool, AgentState, Assigner, AssignmentItem, bulk_assign_leads, get_policy, policy_names,
+)
+
+PROPERTY_TYPES = ('house', 'commercial', 'land')
+LOCATIONS = ('Whitefield', 'Koramangala', 'Indiranagar', 'Hebbal', 'Sarjapur', 'Yelahanka', 'Electronic City')
+
+
+class Rollback(Exception):
+    pass
+
+
+def jain_index(values):
+    """Jain's fairness index: 1.0 when every agent carries the same load, 1/n when one carries it all."""
+    values = np.asarray(values, dtype=float)
+    if not values.any():
+        return 1.0
+    return float(values.sum() ** 2 / (len(values) * (values ** 2).sum()))
+
+
+def _last_assigned(rng):
+    # Half the agents have never been assigned anything
+    return NEVER if rng.random() < 0.5 else float(rng.integers(1_600_000_000, 1_700_000_000))
+
+
+def synthetic_run(policy_name, leads, agents, properties, load_spread, seed):
+    """Assign ``leads`` synthetic leads in memory and measure throughput and fairness."""
+    rng = np.random.default_rng(seed)
+    property_types = rng.choice(PROPERTY_TYPES, size=properties)
+    property_locations = rng.choice(LOCATIONS, size=properties)
+
+    states = []
+    for agent_id in range(1, agents + 1):
+        specialties = []
+        if rng.random() < 0.3:
+            specialties.append(str(rng.choice(PROPERTY_TYPES)))
+        if rng.random() < 0.3:
+            specialties.append(str(rng.choice(LOCATIONS)))
+        states.append(AgentState(agent_id, int(rng.integers(0, load_spread + 1)), 0, _last_assigned(rng), specialties))
+    initial = np.array([state.open_leads for state in states])
+
+    picks = rng.integers(0, properties, size=leads)
+    items = [AssignmentItem(int(p) + 1, property_types[p], property_locations[p]) for p in picks]
+
+    pool = AgentPool(states)
+    policy = get_policy(policy_name)
+    # Earlier handlers per property, as AffinityPolicy.prepare would load them
+    scorer = AffinityPolicy()
+    for property_id in range(1, properties + 1):
+        for agent_id in rng.choice(agents, size=min(2, agents), replace=False):
+            scorer.history[property_id][int(agent_id) + 1] += int(rng.integers(1, 4))
+    if isinstance(policy, AffinityPolicy):
+        policy.history = defaultdict(Counter, {pid: handlers.copy() for pid, handlers in scorer.history.items()})
+
+    assigner = Assigner(pool, policy, 'lead')
+    started = time.perf_counter()
+    chosen = [assigner.choose(item) for item in items]
+    elapsed = time.perf_counter() - started
+
+    matches = sum(scorer.score(pool.agents[agent_id], item) > 0 for agent_id, item in zip(chosen, items))
+    final = np.array([state.open_leads for state in states])
+    added = final - initial
+    return {
+        'policy': policy.name,
+        'assignments': len(chosen),
+        'seconds': round(elapsed, 4),
+        'per_second': round(len(chosen) / elapsed) if elapsed else None,
+        'jain_final_load': round(jain_index(final), 4),
+        'jain_new_assignments': round(jain_index(added), 4),
+        'final_load_min': int(final.min()),
+        'final_load_max': int(final.max()),
+        'final_load_std': round(float(final.std()), 2),
+        'affinity_match_rate': round(matches / len(chosen), 4) if chosen else 0,
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        "Simulate the lead assignment policies on synthetic agents and leads and report "
+        "throughput and fairness (Jain's index, load spread, affinity match rate). With "
+        "--database, also time bulk assignment of the real unassigned leads and roll it back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--policies', nargs='*', default=[], help=f"Policies to run (default: {', '.join(policy_names())})")
+        parser.add_argument('--leads', type=int, default=10000)
+        parser.add_argument('--agents', type=int, default=50)
+        parser.add_argument('--properties', type=int, default=500)
+        parser.add_argument('--load-spread', type=int, default=20, help="Agents start with 0..N open leads")
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--database', action='store_true', help="Also run bulk_assign_leads on the database (rolled back)")
+        parser.add_argument('--output', help="Write the results to this JSON file")
+
+    def handle(self, *args, **options):
+        policies = options['policies'] or policy_names()
+        for name in policies:
+            try:
+                get_policy(name)
+            except ValueError as e:
+                raise CommandError(str(e))
+
+        results = {'synthetic': [], 'database': []}
+        self.stdout.write(self.style.MIGRATE_HEADING(
+            f"Synthetic: {options['leads']} leads, {options['agents']} agents, {options['properties']} properties"
+        ))
+        for name in policies:
+            result = synthetic_run(name, options['leads'], options['agents'], options['properties'],
+                                   options['load_spread'], options['seed'])
+            results['synthetic'].append(result)
+            self.stdout.write(
+                f"{name:<14} {result['per_second'] or 0:>9}/s  jain {result['jain_final_load']:.3f} "
+                f"(new {result['jain_new_assignments']:.3f})  load {result['final_load_min']}-{result['final_load_max']} "
+                f"sd {result['final_load_std']}  affinity {result['affinity_match_rate']:.1%}"
+            )
+
+        if options['database']:
+            from apps.leads.models import Lead
+            self.stdout.write(self.style.MIGRATE_HEADING(
+                f"Database: {Lead.objects.filter(assigned_to=None).count()} unassigned leads (rolled back)"
+            ))
+            for name in policies:
+                result = self._database_run(name)
+                results['database'].append(result)
+                self.stdout.write(
+                    f"{name:<14} {result['assigned']:>7} assigned in {result['seconds']:.3f}s "
+                    f"with {result['queries']} queries"
+                )
+
+        if options['output']:
+            with open(options['output'], 'w') as fh:
+                json.dump(results, fh, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"Results written to {options['output']}"))
+
+    def _database_run(self, name):
+        from apps.leads.models import Lead
+        result = {}
+        try:
+            with transaction.atomic():
+                with CaptureQueriesContext(connection) as queries:
+                    started = time.perf_counter()
+                    report = bulk_assign_leads(Lead.objects.all(), policy=name, notify=False)
+                    result = {
+                        'policy': name,
+                        'assigned': report['assigned'],
+                        'seconds': round(time.perf_counter() - started, 4),
+                        'queries': len(queries),
+                    }
+                raise Rollback()
+        except Rollback:
+            pass
+        return result
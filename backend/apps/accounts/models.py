@@ -27,6 +27,15 @@ class User(AbstractUser):
     updated_at = models.DateTimeField(auto_now=True)
     password_last_changed_at = models.DateTimeField(null=True, blank=True)
 
+    # Client identity (see identity.py): E.164 phone and lowercased email,
+    # filled in save() for role 'client' only, so staff never collide
+    phone_normalized = models.CharField(max_length=16, null=True, blank=True, unique=True, editable=False)
+    email_normalized = models.CharField(max_length=254, null=True, blank=True, unique=True, editable=False)
+
+    # Property types / locations an agent specializes in, e.g. ['commercial', 'Whitefield'];
+    # used by the affinity assignment policy (see assignment.py)
+    specialties = models.JSONField(default=list, blank=True)
+
     # Specify USERNAME_FIELD and REQUIRED_FIELDS
     # email is already a field in AbstractUser, as are first_name and last_name
     # USERNAME_FIELD = 'username' # This is the default in AbstractUser
@@ -35,6 +44,11 @@ class User(AbstractUser):
     
     class Meta:
         db_table = 'users'
+        indexes = [
+            # Team directory / agent roster: filter by role and active flag,
+            # ordered by username for cursor pagination
+            models.Index(fields=['role', 'is_active', 'username'], name='users_role_active_idx'),
+        ]
         
     def __str__(self):
         return f"{self.get_full_name()} ({self.get_role_display()})"
@@ -52,5 +66,62 @@ class User(AbstractUser):
         # Automatically set superusers as admins
         if self.is_superuser and self.role != UserRole.ADMIN:
             self.role = UserRole.ADMIN
+        self.sync_identity()
+        update_fields = kwargs.get('update_fields')
+        identity_changed = update_fields is None or {'phone_number', 'email', 'role'} & set(update_fields)
+        if identity_changed and not self._state.adding:
+            # New clients keep failing on the unique index: that's how
+            # concurrent bookings find each other (see identity.resolve_client)
+            self.drop_taken_identity()
+        if update_fields is not None and identity_changed:
+            kwargs['update_fields'] = {*update_fields, 'phone_normalized', 'email_normalized'}
         super().save(*args, **kwargs)
 
+    def sync_identity(self):
+        """Recompute the normalized client identity columns."""
+        from .identity import normalize_email, normalize_phone
+        is_client = self.role == 'client'
+        self.phone_normalized = normalize_phone(self.phone_number) if is_client else None
+        self.email_normalized = normalize_email(self.email) if is_client else None
+
+    def drop_taken_identity(self):
+        """
+        Leave the normalized phone/email empty where another user already has
+        it (duplicates backfill_client_identities reports for merging) instead
+        of failing the save on the unique index.
+        """
+        from .identity import taken_identity
+        for field in taken_identity(self):
+            setattr(self, field, None)
+
+    def refresh_from_db(self, using=None, fields=None, from_queryset=None):
+        # Users built from JWT claims defer every other field. Django would load
+        # each one with its own query on first access; fill them all at once from
+        # the user cache instead.
+        deferred = self.get_deferred_fields()
+        if fields and from_queryset is None and deferred and set(fields) <= deferred:
+            from .user_cache import user_cache
+            values = user_cache.get_values(self.pk)
+            if values is not None:
+                for attname in deferred:
+                    setattr(self, attname, values[attname])
+                return
+        super().refresh_from_db(using=using, fields=fields, from_queryset=from_queryset)
+
+
+class AgentWorkload(models.Model):
+    """
+    Open leads and open site visits per agent, maintained incrementally by
+    the lead and site-visit signals (see workload.py) so assignment never
+    has to count them per request.
+    """
+    agent = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name='workload')
+    open_leads = models.IntegerField(default=0)
+    open_visits = models.IntegerField(default=0)
+    last_assigned_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        db_table = 'agent_workloads'
+
+    def __str__(self):
+        return f"{self.agent_id}: {self.open_leads} leads, {self.open_visits} visits"
@@ -0,0 +1,13 @@
+from rest_framework.pagination import CursorPagination
+
+
+class TeamDirectoryPagination(CursorPagination):
+    """
+    Cursor pagination for the team directory. Ordered by the unique username,
+    so pages stay stable while users are added and each page is an index range
+    scan instead of an OFFSET.
+    """
+    ordering = 'username'
+    page_size = 25
+    page_size_query_param = 'page_size'
+    max_page_size = 100
@@ -0,0 +1,137 @@
+# apps/accounts/provisioning.py
+"""
+Bulk user provisioning.
+
+``provision_users`` validates every row first, checks username/email
+conflicts against the database in one query, hashes the passwords in a
+process pool (PBKDF2 is CPU-bound and would otherwise run one by one on the
+request thread), inserts the users with ``bulk_create`` and sends the
+welcome emails from a background thread over a single SMTP connection once
+the transaction commits.
+"""
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.mail import EmailMessage
+from django.db import transaction
+from django.db.models import Q
+from django.db.models.functions import Lower
+
+from apps.core.email import queue_emails
+
+from .hashing import hash_passwords
+from .roster import invalidate_agent_roster
+
+User = get_user_model()
+
+
+def welcome_email(user):
+    subject = f"Welcome to the Team, {user.first_name}!"
+    message_body = f"""
+Hi {user.first_name} {user.last_name},
+
+Welcome to the team! Your account has been successfully created by an administrator.
+
+Here are your account details:
+Username: {user.username}
+Role: {user.get_role_display()}
+
+You can log in using the password that was set during your account creation.
+If you have any questions, please contact your administrator.
+
+Best regards,
+The Admin Team
+"""
+    return EmailMessage(subject, message_body, settings.DEFAULT_FROM_EMAIL, [user.email])
+
+
+def queue_welcome_emails(users):
+    """Send welcome emails to ``users`` in the background after the current transaction commits."""
+    queue_emails([welcome_email(user) for user in users if user.email], 'welcome emails')
+
+
+def find_conflicts(usernames, emails):
+    """Usernames and (lowercased) emails that already exist, in one query."""
+    rows = (
+        User.objects.annotate(email_lower=Lower('email'))
+        .filter(Q(username__in=usernames) | Q(email_lower__in=emails))
+        .values_list('username', 'email_lower')
+    )
+    taken_usernames, taken_emails = set(), set()
+    for username, email in rows:
+        taken_usernames.add(username)
+        taken_emails.add(email)
+    return taken_usernames, taken_emails & set(emails)
+
+
+def provision_users(rows, partial=False, dry_run=False):
+    """
+    Create users from ``rows`` (dicts of UserRegistrationSerializer-style
+    fields; no password_confirm). With ``partial`` valid rows are created even
+    if others fail; otherwise any failure creates nothing. Returns a report
+    with one entry per row.
+    """
+    from .serializers import BulkUserRowSerializer
+
+    results = []
+    valid = []
+    for number, row in enumerate(rows, start=1):
+        serializer = BulkUserRowSerializer(data=row)
+        if serializer.is_valid():
+            results.append({'row': number, 'username': serializer.validated_data['username'], 'status': 'valid'})
+            valid.append((results[-1], serializer.validated_data))
+        else:
+            results.append({'row': number, 'username': row.get('username', '') if hasattr(row, 'get') else '',
+                            'status': 'error', 'errors': serializer.errors})
+
+    # Duplicates within the upload, then against existing users
+    seen_usernames, seen_emails = {}, {}
+    for result, data in valid:
+        email = data['email'].lower()
+        errors = {}
+        if data['username'] in seen_usernames:
+            errors['username'] = [f"Duplicate of row {seen_usernames[data['username']]}."]
+        if email in seen_emails:
+            errors['email'] = [f"Duplicate of row {seen_emails[email]}."]
+        seen_usernames.setdefault(data['username'], result['row'])
+        seen_emails.setdefault(email, result['row'])
+        if errors:
+            result.update(status='error', errors=errors)
+
+    taken_usernames, taken_emails = find_conflicts(list(seen_usernames), list(seen_emails))
+    for result, data in valid:
+        errors = result.get('errors', {})
+        if data['username'] in taken_usernames:
+            errors.setdefault('username', []).append("This username is already taken.")
+        if data['email'].lower() in taken_emails:
+            errors.setdefault('email', []).append("A user with this email already exists.")
+        if errors:
+            result.update(status='error', errors=errors)
+
+    to_create = [(result, data) for result, data in valid if result['status'] == 'valid']
+    failed = len(results) - len(to_create)
+    if dry_run or (failed and not partial):
+        if failed and not dry_run:
+            for result, _ in to_create:
+                result['status'] = 'skipped'
+        return {'created': 0, 'failed': failed, 'dry_run': dry_run, 'rows': results}
+
+    hashes = hash_passwords([data['password'] for _, data in to_create])
+    users = []
+    for (result, data), password_hash in zip(to_create, hashes):
+        fields = {key: value for key, value in data.items() if key != 'password'}
+        users.append(User(password=password_hash, **fields))
+
+    with transaction.atomic():
+        created = User.objects.bulk_create(users, batch_size=500)
+        if any(user.pk is None for user in created):
+            # Backends that can't return primary keys from bulk inserts
+            ids = dict(User.objects.filter(username__in=[user.username for user in created]).values_list('username', 'id'))
+            for user in created:
+                user.pk = ids[user.username]
+        queue_welcome_emails(created)
+        # bulk_create sends no post_save signals
+        transaction.on_commit(invalidate_agent_roster)
+
+    for (result, _), user in zip(to_create, created):
+        result.update(status='created', id=user.pk)
+    return {'created': len(created), 'failed': failed, 'dry_run': False, 'rows': results}
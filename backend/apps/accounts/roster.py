@@ -0,0 +1,36 @@
+# apps/accounts/roster.py
+"""
+Cached roster of active agents for assignment dropdowns.
+
+The roster is one small query, but it is requested by every form that picks
+an agent. It is cached for AGENT_ROSTER_CACHE_TTL seconds and dropped
+whenever a non-client user is saved or deleted (see signals.py).
+"""
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+
+ROSTER_CACHE_KEY = 'accounts:agent_roster'
+ROSTER_FIELDS = ('id', 'username', 'first_name', 'last_name', 'email', 'phone_number')
+
+
+def get_agent_roster():
+    roster = cache.get(ROSTER_CACHE_KEY)
+    if roster is None:
+        User = get_user_model()
+        roster = [
+            {
+                'id': row['id'],
+                'username': row['username'],
+                'full_name': f"{row['first_name']} {row['last_name']}".strip() or row['username'],
+                'email': row['email'],
+                'phone_number': row['phone_number'],
+            }
+            for row in User.objects.filter(role='agent', is_active=True).order_by('username').values(*ROSTER_FIELDS)
+        ]
+        cache.set(ROSTER_CACHE_KEY, roster, getattr(settings, 'AGENT_ROSTER_CACHE_TTL', 300))
+    return roster
+
+
+def invalidate_agent_roster():
+    cache.delete(ROSTER_CACHE_KEY)
@@ -1,8 +1,12 @@
 from django.contrib.auth import get_user_model
+from django.contrib.auth.validators import UnicodeUsernameValidator
 from rest_framework import serializers
 from django.core.exceptions import ValidationError
 from django.contrib.auth.password_validation import validate_password
-from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer, TokenRefreshSerializer
+
+from .blacklist import FilteredRefreshToken
+from .identity import normalize_email, normalize_phone, taken_identity
 
 User = get_user_model()
 
@@ -37,6 +41,13 @@ class CustomTokenObtainPairSerializer(TokenObtainPairSerializer):
         return data
 
 
+class CustomTokenRefreshSerializer(TokenRefreshSerializer):
+    """
+    Refresh serializer that checks the blacklist through the in-memory filter
+    """
+    token_class = FilteredRefreshToken
+
+
 class UserRegistrationSerializer(serializers.ModelSerializer):
     """
     Serializer for user registration (only for Manager and Agent roles)
@@ -78,6 +89,35 @@ class UserRegistrationSerializer(serializers.ModelSerializer):
         return user
 
 
+class BulkUserRowSerializer(serializers.ModelSerializer):
+    """
+    One row of a bulk provisioning upload. Uniqueness is checked for the whole
+    upload at once (see provisioning.py), not per row.
+    """
+    password = serializers.CharField(write_only=True, required=True)
+
+    class Meta:
+        model = User
+        fields = ('username', 'email', 'password', 'first_name', 'last_name', 'phone_number', 'role')
+        extra_kwargs = {
+            'username': {'validators': [UnicodeUsernameValidator()]},
+            'first_name': {'required': True},
+            'last_name': {'required': True},
+            'email': {'required': True, 'allow_blank': False},
+        }
+
+    def validate(self, attrs):
+        if attrs.get('role') == 'admin':
+            raise serializers.ValidationError(
+                {"role": "Cannot register as Admin. Admin accounts are created through the Django superuser command."}
+            )
+        try:
+            validate_password(attrs['password'], user=User(**{k: v for k, v in attrs.items() if k != 'password'}))
+        except ValidationError as e:
+            raise serializers.ValidationError({"password": list(e.messages)})
+        return attrs
+
+
 class UserSerializer(serializers.ModelSerializer):
     """
     Serializer for user profile updates and retrieval
@@ -85,9 +125,45 @@ class UserSerializer(serializers.ModelSerializer):
     class Meta:
         model = User
         fields = ('id', 'username', 'email', 'first_name', 'last_name', 'phone_number', 'role',
-                  'is_active', 'date_joined', 'last_login', 'created_at', 'updated_at', 'profile_image', 'password_last_changed_at')
+                  'is_active', 'date_joined', 'last_login', 'created_at', 'updated_at', 'profile_image', 'password_last_changed_at', 'specialties')
         read_only_fields = ('id', 'role', 'is_active', 'date_joined', 'last_login', 'created_at', 'updated_at', 'password_last_changed_at')
 
+    def validate(self, attrs):
+        # A client's phone and email identify them; another client's can't be taken over
+        user = self.instance
+        if user is None or user.role != 'client':
+            return attrs
+        candidate = User(
+            pk=user.pk, role=user.role,
+            phone_number=attrs.get('phone_number', user.phone_number), email=attrs.get('email', user.email),
+        )
+        candidate.sync_identity()
+        taken = taken_identity(candidate)
+        errors = {}
+        # Only values being changed: an existing duplicate doesn't block other edits
+        if 'phone_normalized' in taken and candidate.phone_normalized != normalize_phone(user.phone_number):
+            errors['phone_number'] = "Another client already has this phone number."
+        if 'email_normalized' in taken and candidate.email_normalized != normalize_email(user.email):
+            errors['email'] = "Another client already has this email address."
+        if errors:
+            raise serializers.ValidationError(errors)
+        return attrs
+
+
+class TeamMemberSerializer(serializers.ModelSerializer):
+    """
+    Compact user projection for the team directory
+    """
+    full_name = serializers.SerializerMethodField()
+
+    class Meta:
+        model = User
+        fields = ('id', 'username', 'full_name', 'email', 'phone_number', 'role', 'is_active', 'profile_image')
+        read_only_fields = fields
+
+    def get_full_name(self, obj):
+        return obj.get_full_name() or obj.username
+
 
 class PasswordChangeSerializer(serializers.Serializer):
     """
@@ -1,6 +1,8 @@
-from django.db.models.signals import post_save
+from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
 from django.contrib.auth import get_user_model
+from .roster import invalidate_agent_roster
+from .user_cache import user_cache
 
 User = get_user_model()
 
@@ -11,4 +13,27 @@ def set_superuser_as_admin(sender, instance, created, **kwargs):
     """
     if instance.is_superuser and instance.role != 'admin':
         instance.role = 'admin'
-        instance.save(update_fields=['role'])
\ No newline at end of file
+        instance.save(update_fields=['role'])
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_cached_user(sender, instance, **kwargs):
+    """
+    Drop the cached row on any change (profile edits, password changes,
+    deactivation) so authentication sees the new state.
+    """
+    user_cache.invalidate(instance.pk)
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_roster(sender, instance, created=False, update_fields=None, **kwargs):
+    """
+    Drop the cached agent roster when team members change. New clients
+    (created when a site visit is booked) and last_login updates can't
+    affect it.
+    """
+    if (created and instance.role == 'client') or (update_fields and set(update_fields) <= {'last_login'}):
+        return
+    invalidate_agent_roster()
@@ -3,11 +3,15 @@ from .views import (
     CustomTokenObtainPairView,
     CustomTokenRefreshView,
     UserListCreateView,
+    BulkUserProvisionView,
+    TeamDirectoryView,
+    AgentRosterView,
     UserDetailView,
     LogoutView,
     PasswordChangeView,
     PasswordResetRequestView,
-    PasswordResetConfirmView
+    PasswordResetConfirmView,
+    TokenBlacklistStatsView
 )
 
 app_name = 'accounts'
@@ -17,9 +21,13 @@ urlpatterns = [
     path('auth/login/', CustomTokenObtainPairView.as_view(), name='token_obtain_pair'),
     path('auth/refresh/', CustomTokenRefreshView.as_view(), name='token_refresh'),
     path('auth/logout/', LogoutView.as_view(), name='logout'),
+    path('auth/token-blacklist/', TokenBlacklistStatsView.as_view(), name='token_blacklist_stats'),
     
     # User management (admin only)
     path('users/', UserListCreateView.as_view(), name='user_list'),
+    path('users/bulk/', BulkUserProvisionView.as_view(), name='user_bulk_provision'),
+    path('users/directory/', TeamDirectoryView.as_view(), name='team_directory'),
+    path('users/agents/', AgentRosterView.as_view(), name='agent_roster'),
       # User profile and management
     path('auth/user/', UserDetailView.as_view(), name='user_details'),
     path('auth/user/<int:pk>/', UserDetailView.as_view(), name='user_detail_actions'),
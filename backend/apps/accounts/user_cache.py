@@ -0,0 +1,77 @@
+# apps/accounts/user_cache.py
+"""
+Process-local TTL cache of user rows for request authentication.
+
+Only plain field values are cached; every lookup builds a fresh ``User``
+instance, so requests never share (and mutate) the same object. Entries are
+dropped when a user is saved or deleted (see signals.py), which covers
+profile edits, password changes and deactivation in this process; other
+worker processes pick changes up once the TTL expires.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import DEFAULT_DB_ALIAS
+
+
+class UserCache:
+    def __init__(self, maxsize=10000):
+        self.maxsize = maxsize
+        self._rows = OrderedDict()  # pk -> (expires_at, {attname: value})
+        self._changed_at = {}       # pk -> unix time of the last invalidation
+        self._lock = threading.Lock()
+
+    @property
+    def ttl(self):
+        return getattr(settings, 'AUTH_USER_CACHE_TTL', 60)
+
+    def get_values(self, pk):
+        """Return the cached field values for ``pk``, loading the row on a miss."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._rows.get(pk)
+            if entry and entry[0] > now:
+                self._rows.move_to_end(pk)
+                return entry[1]
+
+        User = get_user_model()
+        attnames = [field.attname for field in User._meta.concrete_fields]
+        row = User._base_manager.filter(pk=pk).values_list(*attnames).first()
+        if row is None:
+            return None
+        values = dict(zip(attnames, row))
+        with self._lock:
+            self._rows[pk] = (now + self.ttl, values)
+            self._rows.move_to_end(pk)
+            while len(self._rows) > self.maxsize:
+                self._rows.popitem(last=False)
+        return values
+
+    def get(self, pk):
+        """Return a fresh ``User`` instance for ``pk`` (or None)."""
+        values = self.get_values(pk)
+        if values is None:
+            return None
+        User = get_user_model()
+        return User.from_db(DEFAULT_DB_ALIAS, list(values), list(values.values()))
+
+    def invalidate(self, pk):
+        with self._lock:
+            self._rows.pop(pk, None)
+            self._changed_at[pk] = time.time()
+
+    def changed_since(self, pk, timestamp):
+        """True if ``pk`` was saved in this process after ``timestamp`` (unix time)."""
+        changed_at = self._changed_at.get(pk)
+        return changed_at is not None and (timestamp is None or changed_at >= timestamp)
+
+    def clear(self):
+        with self._lock:
+            self._rows.clear()
+            self._changed_at.clear()
+
+
+user_cache = UserCache()
@@ -1,23 +1,32 @@
 from django.contrib.auth import get_user_model
-from rest_framework import generics, status, permissions # Make sure permissions is imported
+from rest_framework import generics, status, permissions, filters # Make sure permissions is imported
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
-from rest_framework_simplejwt.tokens import RefreshToken
 from django.contrib.auth.tokens import default_token_generator
 from django.utils.http import urlsafe_base64_encode, urlsafe_base64_decode
 from django.utils.encoding import force_bytes, force_str
 from django.conf import settings
 from django.core.mail import send_mail
 from django.utils import timezone
+from django.db import IntegrityError
+import pandas as pd
 
+from apps.core.throttling import AdmissionControlMixin
+
+from .blacklist import FilteredRefreshToken, blacklist_stats, maybe_prune
+from .pagination import TeamDirectoryPagination
+from .provisioning import provision_users, welcome_email
+from .roster import get_agent_roster
 from .serializers import (
     CustomTokenObtainPairSerializer,
+    CustomTokenRefreshSerializer,
     UserRegistrationSerializer,
     UserSerializer,
     PasswordChangeSerializer,
     PasswordResetRequestSerializer,
-    PasswordResetConfirmSerializer
+    PasswordResetConfirmSerializer,
+    TeamMemberSerializer
 )
 # Assuming your permission.py file is in the same directory and you need classes from it for other views,
 # you might import them here. For this specific change, we are using built-in DRF permissions
@@ -26,16 +35,22 @@ from .serializers import (
 
 User = get_user_model()
 
+# Roles listed by the team directory unless the request asks for others
+TEAM_ROLES = ('admin', 'manager', 'agent')
+# Columns TeamMemberSerializer reads
+TEAM_MEMBER_FIELDS = ('id', 'username', 'first_name', 'last_name', 'email', 'phone_number', 'role', 'is_active', 'profile_image')
+
 # Custom permission for admin users (used for POST in UserListCreateView)
 class IsAdminUser(permissions.BasePermission):
     def has_permission(self, request, view):
         return request.user and request.user.is_authenticated and request.user.role == 'admin'
 
-class CustomTokenObtainPairView(TokenObtainPairView):
+class CustomTokenObtainPairView(AdmissionControlMixin, TokenObtainPairView):
     """
     Custom token view that uses our serializer with additional user data
     """
     serializer_class = CustomTokenObtainPairSerializer
+    throttle_scope = 'login'
 
     def post(self, request, *args, **kwargs):
         response = super().post(request, *args, **kwargs)
@@ -112,29 +127,7 @@ class UserListCreateView(generics.ListCreateAPIView):
 
             # Send welcome email
             try:
-                subject = f"Welcome to the Team, {user.first_name}!"
-                message_body = f"""
-Hi {user.first_name} {user.last_name},
-
-Welcome to the team! Your account has been successfully created by an administrator.
-
-Here are your account details:
-Username: {user.username}
-Role: {user.get_role_display()}
-
-You can log in using the password that was set during your account creation.
-If you have any questions, please contact your administrator.
-
-Best regards,
-The Admin Team
-"""
-                send_mail(
-                    subject,
-                    message_body,
-                    settings.DEFAULT_FROM_EMAIL, # Your default 'from' email address
-                    [user.email], # Send to the new user's email
-                    fail_silently=False, # Raise an error if sending fails
-                )
+                welcome_email(user).send(fail_silently=False)
             except Exception as e:
                 # Log the error (e.g., using Python's logging module)
                 print(f"Error sending welcome email to {user.email}: {e}")
@@ -148,6 +141,110 @@ The Admin Team
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
+class TeamDirectoryView(generics.ListAPIView):
+    """
+    Cursor-paginated team directory with a compact projection.
+
+    - role: comma-separated roles (default: admin, manager and agent; clients
+      only when asked for)
+    - active: 'true' (default), 'false' or 'all'
+    - search: username, name or email
+    """
+    serializer_class = TeamMemberSerializer
+    pagination_class = TeamDirectoryPagination
+    permission_classes = [permissions.IsAuthenticated]
+    filter_backends = [filters.SearchFilter]
+    search_fields = ['username', 'first_name', 'last_name', 'email']
+
+    def get_queryset(self):
+        roles = [role.strip() for role in self.request.query_params.get('role', '').split(',') if role.strip()]
+        queryset = User.objects.filter(role__in=roles or TEAM_ROLES)
+
+        active = self.request.query_params.get('active', 'true').lower()
+        if active in ('true', '1'):
+            queryset = queryset.filter(is_active=True)
+        elif active in ('false', '0'):
+            queryset = queryset.filter(is_active=False)
+
+        return queryset.only(*TEAM_MEMBER_FIELDS)
+
+
+class AgentRosterView(APIView):
+    """
+    Active agents (id, name, contact) for assignment dropdowns, cached
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request):
+        return Response(get_agent_roster())
+
+
+class BulkUserProvisionView(AdmissionControlMixin, APIView):
+    """
+    Admin-only bulk user creation from a CSV/XLSX upload ('file') or a JSON
+    list of users (either the body itself or under 'users').
+
+    Options (query string or body): dry_run=true only validates; partial=true
+    creates the valid rows even when others fail (by default one bad row
+    creates nothing). Returns a result per row.
+    """
+    permission_classes = [IsAdminUser]
+    throttle_scope = 'user_provisioning'
+
+    def get_rows(self, request):
+        if 'file' in request.FILES:
+            file = request.FILES['file']
+            name = file.name.lower()
+            if name.endswith('.csv'):
+                try:
+                    df = pd.read_csv(file, dtype=str, keep_default_na=False, na_filter=False)
+                except UnicodeDecodeError:
+                    file.seek(0)
+                    df = pd.read_csv(file, encoding='latin1', dtype=str, keep_default_na=False, na_filter=False)
+            elif name.endswith(('.xlsx', '.xls')):
+                df = pd.read_excel(file, dtype=str, keep_default_na=False, na_filter=False)
+            else:
+                raise ValueError('Unsupported file format. Please use CSV, XLSX, or XLS.')
+            df.columns = [str(column).strip().lower().replace(' ', '_') for column in df.columns]
+            return df.to_dict('records')
+        rows = request.data if isinstance(request.data, list) else request.data.get('users')
+        if not isinstance(rows, list):
+            raise ValueError("Send a CSV/XLSX 'file' or a JSON list of users.")
+        return rows
+
+    def get_flag(self, request, name):
+        value = request.query_params.get(name)
+        if value is None and hasattr(request.data, 'get'):
+            value = request.data.get(name)
+        return str(value).lower() in ('1', 'true', 'yes')
+
+    def post(self, request):
+        try:
+            rows = self.get_rows(request)
+        except Exception as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        if not rows:
+            return Response({'error': 'No users provided'}, status=status.HTTP_400_BAD_REQUEST)
+        max_rows = getattr(settings, 'USER_PROVISIONING_MAX_ROWS', 1000)
+        if len(rows) > max_rows:
+            return Response({'error': f'At most {max_rows} users per request'}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            report = provision_users(rows, partial=self.get_flag(request, 'partial'), dry_run=self.get_flag(request, 'dry_run'))
+        except IntegrityError:
+            # Someone created one of these usernames between the check and the insert
+            return Response(
+                {'error': 'Some of these users were created by another request. Please retry.'},
+                status=status.HTTP_409_CONFLICT
+            )
+
+        if report['dry_run']:
+            return Response(report, status=status.HTTP_200_OK)
+        if report['created']:
+            return Response(report, status=status.HTTP_201_CREATED)
+        return Response(report, status=status.HTTP_400_BAD_REQUEST)
+
+
 class UserDetailView(generics.RetrieveUpdateDestroyAPIView):
     """
     API view to retrieve, update and delete user details
@@ -194,7 +291,7 @@ class LogoutView(APIView):
             # The refresh token might be in cookies now, not request.data
             refresh_token = request.COOKIES.get('refresh_token')
             if refresh_token:
-                token = RefreshToken(refresh_token)
+                token = FilteredRefreshToken(refresh_token)
                 token.blacklist()
             
             response = Response({"detail": "Successfully logged out."}, status=status.HTTP_200_OK)
@@ -230,11 +327,12 @@ class PasswordChangeView(APIView):
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
-class PasswordResetRequestView(APIView):
+class PasswordResetRequestView(AdmissionControlMixin, APIView):
     """
     API view for requesting a password reset
     """
     permission_classes = [permissions.AllowAny]
+    throttle_scope = 'password_reset'
 
     def post(self, request):
         serializer = PasswordResetRequestSerializer(data=request.data)
@@ -321,6 +419,8 @@ class CustomTokenRefreshView(TokenRefreshView):
     Custom token refresh view that sets the new access token as an HttpOnly cookie
     and expects the refresh token from an HttpOnly cookie.
     """
+    serializer_class = CustomTokenRefreshSerializer
+
     def post(self, request, *args, **kwargs):
         # Override to ensure refresh token is taken from cookies if not in request body
         # DRF's TokenRefreshView expects 'refresh' in request.data
@@ -348,4 +448,16 @@ class CustomTokenRefreshView(TokenRefreshView):
             # Optionally remove the access token from the response body if set in cookie
             if 'access' in response.data:
                  response.data.pop('access', None)
-        return response
\ No newline at end of file
+            # Clear out expired outstanding/blacklisted tokens now and then
+            maybe_prune()
+        return response
+
+
+class TokenBlacklistStatsView(APIView):
+    """
+    Admin-only: size of the token tables and state of the in-memory blacklist filter
+    """
+    permission_classes = [permissions.IsAuthenticated, IsAdminUser]
+
+    def get(self, request):
+        return Response(blacklist_stats())
@@ -0,0 +1,120 @@
+# apps/accounts/workload.py
+"""
+Per-agent workload counters (open leads, open site visits).
+
+Works like apps.property.counters: lead and site-visit signals report each
+change as an ``(old, new)`` pair of ``(agent_id, status)`` snapshots and the
+difference is applied with an atomic ``F()`` update, so concurrent writers
+never lose increments. Bulk paths that skip signals pass their totals to
+``apply_workload_deltas``; ``reconcile_agent_workloads`` recomputes
+everything from the source tables.
+
+A lead is open until it is Converted or Dropped; a visit is open while it is
+scheduled or confirmed.
+"""
+from collections import Counter, defaultdict
+
+from django.contrib.auth import get_user_model
+from django.db.models import Case, Count, F, IntegerField, OuterRef, Subquery, Value, When
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import AgentWorkload
+
+CLOSED_LEAD_STATUSES = ('Converted', 'Dropped')
+OPEN_VISIT_STATUSES = ('scheduled', 'confirmed')
+
+
+def lead_is_open(status):
+    return status not in CLOSED_LEAD_STATUSES
+
+
+def visit_is_open(status):
+    return status in OPEN_VISIT_STATUSES
+
+
+def _diff(old, new, field, is_open):
+    deltas = defaultdict(Counter)
+    for state, sign in ((old, -1), (new, 1)):
+        if state is None:
+            continue
+        agent_id, status = state
+        if agent_id is not None and is_open(status):
+            deltas[agent_id][field] += sign
+    return deltas
+
+
+def _newly_assigned(old, new):
+    new_agent = new[0] if new else None
+    old_agent = old[0] if old else None
+    return new_agent if new_agent is not None and new_agent != old_agent else None
+
+
+def apply_workload_deltas(deltas, assigned=()):
+    """
+    Add ``deltas`` ({agent_id: {'open_leads': n, 'open_visits': n}}) to the
+    counters with one UPDATE, and stamp ``last_assigned_at`` for the agents
+    in ``assigned``. Missing counter rows are created first.
+    """
+    deltas = {agent_id: {f: n for f, n in fields.items() if n} for agent_id, fields in deltas.items()}
+    deltas = {agent_id: fields for agent_id, fields in deltas.items() if fields}
+    agent_ids = set(deltas) | set(assigned)
+    if not agent_ids:
+        return
+    AgentWorkload.objects.bulk_create(
+        [AgentWorkload(agent_id=agent_id) for agent_id in agent_ids], ignore_conflicts=True
+    )
+
+    changes = {}
+    for field in ('open_leads', 'open_visits'):
+        whens = [When(pk=agent_id, then=Value(fields[field])) for agent_id, fields in deltas.items() if field in fields]
+        if whens:
+            changes[field] = F(field) + Case(*whens, default=Value(0), output_field=IntegerField())
+    if assigned:
+        changes['last_assigned_at'] = Case(
+            When(pk__in=list(assigned), then=Value(timezone.now())), default=F('last_assigned_at')
+        )
+    AgentWorkload.objects.filter(pk__in=agent_ids).update(**changes)
+
+
+def record_lead_assignment_change(old, new):
+    """Apply a lead change; ``old``/``new`` are (assigned_to_id, status) or None."""
+    assigned = _newly_assigned(old, new)
+    apply_workload_deltas(_diff(old, new, 'open_leads', lead_is_open), [assigned] if assigned else ())
+
+
+def record_visit_assignment_change(old, new):
+    """Apply a site-visit change; ``old``/``new`` are (agent_id, status) or None."""
+    assigned = _newly_assigned(old, new)
+    apply_workload_deltas(_diff(old, new, 'open_visits', visit_is_open), [assigned] if assigned else ())
+
+
+def _count_subquery(model, agent_field, **filters):
+    counts = model.objects.filter(**{agent_field: OuterRef('agent_id')}, **filters).order_by().values(
+        agent_field
+    ).annotate(n=Count('pk')).values('n')
+    return Coalesce(Subquery(counts, output_field=IntegerField()), 0)
+
+
+def reconcile_agent_workloads():
+    """
+    Recompute every counter from the lead and site-visit tables (after
+    bulk_create, raw SQL imports or a manual repair). Returns the number of
+    agents updated.
+    """
+    from apps.leads.models import Lead
+    from apps.site_visits.models import SiteVisit
+
+    User = get_user_model()
+    agent_ids = set(User.objects.filter(role='agent').values_list('pk', flat=True))
+    agent_ids |= set(Lead.objects.exclude(assigned_to=None).values_list('assigned_to_id', flat=True).distinct())
+    agent_ids |= set(SiteVisit.objects.exclude(agent=None).values_list('agent_id', flat=True).distinct())
+    AgentWorkload.objects.bulk_create(
+        [AgentWorkload(agent_id=agent_id) for agent_id in agent_ids], ignore_conflicts=True
+    )
+    return AgentWorkload.objects.update(
+        open_leads=_count_subquery(Lead, 'assigned_to', status__in=[
+            status for status, _ in Lead.STATUS_CHOICES if lead_is_open(status)
+        ]),
+        open_visits=_count_subquery(SiteVisit, 'agent', status__in=OPEN_VISIT_STATUSES),
+    )
@@ -0,0 +1,180 @@
+# apps/core/benchmark.py
+"""
+In-process API benchmark harness.
+
+Every endpoint is requested through DRF's APIClient (no network, no server)
+as an admin user. For each one we record latency percentiles over several
+iterations, the SQL query count per request and the peak Python allocation
+of a single request (measured in a separate tracemalloc pass so tracing
+overhead does not skew the timings). Rate limits and concurrency caps are
+off for the run: one user repeating a request would otherwise exhaust
+buckets like lead_export's 20/hour, record 429s as the endpoint's numbers,
+and leave the persistent throttle state empty for later runs.
+"""
+import platform
+import time
+import tracemalloc
+
+import numpy as np
+from django.db import connection
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from apps.leads.models import Lead
+from apps.property.models import Property
+from apps.site_visits.models import SiteVisit
+
+# (name, url template); {lead}, {property} and {site_visit} are filled with real ids
+ENDPOINTS = [
+    ('leads-list', '/api/leads/'),
+    ('leads-detail', '/api/leads/{lead}/'),
+    ('leads-export', '/api/leads/export/'),
+    ('leads-dashboard-stats', '/api/leads/dashboard_stats/'),
+    ('leads-revenue-overview', '/api/leads/revenue_overview/'),
+    ('leads-team-performance', '/api/leads/team_performance/'),
+    ('leads-builder-performance', '/api/leads/builder_performance/'),
+    ('analytics-timeseries', '/api/analytics/timeseries/?metric=revenue&bucket=month&group_by=source'),
+    ('properties-list', '/api/properties/'),
+    ('properties-detail', '/api/properties/{property}/'),
+    ('properties-facets', '/api/properties/facets/?property_type=house&amenities=gym'),
+    ('properties-near', '/api/properties/?near=19.1176,72.9060&radius_km=10'),
+    ('properties-stats', '/api/properties/stats/?group_by=city,property_type'),
+    ('site-visits-list', '/api/site-visits/'),
+    ('site-visits-detail', '/api/site-visits/{site_visit}/'),
+    ('site-visits-upcoming', '/api/site-visits/upcoming/'),
+    ('site-visits-summary', '/api/site-visits/summary_counts/'),
+]
+
+
+def _sample_ids():
+    return {
+        'lead': Lead.objects.order_by('pk').values_list('pk', flat=True).first(),
+        'property': Property.objects.order_by('pk').values_list('pk', flat=True).first(),
+        'site_visit': SiteVisit.objects.order_by('pk').values_list('pk', flat=True).first(),
+    }
+
+
+def measure_endpoint(client, url, iterations=20, warmup=2):
+    """Time ``url`` and return latency percentiles, query count and peak memory."""
+    for _ in range(warmup):
+        client.get(url)
+
+    timings = []
+    query_counts = []
+    status_code = None
+    for _ in range(iterations):
+        with CaptureQueriesContext(connection) as queries:
+            started = time.perf_counter()
+            response = client.get(url)
+            timings.append((time.perf_counter() - started) * 1000)
+        status_code = response.status_code
+        query_counts.append(len(queries.captured_queries))
+
+    tracemalloc.start()
+    try:
+        client.get(url)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    timings = np.array(timings)
+    return {
+        'url': url,
+        'status': status_code,
+        'iterations': iterations,
+        'latency_ms': {
+            'p50': round(float(np.percentile(timings, 50)), 3),
+            'p95': round(float(np.percentile(timings, 95)), 3),
+            'p99': round(float(np.percentile(timings, 99)), 3),
+            'mean': round(float(timings.mean()), 3),
+            'max': round(float(timings.max()), 3),
+        },
+        'queries': int(max(query_counts)),
+        'peak_memory_kb': round(peak / 1024, 1),
+    }
+
+
+def run_benchmark(user, iterations=20, warmup=2, only=None, skip=(), stdout=None):
+    """Benchmark every endpoint (or the ``only`` subset) against the current database."""
+    with override_settings(THROTTLE_ENABLED=False):
+        return _run_benchmark(user, iterations, warmup, only, skip, stdout)
+
+
+def _run_benchmark(user, iterations, warmup, only, skip, stdout):
+    log = stdout.write if stdout else (lambda message: None)
+    client = APIClient()
+    client.force_authenticate(user)
+    ids = _sample_ids()
+
+    results = {}
+    for name, template in ENDPOINTS:
+        if (only and name not in only) or name in skip:
+            continue
+        try:
+            url = template.format(**ids)
+        except KeyError:
+            continue
+        if 'None' in url:
+            log(f"Skipping {name}: no rows to request")
+            continue
+        results[name] = measure_endpoint(client, url, iterations=iterations, warmup=warmup)
+        latency = results[name]['latency_ms']
+        log(f"{name:<28} p50={latency['p50']:>9.2f}ms p95={latency['p95']:>9.2f}ms "
+            f"queries={results[name]['queries']:<4} peak={results[name]['peak_memory_kb']:.0f}KB")
+    return results
+
+
+def dataset_summary():
+    return {
+        'leads': Lead.objects.count(),
+        'properties': Property.objects.count(),
+        'site_visits': SiteVisit.objects.count(),
+    }
+
+
+def new_report():
+    return {
+        'generated_at': timezone.now().isoformat(),
+        'database': connection.vendor,
+        'python': platform.python_version(),
+        'runs': [],
+    }
+
+
+def compare_reports(baseline, current, threshold=0.2):
+    """
+    Compare two reports run by run (matched on lead count) and endpoint by
+    endpoint. Returns rows with relative p50/p95 changes and query deltas;
+    ``regression`` is set when p95 grew by more than ``threshold`` or the
+    query count went up.
+    """
+    baseline_runs = {run['dataset']['leads']: run for run in baseline.get('runs', [])}
+    rows = []
+    for run in current.get('runs', []):
+        before = baseline_runs.get(run['dataset']['leads'])
+        if not before:
+            continue
+        for name, now_result in run['endpoints'].items():
+            then_result = before['endpoints'].get(name)
+            if not then_result:
+                continue
+            p50_change = _relative(then_result['latency_ms']['p50'], now_result['latency_ms']['p50'])
+            p95_change = _relative(then_result['latency_ms']['p95'], now_result['latency_ms']['p95'])
+            query_delta = now_result['queries'] - then_result['queries']
+            rows.append({
+                'leads': run['dataset']['leads'],
+                'endpoint': name,
+                'p50_change': p50_change,
+                'p95_change': p95_change,
+                'query_delta': query_delta,
+                'memory_delta_kb': round(now_result['peak_memory_kb'] - then_result['peak_memory_kb'], 1),
+                'regression': p95_change > threshold or query_delta > 0,
+            })
+    return rows
+
+
+def _relative(before, after):
+    if not before:
+        return 0.0
+    return round((after - before) / before, 4)
@@ -0,0 +1,30 @@
+# apps/core/email.py
+"""
+Background delivery for notification batches (welcome emails, assignment
+digests). Messages are sent over one connection from a daemon thread once
+the current transaction commits, so neither the request nor a rolled-back
+transaction waits on or triggers SMTP.
+"""
+import threading
+
+from django.core.mail import get_connection
+from django.db import transaction
+
+
+def _send(messages, label):
+    try:
+        sent = get_connection().send_messages(messages)
+        print(f"Sent {sent} of {len(messages)} {label}")
+    except Exception as e:
+        print(f"Error sending {label}: {e}")
+
+
+def queue_emails(messages, label='emails'):
+    """Send ``messages`` in the background after the current transaction commits."""
+    if not messages:
+        return
+
+    def start():
+        threading.Thread(target=_send, args=(messages, label), name=label.replace(' ', '-'), daemon=True).start()
+
+    transaction.on_commit(start)
@@ -0,0 +1,100 @@
+import json
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+from apps.core.benchmark import ENDPOINTS, compare_reports, dataset_summary, new_report, run_benchmark
+from apps.core.seeding import flush_seed_data, seed_crm
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark every list, detail and analytics endpoint and write latency percentiles, "
+        "query counts and peak memory to a JSON report. With --scales the seeded dataset is "
+        "rebuilt at each lead count (e.g. --scales 10000 100000 1000000)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scales', type=int, nargs='*', default=[],
+                            help="Lead counts to reseed and benchmark at (default: use the current data)")
+        parser.add_argument('--iterations', type=int, default=20)
+        parser.add_argument('--warmup', type=int, default=2)
+        parser.add_argument('--only', nargs='*', default=[], help=f"Endpoint names: {', '.join(n for n, _ in ENDPOINTS)}")
+        parser.add_argument('--skip', nargs='*', default=[], help="Endpoint names to leave out (e.g. leads-export)")
+        parser.add_argument('--user', help="Username to authenticate as (default: first admin)")
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--output', default='benchmark_report.json')
+        parser.add_argument('--compare', help="Baseline report to compare the new results against")
+        parser.add_argument('--threshold', type=float, default=0.2, help="Relative p95 growth counted as a regression")
+
+    def handle(self, *args, **options):
+        report = new_report()
+        setup_test_environment()  # locmem email, 'testserver' host
+        try:
+            if options['scales']:
+                for leads in options['scales']:
+                    self.stdout.write(self.style.MIGRATE_HEADING(f"Seeding {leads} leads"))
+                    flush_seed_data()
+                    seed_crm(
+                        leads=leads,
+                        properties=max(200, leads // 500),
+                        visits=max(1000, leads // 10),
+                        clients=max(500, leads // 100),
+                        agents=max(20, leads // 5000),
+                        seed=options['seed'],
+                    )
+                    report['runs'].append(self._run(options))
+            else:
+                report['runs'].append(self._run(options))
+        finally:
+            teardown_test_environment()
+
+        with open(options['output'], 'w') as fh:
+            json.dump(report, fh, indent=2)
+        self.stdout.write(self.style.SUCCESS(f"Report written to {options['output']}"))
+
+        if options['compare']:
+            with open(options['compare']) as fh:
+                baseline = json.load(fh)
+            rows = compare_reports(baseline, report, threshold=options['threshold'])
+            regressions = 0
+            for row in rows:
+                marker = 'REGRESSION' if row['regression'] else ''
+                regressions += bool(row['regression'])
+                self.stdout.write(
+                    f"{row['leads']:>8} {row['endpoint']:<28} p50 {row['p50_change']:+.1%} "
+                    f"p95 {row['p95_change']:+.1%} queries {row['query_delta']:+d} {marker}"
+                )
+            if regressions:
+                self.stdout.write(self.style.WARNING(f"{regressions} regressions against {options['compare']}"))
+
+    def _run(self, options):
+        user = self._user(options['user'])
+        dataset = dataset_summary()
+        self.stdout.write(self.style.MIGRATE_HEADING(
+            f"Benchmarking with {dataset['leads']} leads, {dataset['properties']} properties, "
+            f"{dataset['site_visits']} site visits"
+        ))
+        endpoints = run_benchmark(
+            user,
+            iterations=options['iterations'],
+            warmup=options['warmup'],
+            only=options['only'],
+            skip=options['skip'],
+            stdout=self.stdout,
+        )
+        return {'dataset': dataset, 'endpoints': endpoints}
+
+    def _user(self, username):
+        if username:
+            try:
+                return User.objects.get(username=username)
+            except User.DoesNotExist:
+                raise CommandError(f"User '{username}' does not exist.")
+        user = User.objects.filter(role='admin', is_active=True).order_by('pk').first()
+        if not user:
+            raise CommandError("No admin user found; pass --user or run seed_crm first.")
+        return user
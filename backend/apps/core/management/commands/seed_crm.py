@@ -0,0 +1,42 @@
+from django.core.management.base import BaseCommand
+
+from apps.core.seeding import SEED_PASSWORD, flush_seed_data, seed_crm
+
+
+class Command(BaseCommand):
+    help = "Generate a reproducible synthetic CRM dataset (users, properties, leads, site visits) with bulk_create."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--admins', type=int, default=1)
+        parser.add_argument('--managers', type=int, default=3)
+        parser.add_argument('--agents', type=int, default=20)
+        parser.add_argument('--clients', type=int, default=500)
+        parser.add_argument('--properties', type=int, default=200)
+        parser.add_argument('--leads', type=int, default=10000)
+        parser.add_argument('--visits', type=int, default=2000)
+        parser.add_argument('--images-per-property', type=int, default=3)
+        parser.add_argument('--seed', type=int, default=42, help="Random seed; the same seed gives the same dataset")
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--flush', action='store_true', help="Delete previously seeded data first")
+
+    def handle(self, *args, **options):
+        if options['flush']:
+            removed = flush_seed_data()
+            self.stdout.write(f"Removed {removed} previously seeded rows.")
+
+        summary = seed_crm(
+            admins=options['admins'],
+            managers=options['managers'],
+            agents=options['agents'],
+            clients=options['clients'],
+            properties=options['properties'],
+            leads=options['leads'],
+            visits=options['visits'],
+            images_per_property=options['images_per_property'],
+            seed=options['seed'],
+            batch_size=options['batch_size'],
+            stdout=self.stdout,
+        )
+        details = ', '.join(f"{count} {name}" for name, count in summary.items())
+        self.stdout.write(self.style.SUCCESS(f"Seeded {details}."))
+        self.stdout.write(f"Seeded users log in with the password '{SEED_PASSWORD}'.")
@@ -0,0 +1,151 @@
+# apps/core/middleware.py
+import logging
+import re
+import sys
+from collections import Counter
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+from django.http import JsonResponse
+
+from .profiling import ProfilerBusy, profile_call, save_profile
+
+logger = logging.getLogger(__name__)
+
+# Literals are replaced so queries that differ only by parameters share a shape
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL = re.compile(r'\b\d+(?:\.\d+)?\b')
+_PLACEHOLDER_LIST = re.compile(r'\((?:\s*(?:%s|\?)\s*,)+\s*(?:%s|\?)\s*\)')
+_WHITESPACE = re.compile(r'\s+')
+
+
+def fingerprint(sql):
+    """Reduce a SQL statement to its shape (literals and IN-lists collapsed)."""
+    shape = _STRING_LITERAL.sub('?', sql)
+    shape = _NUMBER_LITERAL.sub('?', shape)
+    shape = shape.replace('%s', '?')
+    shape = _PLACEHOLDER_LIST.sub('(?)', shape)
+    return _WHITESPACE.sub(' ', shape).strip()
+
+
+def responsible_serializer_field():
+    """
+    Walk the current stack for a DRF serializer that is rendering a field and
+    return 'SerializerName.field_name', or None when the query came from
+    elsewhere (views, signals, ...).
+    """
+    from rest_framework.fields import Field
+    from rest_framework.serializers import BaseSerializer
+
+    frame = sys._getframe(1)
+    while frame is not None:
+        owner = frame.f_locals.get('self')
+        field = frame.f_locals.get('field')
+        if isinstance(owner, BaseSerializer) and isinstance(field, Field):
+            return f"{type(owner).__name__}.{field.field_name}"
+        frame = frame.f_back
+    return None
+
+
+class QueryShapeMiddleware:
+    """
+    Development-only N+1 detector.
+
+    Every SQL statement run while handling a request is fingerprinted; when
+    the same shape repeats more than QUERY_SHAPE_REPEAT_THRESHOLD times a
+    warning is logged naming the serializer field that triggered it.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.threshold = getattr(settings, 'QUERY_SHAPE_REPEAT_THRESHOLD', 5)
+
+    def __call__(self, request):
+        if not settings.DEBUG:
+            return self.get_response(request)
+
+        shapes = Counter()
+        culprits = {}
+
+        def record(execute, sql, params, many, context):
+            shape = fingerprint(sql)
+            shapes[shape] += 1
+            # Only pay for the stack walk once the shape is known to repeat
+            if shapes[shape] == self.threshold + 1:
+                culprits[shape] = responsible_serializer_field()
+            return execute(sql, params, many, context)
+
+        with ExitStack() as stack:
+            for alias in connections:
+                stack.enter_context(connections[alias].execute_wrapper(record))
+            response = self.get_response(request)
+
+        repeated = {shape: count for shape, count in shapes.items() if count > self.threshold}
+        for shape, count in repeated.items():
+            logger.warning(
+                "Possible N+1 on %s %s: query repeated %d times (field: %s): %s",
+                request.method, request.path, count, culprits.get(shape) or 'unknown', shape[:300],
+            )
+        if repeated:
+            response['X-Repeated-Query-Shapes'] = str(len(repeated))
+        return response
+
+
+def _is_admin(request):
+    """
+    Resolve the requesting user before the view runs. Session users come from
+    AuthenticationMiddleware; JWT users are authenticated the way DRF would.
+    """
+    from rest_framework.request import Request
+    from rest_framework.settings import api_settings
+
+    user = getattr(request, 'user', None)
+    if user is None or not user.is_authenticated:
+        try:
+            authenticators = [auth() for auth in api_settings.DEFAULT_AUTHENTICATION_CLASSES]
+            user = Request(request, authenticators=authenticators).user
+        except Exception:
+            return False
+    return bool(user and user.is_authenticated and (user.is_superuser or getattr(user, 'role', None) == 'admin'))
+
+
+PROFILE_MODES = ('1', 'true', 'inline')
+
+
+class RequestProfilingMiddleware:
+    """
+    Admin-only request profiling, triggered by ``?_profile=1`` or an
+    ``X-Profile: 1`` header (``true`` works too; other values are ignored).
+    The report is saved under PROFILING_DIR and its id returned in the
+    ``X-Profile-Id`` header; ``_profile=inline`` returns the report itself
+    instead of the view's response. While another request of the process is
+    being profiled the request runs unprofiled, marked ``X-Profile-Skipped``.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        mode = (request.GET.get('_profile') or request.headers.get('X-Profile') or '').strip().lower()
+        if mode not in PROFILE_MODES or not getattr(settings, 'PROFILING_ENABLED', True) or not _is_admin(request):
+            return self.get_response(request)
+
+        try:
+            response, report = profile_call(self.get_response, request)
+        except ProfilerBusy:
+            response = self.get_response(request)
+            response['X-Profile-Skipped'] = 'busy'
+            return response
+        report.update({
+            'method': request.method,
+            'path': request.get_full_path(),
+            'status': response.status_code,
+            'user': request.user.get_username(),
+        })
+        save_profile(report)
+
+        if mode == 'inline':
+            return JsonResponse(report)
+        response['X-Profile-Id'] = report['id']
+        return response
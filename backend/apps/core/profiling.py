@@ -0,0 +1,163 @@
+# apps/core/profiling.py
+"""
+On-demand request profiling.
+
+``profile_call`` runs a callable under cProfile, tracemalloc and a SQL
+capture, and turns the result into a JSON-serializable report: top
+functions by cumulative time, time per layer (ORM, database driver,
+serializers, pandas/NumPy), SQL statements with timings and EXPLAIN plans
+for the slowest SELECTs, and peak Python allocation. Reports are written to
+PROFILING_DIR, keeping at most PROFILING_MAX_FILES.
+
+tracemalloc and its peak are process-wide (and slow every thread while on),
+so one call is profiled at a time per process; ``profile_call`` raises
+ProfilerBusy instead of waiting while another runs.
+"""
+import cProfile
+import json
+import os
+import pstats
+import time
+import threading
+import tracemalloc
+import uuid
+from pathlib import Path
+
+from django.conf import settings
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+# First matching path fragment decides which layer a function's own time belongs to
+LAYERS = (
+    ('database', ('psycopg2', 'sqlite3')),
+    ('orm', (os.path.join('django', 'db'),)),
+    ('serializer', (os.path.join('rest_framework', 'serializers'), os.path.join('rest_framework', 'fields'),
+                    os.path.join('rest_framework', 'relations'))),
+    ('pandas', ('pandas', 'numpy')),
+    ('rendering', (os.path.join('rest_framework', 'renderers'), 'json')),
+)
+
+
+_profile_lock = threading.Lock()
+
+
+class ProfilerBusy(Exception):
+    """Another call is being profiled in this process."""
+
+
+def _layer(filename):
+    for layer, fragments in LAYERS:
+        if any(fragment in filename for fragment in fragments):
+            return layer
+    return 'other'
+
+
+def _functions(stats, limit):
+    rows = []
+    by_layer = {}
+    for (filename, lineno, name), (_, ncalls, tottime, cumtime, _) in stats.stats.items():
+        layer = _layer(filename)
+        by_layer[layer] = by_layer.get(layer, 0.0) + tottime
+        rows.append({
+            'function': f"{filename}:{lineno}({name})",
+            'layer': layer,
+            'calls': ncalls,
+            'tottime_ms': round(tottime * 1000, 3),
+            'cumtime_ms': round(cumtime * 1000, 3),
+        })
+    rows.sort(key=lambda row: row['cumtime_ms'], reverse=True)
+    return rows[:limit], {layer: round(seconds * 1000, 3) for layer, seconds in by_layer.items()}
+
+
+def explain(sql):
+    """Return the database's plan for a SELECT statement (as captured by Django)."""
+    if not sql.lstrip().upper().startswith('SELECT'):
+        return None
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(f"{connection.ops.explain_query_prefix()} {sql}")
+            return [' '.join(str(column) for column in row) for row in cursor.fetchall()]
+    except Exception as e:
+        return [f"EXPLAIN failed: {e}"]
+
+
+def _sql_report(captured, explain_slowest):
+    statements = [{'sql': query['sql'], 'time_ms': round(float(query['time']) * 1000, 3)} for query in captured]
+    for statement in sorted(statements, key=lambda s: s['time_ms'], reverse=True)[:explain_slowest]:
+        statement['explain'] = explain(statement['sql'])
+    return {
+        'count': len(statements),
+        'total_ms': round(sum(s['time_ms'] for s in statements), 3),
+        'statements': statements,
+    }
+
+
+def profile_call(func, *args, **kwargs):
+    """
+    Call ``func`` under the profilers. Returns ``(result, report)``. Raises
+    ProfilerBusy, without calling ``func``, while another call is profiled.
+    """
+    top_functions = getattr(settings, 'PROFILING_TOP_FUNCTIONS', 40)
+    explain_slowest = getattr(settings, 'PROFILING_EXPLAIN_SLOWEST', 3)
+
+    if not _profile_lock.acquire(blocking=False):
+        raise ProfilerBusy("Another request is being profiled.")
+    try:
+        profiler = cProfile.Profile()
+        # Tracing started outside (PYTHONTRACEMALLOC) is left running
+        already_tracing = tracemalloc.is_tracing()
+        if not already_tracing:
+            tracemalloc.start()
+        tracemalloc.reset_peak()
+        started = time.perf_counter()
+        try:
+            with CaptureQueriesContext(connection) as queries:
+                profiler.enable()
+                try:
+                    result = func(*args, **kwargs)
+                finally:
+                    profiler.disable()
+            duration = time.perf_counter() - started
+            _, peak = tracemalloc.get_traced_memory()
+            snapshot = tracemalloc.take_snapshot()
+        finally:
+            if not already_tracing:
+                tracemalloc.stop()
+    finally:
+        _profile_lock.release()
+
+    functions, by_layer = _functions(pstats.Stats(profiler), top_functions)
+    report = {
+        'id': uuid.uuid4().hex,
+        'created_at': timezone.now().isoformat(),
+        'duration_ms': round(duration * 1000, 3),
+        'peak_memory_kb': round(peak / 1024, 1),
+        'top_allocations': [
+            {'location': str(stat.traceback), 'size_kb': round(stat.size / 1024, 1), 'count': stat.count}
+            for stat in snapshot.statistics('lineno')[:10]
+        ],
+        'time_by_layer_ms': by_layer,
+        'functions': functions,
+        'sql': _sql_report(queries.captured_queries, explain_slowest),
+    }
+    return result, report
+
+
+def profiles_dir():
+    return Path(getattr(settings, 'PROFILING_DIR', Path(settings.BASE_DIR) / 'profiles'))
+
+
+def save_profile(report):
+    """Write ``report`` to disk and prune the oldest files past the retention limit."""
+    directory = profiles_dir()
+    directory.mkdir(parents=True, exist_ok=True)
+    path = directory / f"{report['id']}.json"
+    with open(path, 'w') as fh:
+        json.dump(report, fh, indent=2, default=str)
+
+    keep = getattr(settings, 'PROFILING_MAX_FILES', 50)
+    saved = sorted(directory.glob('*.json'), key=lambda p: p.stat().st_mtime, reverse=True)
+    for old in saved[keep:]:
+        old.unlink(missing_ok=True)
+    return path
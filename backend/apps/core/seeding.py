@@ -0,0 +1,351 @@
+# apps/core/seeding.py
+"""
+Reproducible synthetic CRM data for benchmarks and load tests.
+
+Everything is generated from a single NumPy seed and inserted with
+``bulk_create`` in batches, so the same arguments always produce the same
+dataset. Seeded users get a ``seed_`` username prefix and ``flush_seed_data``
+removes only what was seeded (properties, leads and visits hang off those
+users), never real accounts.
+"""
+from contextlib import contextmanager
+from datetime import datetime, time, timedelta
+
+import numpy as np
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.db import transaction
+from django.utils import timezone
+
+from apps.accounts.workload import reconcile_agent_workloads
+from apps.leads.models import Lead
+from apps.property.attributes import reconcile_property_attributes
+from apps.property.counters import reconcile_property_counters
+from apps.property.geo import geocode, geohash_encode
+from apps.property.matching import LEAD_INDEX
+from apps.property.models import (
+    ListingType, Property, PropertyAmenity, PropertyImage, PropertySpecification, PropertyStatus, PropertyType, Unit,
+)
+from apps.property.removal import remove_properties
+from apps.property.similarity import rebuild_similar_properties
+from apps.site_visits.models import SiteVisit
+
+User = get_user_model()
+
+SEED_PREFIX = 'seed_'
+SEED_PASSWORD = 'seed-password-123'
+
+FIRST_NAMES = [
+    'Aarav', 'Vivaan', 'Aditya', 'Vihaan', 'Arjun', 'Sai', 'Reyansh', 'Krishna', 'Ishaan', 'Rahul',
+    'Ananya', 'Diya', 'Priya', 'Saanvi', 'Aadhya', 'Kavya', 'Isha', 'Meera', 'Neha', 'Pooja',
+]
+LAST_NAMES = [
+    'Sharma', 'Verma', 'Patel', 'Shah', 'Mehta', 'Iyer', 'Reddy', 'Nair', 'Gupta', 'Singh',
+    'Kumar', 'Joshi', 'Desai', 'Kapoor', 'Malhotra', 'Chopra', 'Bose', 'Das', 'Rao', 'Jain',
+]
+LOCATIONS = [
+    'Andheri West, Mumbai', 'Powai, Mumbai', 'Thane West, Thane', 'Baner, Pune', 'Hinjewadi, Pune',
+    'Whitefield, Bengaluru', 'Koramangala, Bengaluru', 'Gachibowli, Hyderabad', 'Satellite, Ahmedabad',
+    'Vesu, Surat', 'Sector 62, Noida', 'DLF Phase 3, Gurugram', 'Salt Lake, Kolkata', 'Anna Nagar, Chennai',
+]
+SUB_TYPES = {
+    PropertyType.HOUSE: ['apartment', 'villa', 'row_house', 'penthouse', 'studio'],
+    PropertyType.COMMERCIAL: ['office', 'shop', 'showroom', 'warehouse'],
+    PropertyType.LAND: ['residential_plot', 'agricultural', 'industrial_plot'],
+}
+AMENITIES = [
+    'gym', 'swimming_pool', 'parking', 'club_house', 'security', 'power_backup', 'lift',
+    'garden', 'play_area', 'jogging_track', 'intercom', 'gas_pipeline', 'wifi', 'cctv',
+]
+FURNISHING = ['furnished', 'semi_furnished', 'unfurnished']
+FACING = ['north', 'south', 'east', 'west', 'north_east', 'south_west']
+PIPELINE = [
+    'New', 'Contacted', 'Site Visit Scheduled', 'Site Visit Done',
+    'Qualified', 'Proposal', 'Negotiation', 'Converted',
+]
+SOURCES = [choice for choice, _ in Lead.SOURCE_CHOICES]
+SOURCE_WEIGHTS = [0.3, 0.2, 0.15, 0.15, 0.1, 0.05, 0.05]
+PRIORITIES = [choice for choice, _ in Lead.PRIORITY_CHOICES]
+VISIT_STATUSES = ['scheduled', 'confirmed', 'completed', 'cancelled', 'no_show']
+VISIT_STATUS_WEIGHTS = [0.3, 0.15, 0.4, 0.1, 0.05]
+
+
+@contextmanager
+def backdating(model, *field_names):
+    """
+    Temporarily disable auto_now/auto_now_add on ``field_names`` so
+    bulk_create keeps the generated timestamps.
+    """
+    fields = [model._meta.get_field(name) for name in field_names]
+    saved = [(field.auto_now, field.auto_now_add) for field in fields]
+    try:
+        for field in fields:
+            field.auto_now = field.auto_now_add = False
+        yield
+    finally:
+        for field, (auto_now, auto_now_add) in zip(fields, saved):
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+def _person(rng):
+    return str(rng.choice(FIRST_NAMES)), str(rng.choice(LAST_NAMES))
+
+
+def _phone(rng):
+    return f"9{rng.integers(100000000, 999999999)}"
+
+
+def messy_budget(rng, amount):
+    """Render ``amount`` (rupees) the way people actually type budgets."""
+    style = rng.integers(0, 10)
+    if style == 0:
+        return ''
+    if style == 1:
+        return str(rng.choice(['TBD', 'Negotiable', '-', 'n/a']))
+    if style == 2:
+        return f"{amount / 100000:.0f} lakh"
+    if style == 3:
+        return f"{amount / 10000000:.2f} Cr"
+    if style == 4:
+        return f"₹{amount:,.0f}"
+    if style == 5:
+        return f"  {amount:.0f} "
+    if style == 6:
+        return f"{amount:.2f}"
+    return f"{amount:.0f}"
+
+
+def _status_history(rng, created_at, now):
+    """
+    Walk the lead pipeline from 'New', returning the final status, the last
+    transition time and a readable history line for the lead's notes.
+    """
+    steps = min(int(rng.geometric(0.35)) - 1, len(PIPELINE) - 1)
+    statuses = PIPELINE[:steps + 1]
+    if steps < len(PIPELINE) - 1 and rng.random() < 0.15:
+        statuses.append('Dropped')
+
+    moment = created_at
+    history = []
+    for status in statuses:
+        history.append(f"{status} ({moment:%Y-%m-%d})")
+        moment = min(moment + timedelta(hours=float(rng.exponential(72))), now)
+    return statuses[-1], moment, 'Status history: ' + ' -> '.join(history)
+
+
+def _bulk(model, objects, batch_size):
+    created = []
+    for start in range(0, len(objects), batch_size):
+        created.extend(model.objects.bulk_create(objects[start:start + batch_size], batch_size=batch_size))
+    return created
+
+
+def flush_seed_data():
+    """
+    Delete everything created by a previous seed run, a statement per table
+    rather than a signal per row: properties (with their visits, images,
+    amenities and units) go through ``remove_properties``, seeded leads and
+    leftover visits are deleted with one DELETE each, and the counters those
+    rows' signals would have kept are recomputed once at the end.
+    """
+    seed_users = User.objects.filter(username__startswith=SEED_PREFIX)
+    leads = Lead.objects.filter(created_by__in=seed_users)
+    # Real properties seeded leads or visits point at, whose counters change
+    touched = set(leads.exclude(property=None).order_by().values_list('property_id', flat=True).distinct())
+
+    with transaction.atomic():
+        Unit.objects.filter(lead__in=leads).update(lead=None, updated_at=timezone.now())
+        leads._raw_delete(leads.db)
+        visits = SiteVisit.objects.filter(client_user__in=seed_users)
+        touched |= set(visits.order_by().values_list('property_id', flat=True).distinct())
+        visits._raw_delete(visits.db)
+    seeded_properties = Property.objects.filter(created_by__in=seed_users)
+    remove_properties(list(seeded_properties.values_list('pk', flat=True)))
+
+    # Few rows are left pointing at seeded users (real leads assigned to a seeded agent)
+    removed = seed_users.delete()[0]
+    reconcile_property_counters(Property.objects.filter(pk__in=touched))
+    reconcile_agent_workloads()
+    if LEAD_INDEX.built:
+        LEAD_INDEX.rebuild()
+    return removed
+
+
+def seed_crm(admins=1, managers=3, agents=20, clients=500, properties=200, leads=10000, visits=2000,
+             images_per_property=3, seed=42, batch_size=5000, stdout=None):
+    """
+    Generate a full dataset and return a summary of the row counts created.
+    """
+    rng = np.random.default_rng(seed)
+    now = timezone.now()
+    log = stdout.write if stdout else (lambda message: None)
+    password = make_password(SEED_PASSWORD)  # hash once, share across seeded users
+
+    with transaction.atomic():
+        users = []
+        for role, count in (('admin', admins), ('manager', managers), ('agent', agents), ('client', clients)):
+            for i in range(count):
+                first, last = _person(rng)
+                username = f"{SEED_PREFIX}{role}_{i:05d}"
+                users.append(User(
+                    username=username,
+                    email=f"{username}@example.com",
+                    first_name=first,
+                    last_name=last,
+                    phone_number=_phone(rng),
+                    role=role,
+                    password=password,
+                    is_staff=role == 'admin',
+                ))
+        # bulk_create skips User.save(); fill the client identity columns here,
+        # leaving the rare duplicate random phone number unindexed
+        seen_phones = set()
+        for user in users:
+            user.sync_identity()
+            if user.phone_normalized in seen_phones:
+                user.phone_normalized = None
+            seen_phones.add(user.phone_normalized)
+        users = _bulk(User, users, batch_size)
+        staff = [u for u in users if u.role in ('admin', 'manager', 'agent')]
+        agent_users = [u for u in users if u.role == 'agent'] or staff
+        client_users = [u for u in users if u.role == 'client'] or staff
+        log(f"Created {len(users)} users")
+
+        type_choices = list(SUB_TYPES)
+        property_rows = []
+        with backdating(Property, 'created_at', 'updated_at'):
+            for i in range(properties):
+                property_type = type_choices[rng.choice(len(type_choices), p=[0.7, 0.2, 0.1])]
+                area = float(np.round(rng.lognormal(7.0, 0.5), 2))
+                price_per_sqft = float(rng.uniform(3000, 25000))
+                status = str(rng.choice(PropertyStatus.values, p=[0.55, 0.25, 0.1, 0.1]))
+                units_total = int(rng.integers(20, 400)) if status == PropertyStatus.UNDER_CONSTRUCTION else 0
+                created_at = now - timedelta(days=float(rng.uniform(0, 730)))
+                location = str(rng.choice(LOCATIONS))
+                # Gazetteer point scattered over ~2 km so radius searches have spread
+                place = geocode(location)
+                latitude = round(place['latitude'] + float(rng.normal(0, 0.015)), 6) if place else None
+                longitude = round(place['longitude'] + float(rng.normal(0, 0.015)), 6) if place else None
+                property_rows.append(Property(
+                    title=f"{str(rng.choice(LAST_NAMES))} {str(rng.choice(['Heights', 'Residency', 'Enclave', 'Towers', 'Park', 'Plaza']))} {i}",
+                    property_type=property_type,
+                    property_sub_type=str(rng.choice(SUB_TYPES[property_type])),
+                    listing_type=str(rng.choice(ListingType.values, p=[0.8, 0.2])),
+                    status=status,
+                    location=location,
+                    latitude=latitude,
+                    longitude=longitude,
+                    # bulk_create skips Property.save, which derives the geohash
+                    geohash=geohash_encode(latitude, longitude) if place else '',
+                    price=round(area * price_per_sqft, 2),
+                    area=area,
+                    carpet_area=round(area * 0.8, 2),
+                    description=f"Seeded {property_type} listing #{i}.",
+                    facing=str(rng.choice(FACING)),
+                    furnishing_status=str(rng.choice(FURNISHING)),
+                    loan_amount=round(area * price_per_sqft * 0.8, 2),
+                    interest_rate=float(np.round(rng.uniform(7.5, 10.5), 2)),
+                    loan_term=int(rng.choice([10, 15, 20, 25, 30])),
+                    contact_name=' '.join(_person(rng)),
+                    contact_phone=_phone(rng),
+                    created_by=staff[rng.integers(len(staff))],
+                    created_at=created_at,
+                    updated_at=created_at,
+                    progress=int(rng.integers(0, 100)) if units_total else 0,
+                    units_total=units_total,
+                    units_available=int(rng.integers(0, units_total + 1)) if units_total else 0,
+                ))
+            property_rows = _bulk(Property, property_rows, batch_size)
+        log(f"Created {len(property_rows)} properties")
+
+        images, amenities, specifications = [], [], []
+        for prop in property_rows:
+            for n in range(images_per_property):
+                images.append(PropertyImage(
+                    property=prop,
+                    image=f"property_images/seed/sample_{rng.integers(1, 51):02d}.jpg",
+                    is_primary=n == 0,
+                ))
+            for name in rng.choice(AMENITIES, size=int(rng.integers(2, 9)), replace=False):
+                amenities.append(PropertyAmenity(property=prop, name=str(name)))
+            bedrooms = int(rng.integers(1, 6))
+            for key, value in (('bedrooms', bedrooms), ('bathrooms', max(1, bedrooms - int(rng.integers(0, 2)))),
+                               ('parking_spots', int(rng.integers(0, 3))), ('total_floors', int(rng.integers(1, 40)))):
+                specifications.append(PropertySpecification(property=prop, key=key, value=str(value)))
+        _bulk(PropertyImage, images, batch_size)
+        _bulk(PropertyAmenity, amenities, batch_size)
+        _bulk(PropertySpecification, specifications, batch_size)
+        log(f"Created {len(images)} images, {len(amenities)} amenities, {len(specifications)} specifications")
+
+    # Leads go in their own transactions, one per batch, to keep memory flat at 1M rows
+    created_leads = 0
+    with backdating(Lead, 'created_at', 'updated_at'):
+        for start in range(0, leads, batch_size):
+            batch = []
+            for _ in range(min(batch_size, leads - start)):
+                first, last = _person(rng)
+                created_at = now - timedelta(days=float(rng.uniform(0, 365)))
+                status, updated_at, history = _status_history(rng, created_at, now)
+                prop = property_rows[rng.integers(len(property_rows))] if property_rows and rng.random() < 0.8 else None
+                budget_amount = float(prop.price) if prop else float(rng.lognormal(15.5, 0.6))
+                batch.append(Lead(
+                    property=prop,
+                    name=f"{first} {last}",
+                    email=f"{first.lower()}.{last.lower()}{rng.integers(1, 100000)}@example.com",
+                    phone=_phone(rng),
+                    company=str(rng.choice(['', '', 'Infosys', 'TCS', 'Reliance', 'HDFC', 'Self-employed'])),
+                    status=status,
+                    source=str(rng.choice(SOURCES, p=SOURCE_WEIGHTS)),
+                    interest=prop.property_sub_type if prop else '',
+                    priority=str(rng.choice(PRIORITIES, p=[0.2, 0.5, 0.2, 0.1])),
+                    assigned_to=agent_users[rng.integers(len(agent_users))] if rng.random() < 0.9 else None,
+                    budget=messy_budget(rng, budget_amount * float(rng.uniform(0.8, 1.2))),
+                    timeline=str(rng.choice(['Immediate', '1-3 months', '3-6 months', '6+ months', ''])),
+                    notes=history,
+                    tags=[str(tag) for tag in rng.choice(['hot', 'investor', 'nri', 'first-home', 'loan'], size=int(rng.integers(0, 3)), replace=False)],
+                    last_activity=f"Status changed to {status}",
+                    created_by=staff[rng.integers(len(staff))],
+                    created_at=created_at,
+                    updated_at=updated_at,
+                ))
+            with transaction.atomic():
+                Lead.objects.bulk_create(batch, batch_size=batch_size)
+            created_leads += len(batch)
+            log(f"Created {created_leads}/{leads} leads")
+
+    visit_rows = []
+    if property_rows:
+        for _ in range(visits):
+            visit_date = (now + timedelta(days=float(rng.uniform(-90, 45)))).date()
+            hour = int(rng.integers(9, 19))
+            visit_rows.append(SiteVisit(
+                property=property_rows[rng.integers(len(property_rows))],
+                agent=agent_users[rng.integers(len(agent_users))],
+                client_user=client_users[rng.integers(len(client_users))],
+                date=visit_date,
+                time=datetime.combine(visit_date, time(hour, int(rng.choice([0, 30])))).strftime('%I:%M %p').lstrip('0'),
+                status=str(rng.choice(VISIT_STATUSES, p=VISIT_STATUS_WEIGHTS)),
+            ))
+        # bulk_create skips SiteVisit.save(), which derives start/end
+        for visit in visit_rows:
+            visit.sync_schedule()
+        with transaction.atomic():
+            visit_rows = _bulk(SiteVisit, visit_rows, batch_size)
+    log(f"Created {len(visit_rows)} site visits")
+
+    # bulk_create skips the signals that maintain property counters
+    reconcile_property_counters(Property.objects.filter(pk__in=[p.pk for p in property_rows]))
+    # Amenities and specifications were bulk-created without their signals
+    reconcile_property_attributes(Property.objects.filter(pk__in=[p.pk for p in property_rows]))
+    rebuild_similar_properties()
+    reconcile_agent_workloads()
+
+    return {
+        'users': len(users),
+        'properties': len(property_rows),
+        'images': len(images),
+        'amenities': len(amenities),
+        'specifications': len(specifications),
+        'leads': created_leads,
+        'site_visits': len(visit_rows),
+    }
@@ -0,0 +1,138 @@
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import URLPattern, URLResolver, get_resolver, reverse
+from django.utils import timezone
+from rest_framework import serializers
+from rest_framework.test import APIClient
+
+from apps.core.middleware import fingerprint, responsible_serializer_field
+from apps.core.seeding import flush_seed_data, seed_crm
+from apps.leads.models import Lead
+from apps.property.matching import LEAD_INDEX, PROPERTY_INDEX
+from apps.property.models import Property
+from apps.property.stats import MARKET_SNAPSHOT
+from apps.site_visits.models import SiteVisit
+
+User = get_user_model()
+
+# Sample object for each router basename, used to fill in detail routes
+DETAIL_OBJECTS = {
+    'lead': lambda: Lead.objects.order_by('pk').first(),
+    'property': lambda: Property.objects.order_by('pk').first(),
+    'sitevisit': lambda: SiteVisit.objects.order_by('pk').first(),
+}
+
+SMALL_DATASET = dict(admins=1, managers=1, agents=2, clients=3, properties=3, leads=6, visits=6, images_per_property=1)
+LARGE_DATASET = dict(admins=1, managers=1, agents=6, clients=12, properties=12, leads=40, visits=40, images_per_property=4)
+
+
+def router_routes(patterns=None, namespace=None):
+    """
+    Yield ``(url_name, basename, is_detail)`` for every GET route registered
+    through a DRF router.
+    """
+    seen = set()
+    for pattern in get_resolver().url_patterns if patterns is None else patterns:
+        if isinstance(pattern, URLResolver):
+            for route in router_routes(pattern.url_patterns, pattern.namespace or namespace):
+                if route[0] not in seen:
+                    seen.add(route[0])
+                    yield route
+        elif isinstance(pattern, URLPattern):
+            actions = getattr(pattern.callback, 'actions', None) or {}
+            basename = getattr(pattern.callback, 'initkwargs', {}).get('basename')
+            if 'get' not in actions or not basename or not pattern.name:
+                continue
+            name = f'{namespace}:{pattern.name}' if namespace else pattern.name
+            if name not in seen:
+                seen.add(name)
+                yield name, basename, 'pk' in pattern.pattern.regex.groupindex
+
+
+# Every route is requested several times as one user; the rate limits (and
+# their state file, shared with the dev server) would turn some into 429s
+@override_settings(THROTTLE_ENABLED=False)
+class QueryCountRegressionTests(TestCase):
+    """
+    Every router GET route must run the same number of queries no matter how
+    many rows it returns; a difference means a per-row (N+1) query.
+    """
+
+    def query_counts(self, dataset, role):
+        flush_seed_data()
+        seed_crm(**dataset)
+        # The matching indexes and the market snapshot live for the whole
+        # process; start each dataset cold so both runs pay for the same full build
+        for index in (PROPERTY_INDEX, LEAD_INDEX, MARKET_SNAPSHOT):
+            index.reset()
+        # Seeded visit dates are relative to now; make sure date-filtered routes
+        # (upcoming visits) return rows in both datasets, since an empty result
+        # skips its prefetch queries
+        for visit in SiteVisit.objects.order_by('pk')[:2]:
+            visit.date = timezone.localdate() + timedelta(days=1)
+            visit.status = 'scheduled'
+            visit.save()
+        # Likewise the matching routes: the sample lead is open, visible to the
+        # first agent and priced for the sample property, so both directions
+        # return matches in both datasets
+        lead = DETAIL_OBJECTS['lead']()
+        lead.status = 'New'
+        lead.property = None
+        lead.budget = str(DETAIL_OBJECTS['property']().price)
+        lead.assigned_to = User.objects.filter(username__startswith='seed_agent_').order_by('pk').first()
+        lead.save()
+        client = APIClient()
+        client.force_authenticate(User.objects.filter(username__startswith=f'seed_{role}_').order_by('pk').first())
+
+        counts = {}
+        for name, basename, is_detail in router_routes():
+            kwargs = {}
+            if is_detail:
+                if basename not in DETAIL_OBJECTS:
+                    self.fail(f"Add a sample object for router basename '{basename}' to DETAIL_OBJECTS")
+                kwargs['pk'] = DETAIL_OBJECTS[basename]().pk
+            url = reverse(name, kwargs=kwargs)
+            with CaptureQueriesContext(connection) as queries:
+                response = client.get(url)
+            self.assertLess(response.status_code, 500, f"{url} failed: {response.status_code}")
+            counts[name] = len(queries)
+        return counts
+
+    def assert_constant_query_counts(self, role):
+        small = self.query_counts(SMALL_DATASET, role)
+        large = self.query_counts(LARGE_DATASET, role)
+        self.assertTrue(small, "No router routes found")
+        for name, count in small.items():
+            with self.subTest(route=name, role=role):
+                self.assertEqual(count, large[name], f"{name} ran {count} queries with the small dataset and {large[name]} with the large one")
+
+    def test_admin_routes_have_constant_query_counts(self):
+        self.assert_constant_query_counts('admin')
+
+    def test_agent_routes_have_constant_query_counts(self):
+        self.assert_constant_query_counts('agent')
+
+
+class QueryShapeTests(TestCase):
+    def test_fingerprint_ignores_literals(self):
+        first = fingerprint('SELECT * FROM "leads_lead" WHERE "id" = 1 AND "status" = \'New\'')
+        second = fingerprint('SELECT  *  FROM "leads_lead" WHERE "id" = 42 AND "status" = \'Converted\'')
+        self.assertEqual(first, second)
+        self.assertEqual(
+            fingerprint('SELECT 1 FROM t WHERE id IN (%s, %s)'),
+            fingerprint('SELECT 1 FROM t WHERE id IN (%s, %s, %s, %s)'),
+        )
+
+    def test_responsible_serializer_field_names_the_field(self):
+        class ProbeSerializer(serializers.Serializer):
+            origin = serializers.SerializerMethodField()
+
+            def get_origin(self, obj):
+                return responsible_serializer_field()
+
+        self.assertEqual(ProbeSerializer({}).data['origin'], 'ProbeSerializer.origin')
+        self.assertIsNone(responsible_serializer_field())
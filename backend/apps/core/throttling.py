@@ -0,0 +1,261 @@
+# apps/core/throttling.py
+"""
+Rate limiting and admission control for expensive endpoints.
+
+Views opt in with a ``throttle_scope`` (on ViewSet actions it can be passed
+to ``@action``). Each scope in settings.THROTTLE_SCOPES may set:
+
+- ``user``: token bucket per user, e.g. '10/min'. Anonymous requests are
+  keyed on the submitted username/email together with the client address,
+  so attempts on one account are limited per address without letting
+  anybody lock the account out from elsewhere.
+- ``account``: a looser bucket per submitted username/email regardless of
+  address, which caps guessing one account's password from many addresses.
+- ``ip``: token bucket per client address.
+- ``concurrency``: at most this many requests of the scope run at once
+  across all worker processes; views need ``AdmissionControlMixin``.
+- ``retry_after``: seconds suggested to callers turned away by the
+  concurrency limit (default 5).
+- ``lease``: seconds after which a slot held by a worker that died
+  mid-request is freed (default 300).
+
+A rate 'N/period' is a bucket holding N tokens that refills at N per period,
+so bursts up to N are allowed. Client addresses come from DRF's
+``get_ident``: REMOTE_ADDR, or X-Forwarded-For only as far as
+REST_FRAMEWORK['NUM_PROXIES'] trusted proxies set it. State lives in a small SQLite file
+(THROTTLE_STATE_PATH) shared by every worker on the host; if it can't be
+used the request is let through.
+"""
+import math
+import os
+import sqlite3
+import threading
+import time
+import uuid
+
+from django.conf import settings
+from rest_framework.exceptions import Throttled
+from rest_framework.throttling import BaseThrottle
+
+PERIODS = {'s': 1, 'sec': 1, 'm': 60, 'min': 60, 'h': 3600, 'hour': 3600, 'd': 86400, 'day': 86400}
+
+# Idle buckets are full again after at most a day, so their rows can go
+BUCKET_IDLE_SECONDS = 86400
+
+
+def parse_rate(rate):
+    """'10/min' -> (capacity 10, refill 10/60 tokens per second)."""
+    count, period = rate.split('/')
+    return int(count), int(count) / PERIODS[period.strip().lower()]
+
+
+def scope_config(scope):
+    return getattr(settings, 'THROTTLE_SCOPES', {}).get(scope) or {}
+
+
+def throttling_enabled():
+    return getattr(settings, 'THROTTLE_ENABLED', True)
+
+
+class SQLiteThrottleState:
+    """
+    Token buckets and concurrency leases in a SQLite database. Every update
+    runs in a ``BEGIN IMMEDIATE`` transaction, which serializes writers
+    across processes.
+    """
+
+    def __init__(self, path):
+        self.path = str(path)
+        self._local = threading.local()
+        self._calls = 0
+
+    def _connection(self):
+        # One connection per thread, reopened after a fork
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("CREATE TABLE IF NOT EXISTS buckets (key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL)")
+            conn.execute("CREATE TABLE IF NOT EXISTS leases (holder TEXT PRIMARY KEY, scope TEXT NOT NULL, expires REAL NOT NULL)")
+            conn.execute("CREATE INDEX IF NOT EXISTS leases_scope ON leases (scope, expires)")
+            self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    def _transaction(self, work):
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            result = work(conn)
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+        return result
+
+    def take(self, buckets):
+        """
+        Take one token from every bucket in ``buckets`` ((key, capacity,
+        refill per second) tuples), or from none of them. Returns 0 when
+        admitted, otherwise the seconds until all buckets have a token.
+        """
+        now = time.time()
+
+        def work(conn):
+            keys = [key for key, _, _ in buckets]
+            stored = dict((key, (tokens, updated)) for key, tokens, updated in conn.execute(
+                f"SELECT key, tokens, updated FROM buckets WHERE key IN ({','.join('?' * len(keys))})", keys))
+            levels = []
+            wait = 0.0
+            for key, capacity, refill in buckets:
+                tokens, updated = stored.get(key, (capacity, now))
+                tokens = min(capacity, tokens + (now - updated) * refill)
+                if tokens < 1:
+                    wait = max(wait, (1 - tokens) / refill)
+                levels.append((key, tokens))
+            if wait == 0:
+                conn.executemany(
+                    "INSERT OR REPLACE INTO buckets (key, tokens, updated) VALUES (?, ?, ?)",
+                    [(key, tokens - 1, now) for key, tokens in levels],
+                )
+            self._calls += 1
+            if self._calls % 1000 == 0:
+                conn.execute("DELETE FROM buckets WHERE updated < ?", [now - BUCKET_IDLE_SECONDS])
+            return wait
+
+        return self._transaction(work)
+
+    def acquire(self, scope, limit, lease_seconds):
+        """Take one of ``limit`` slots for ``scope``; returns a holder id, or None if all are taken."""
+        now = time.time()
+        holder = uuid.uuid4().hex
+
+        def work(conn):
+            # Leases of crashed or killed workers run out instead of leaking
+            conn.execute("DELETE FROM leases WHERE scope = ? AND expires <= ?", [scope, now])
+            (active,) = conn.execute("SELECT COUNT(*) FROM leases WHERE scope = ?", [scope]).fetchone()
+            if active >= limit:
+                return None
+            conn.execute("INSERT INTO leases (holder, scope, expires) VALUES (?, ?, ?)", [holder, scope, now + lease_seconds])
+            return holder
+
+        return self._transaction(work)
+
+    def release(self, holder):
+        self._connection().execute("DELETE FROM leases WHERE holder = ?", [holder])
+
+    def clear(self):
+        self._transaction(lambda conn: (conn.execute("DELETE FROM buckets"), conn.execute("DELETE FROM leases")))
+
+
+_state = None
+_state_lock = threading.Lock()
+
+
+def get_state():
+    global _state
+    path = getattr(settings, 'THROTTLE_STATE_PATH', os.path.join(settings.BASE_DIR, 'throttle_state.sqlite3'))
+    with _state_lock:
+        if _state is None or _state.path != str(path):
+            _state = SQLiteThrottleState(path)
+        return _state
+
+
+class TokenBucketThrottle(BaseThrottle):
+    """Per-user and per-IP token buckets for views that set ``throttle_scope``."""
+
+    def allow_request(self, request, view):
+        self.wait_seconds = None
+        scope = getattr(view, 'throttle_scope', None)
+        if not scope or not throttling_enabled():
+            return True
+        config = scope_config(scope)
+
+        buckets = []
+        identity = self.get_identity(request) if config.get('user') else None
+        if identity:
+            buckets.append((f"{scope}:{identity}", *parse_rate(config['user'])))
+        account = self.get_account(request) if config.get('account') else None
+        if account:
+            buckets.append((f"{scope}:account:{account}", *parse_rate(config['account'])))
+        if config.get('ip'):
+            buckets.append((f"{scope}:ip:{self.get_ident(request)}", *parse_rate(config['ip'])))
+        if not buckets:
+            return True
+
+        try:
+            wait = get_state().take(buckets)
+        except Exception as e:
+            print(f"Throttle state unavailable, allowing request: {e}")
+            return True
+        if wait:
+            self.wait_seconds = wait
+            return False
+        return True
+
+    def get_account(self, request):
+        """The username/email an anonymous request submits, normalized, or None."""
+        user = getattr(request, 'user', None)
+        if user is not None and user.is_authenticated:
+            return None
+        data = request.data if hasattr(request.data, 'get') else {}
+        for field in ('username', 'email'):
+            value = data.get(field)
+            if isinstance(value, str) and value.strip():
+                return value.strip().lower()
+        return None
+
+    def get_identity(self, request):
+        user = getattr(request, 'user', None)
+        if user is not None and user.is_authenticated:
+            return f"user:{user.pk}"
+        account = self.get_account(request)
+        if account:
+            # Per address as well: with the tight limit on the account alone
+            # anyone could exhaust it with bogus attempts and lock the user out
+            return f"account:{account}:ip:{self.get_ident(request)}"
+        return None
+
+    def wait(self):
+        return math.ceil(self.wait_seconds) if self.wait_seconds else None
+
+
+class AdmissionControlMixin:
+    """
+    Holds a concurrency slot for the view's ``throttle_scope`` while the
+    request runs; when the scope is full the request gets 429 with
+    Retry-After instead of queueing behind the others.
+    """
+    # Declared so ViewSet actions can set it through @action(throttle_scope=...)
+    throttle_scope = None
+
+    def initial(self, request, *args, **kwargs):
+        self._admission_holder = None
+        super().initial(request, *args, **kwargs)
+
+        scope = getattr(self, 'throttle_scope', None)
+        config = scope_config(scope)
+        limit = config.get('concurrency')
+        if not scope or not limit or not throttling_enabled():
+            return
+        try:
+            self._admission_holder = get_state().acquire(scope, limit, config.get('lease', 300))
+        except Exception as e:
+            print(f"Throttle state unavailable, admitting request: {e}")
+            return
+        if self._admission_holder is None:
+            raise Throttled(
+                wait=config.get('retry_after', 5),
+                detail=f"Too many {scope.replace('_', ' ')} requests in progress. Try again shortly.",
+            )
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        holder = getattr(self, '_admission_holder', None)
+        if holder:
+            self._admission_holder = None
+            try:
+                get_state().release(holder)
+            except Exception as e:
+                print(f"Could not release admission slot: {e}")
+        return super().finalize_response(request, response, *args, **kwargs)
@@ -1,5 +1,7 @@
 from rest_framework import serializers
+from django.conf import settings
 from .models import Lead
+from apps.accounts.assignment import choose_agent
 from apps.accounts.serializers import UserSerializer
 
 class LeadSerializer(serializers.ModelSerializer):
@@ -13,4 +15,10 @@ class LeadSerializer(serializers.ModelSerializer):
 
     def create(self, validated_data):
         validated_data['created_by'] = self.context['request'].user
-        return super().create(validated_data)
\ No newline at end of file
+        # Leads submitted without an agent go to one picked by the assignment
+        # engine (an explicit null keeps the lead unassigned)
+        if 'assigned_to' not in validated_data and getattr(settings, 'ASSIGNMENT_AUTO_ASSIGN', True):
+            validated_data['assigned_to_id'] = choose_agent(
+                'lead', property=validated_data.get('property'), text=validated_data.get('interest', '')
+            )
+        return super().create(validated_data)
@@ -1,7 +1,10 @@
-from django.db.models.signals import pre_save
+from django.db.models.signals import pre_save, post_save, post_delete
 from django.dispatch import receiver
 from .models import Lead
 from .utils import send_lead_assignment_email
+from apps.accounts.workload import record_lead_assignment_change
+from apps.property.counters import record_lead_change
+from apps.property.matching import LEAD_INDEX
 from django.contrib.auth import get_user_model
 
 User = get_user_model()
@@ -15,8 +18,13 @@ def handle_lead_assignment(sender, instance, **kwargs):
         # If this is a new lead, old_instance won't exist
         old_instance = Lead.objects.get(pk=instance.pk)
         old_assigned_to = old_instance.assigned_to
+        # Remembered for the property counters in post_save
+        instance._counter_state = (old_instance.property_id, old_instance.status)
+        instance._workload_state = (old_instance.assigned_to_id, old_instance.status)
     except Lead.DoesNotExist:
         old_assigned_to = None
+        instance._counter_state = None
+        instance._workload_state = None
     
     new_assigned_to = instance.assigned_to
     
@@ -25,3 +33,46 @@ def handle_lead_assignment(sender, instance, **kwargs):
     # 2. Lead is reassigned to a different agent
     if new_assigned_to and (old_assigned_to != new_assigned_to):
         send_lead_assignment_email(instance, new_assigned_to)
+
+
+@receiver(post_save, sender=Lead)
+def update_property_counters_on_save(sender, instance, **kwargs):
+    """
+    Keep the property's lead/conversion counters in step with this lead.
+    """
+    new_state = (instance.property_id, instance.status)
+    old_state = getattr(instance, '_counter_state', None)
+    if old_state != new_state:
+        record_lead_change(old_state, new_state)
+    instance._counter_state = new_state
+
+
+@receiver(post_delete, sender=Lead)
+def update_property_counters_on_delete(sender, instance, **kwargs):
+    record_lead_change((instance.property_id, instance.status), None)
+
+
+@receiver(post_save, sender=Lead)
+def update_agent_workload_on_save(sender, instance, **kwargs):
+    """
+    Keep the agent's open lead counter in step with this lead.
+    """
+    new_state = (instance.assigned_to_id, instance.status)
+    old_state = getattr(instance, '_workload_state', None)
+    if old_state != new_state:
+        record_lead_assignment_change(old_state, new_state)
+    instance._workload_state = new_state
+
+
+@receiver(post_delete, sender=Lead)
+def update_agent_workload_on_delete(sender, instance, **kwargs):
+    record_lead_assignment_change((instance.assigned_to_id, instance.status), None)
+
+
+@receiver(post_save, sender=Lead)
+@receiver(post_delete, sender=Lead)
+def update_matching_index(sender, instance, **kwargs):
+    """
+    Have the in-memory lead matching index re-read this lead on its next query.
+    """
+    LEAD_INDEX.invalidate(instance.pk)
@@ -0,0 +1,277 @@
+# apps/leads/timeseries.py
+"""
+Helpers for bucketed time-series analytics.
+
+A metric is aggregated with a single grouped SQL query (one row per bucket and
+group value) and the sparse result is gap-filled into dense columnar arrays
+with pandas periods, so charts can plot every bucket in the range directly.
+"""
+from datetime import date, datetime, timedelta
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+import numpy as np
+import pandas as pd
+from django.conf import settings
+from django.db.models import Case, Count, FloatField, Q, Sum, Value, When, functions
+from django.db.models.functions import Cast, TruncDay, TruncMonth, TruncQuarter, TruncWeek
+
+# Period frequencies used for gap filling. Weeks start on Monday, which is
+# what date_trunc('week') returns on PostgreSQL.
+BUCKETS = {
+    'day': (TruncDay, 'D'),
+    'week': (TruncWeek, 'W-SUN'),
+    'month': (TruncMonth, 'M'),
+    'quarter': (TruncQuarter, 'Q'),
+}
+
+# How far back the range goes when the client does not send a start date.
+DEFAULT_SPANS = {
+    'day': {'days': 29},
+    'week': {'weeks': 11},
+    'month': {'days': 365},
+    'quarter': {'days': 730},
+}
+
+# Longest range each bucket size may cover, in days (TIMESERIES_MAX_DAYS
+# overrides per bucket), so a request can't ask for decades of daily points.
+MAX_SPANS = {
+    'day': 366,
+    'week': 3 * 366,
+    'month': 10 * 366,
+    'quarter': 25 * 366,
+}
+
+# Pandas periods are nanosecond timestamps (1677-2262); stay well inside.
+EARLIEST_DATE = date(1900, 1, 1)
+LATEST_DATE = date(2199, 12, 31)
+
+GROUP_BY_OPTIONS = ('source', 'status', 'agent', 'property')
+
+
+def clean_budget_expression(prefix=''):
+    """
+    SQL expression turning the free-text budget column into a non-negative
+    float (0.0 for blank or non-numeric values).
+    """
+    budget = f'{prefix}budget'
+    return Case(
+        When(Q(**{budget: ''}) | Q(**{f'{budget}__isnull': True}), then=Value(0.0)),
+        When(Q(**{f'{budget}__regex': r'^[^0-9.-]'}), then=Value(0.0)),
+        default=Case(
+            When(
+                Q(**{f'{budget}__regex': r'^-?\d*\.?\d*$'}),
+                then=functions.Greatest(Cast(budget, output_field=FloatField()), Value(0.0))
+            ),
+            default=Value(0.0),
+            output_field=FloatField(),
+        ),
+        output_field=FloatField(),
+    )
+
+
+def _lead_queryset(user):
+    from .models import Lead
+    queryset = Lead.objects.all()
+    if not (user.is_superuser or getattr(user, 'role', None) in ['admin', 'manager']):
+        queryset = queryset.filter(assigned_to=user)
+    return queryset
+
+
+def _site_visit_queryset(user):
+    from apps.site_visits.models import SiteVisit
+    queryset = SiteVisit.objects.all()
+    if not (user.is_superuser or getattr(user, 'role', None) in ['admin', 'manager']):
+        queryset = queryset.filter(agent=user)
+    return queryset
+
+
+# Each metric describes where its rows come from, which column places a row
+# in time, how rows are aggregated and which columns back every group_by.
+METRICS = {
+    'leads_created': {
+        'queryset': _lead_queryset,
+        'date_field': 'created_at',
+        'aggregate': lambda: Count('id'),
+        'group_fields': {
+            'source': ('source', 'source'),
+            'status': ('status', 'status'),
+            'agent': ('assigned_to_id', 'assigned_to__username'),
+            'property': ('property_id', 'property__title'),
+        },
+    },
+    'conversions': {
+        'queryset': lambda user: _lead_queryset(user).filter(status='Converted'),
+        'date_field': 'updated_at',
+        'aggregate': lambda: Count('id'),
+        'group_fields': {
+            'source': ('source', 'source'),
+            'status': ('status', 'status'),
+            'agent': ('assigned_to_id', 'assigned_to__username'),
+            'property': ('property_id', 'property__title'),
+        },
+    },
+    'revenue': {
+        'queryset': lambda user: _lead_queryset(user).filter(status='Converted'),
+        'date_field': 'updated_at',
+        'aggregate': lambda: Sum(clean_budget_expression()),
+        'group_fields': {
+            'source': ('source', 'source'),
+            'status': ('status', 'status'),
+            'agent': ('assigned_to_id', 'assigned_to__username'),
+            'property': ('property_id', 'property__title'),
+        },
+    },
+    'site_visits': {
+        'queryset': _site_visit_queryset,
+        'date_field': 'date',
+        'aggregate': lambda: Count('id'),
+        'group_fields': {
+            'status': ('status', 'status'),
+            'agent': ('agent_id', 'agent__username'),
+            'property': ('property_id', 'property__title'),
+        },
+    },
+}
+
+
+def resolve_timezone(name):
+    """Return a ZoneInfo for ``name`` or raise ValueError."""
+    try:
+        return ZoneInfo(name)
+    except (ZoneInfoNotFoundError, ValueError):
+        raise ValueError(f"Unknown timezone '{name}'.")
+
+
+def default_start(end, bucket):
+    return end - timedelta(**DEFAULT_SPANS[bucket])
+
+
+def resolve_range(start, end, bucket, tz=None):
+    """
+    Fill in the default ``start``/``end`` for ``bucket`` and check the range
+    is ordered, within the supported dates and no longer than the bucket's
+    maximum span. Returns ``(start, end)``; raises ValueError.
+    """
+    end = end or datetime.now(tz or ZoneInfo('UTC')).date()
+    start = start or default_start(end, bucket)
+    if start > end:
+        raise ValueError("start must be on or before end.")
+    if start < EARLIEST_DATE or end > LATEST_DATE:
+        raise ValueError(f"Dates must be between {EARLIEST_DATE.isoformat()} and {LATEST_DATE.isoformat()}.")
+    longest = getattr(settings, 'TIMESERIES_MAX_DAYS', {}).get(bucket, MAX_SPANS[bucket])
+    if (end - start).days >= longest:
+        raise ValueError(f"A {bucket} series can span at most {longest} days; use a larger bucket or a shorter range.")
+    return start, end
+
+
+def bucket_periods(start, end, bucket):
+    """All periods of ``bucket`` size touching the [start, end] date range."""
+    return pd.period_range(start=pd.Timestamp(start), end=pd.Timestamp(end), freq=BUCKETS[bucket][1])
+
+
+def gap_fill(rows, start, end, bucket):
+    """
+    Spread sparse ``{'bucket', 'group', 'value'}`` rows over every period in
+    the range.
+
+    Returns ``(periods, groups, matrix)`` where ``matrix[i, j]`` is the value
+    of ``groups[i]`` in ``periods[j]``; missing buckets are 0.
+    """
+    periods = bucket_periods(start, end, bucket)
+    if not rows:
+        return periods, [], np.zeros((0, len(periods)))
+
+    frame = pd.DataFrame.from_records(rows, columns=['bucket', 'group', 'value'])
+    stamps = pd.to_datetime(frame['bucket'])
+    if stamps.dt.tz is not None:
+        # Buckets were truncated in the requested timezone; keep the wall time.
+        stamps = stamps.dt.tz_localize(None)
+    period_codes = periods.get_indexer(stamps.dt.to_period(BUCKETS[bucket][1]))
+
+    # Group keys can be None (e.g. unassigned leads), so factorize in Python
+    # rather than letting pandas coerce them to NaN.
+    groups = list(dict.fromkeys(row['group'] for row in rows))
+    positions = {group: i for i, group in enumerate(groups)}
+    group_codes = np.fromiter((positions[row['group']] for row in rows), dtype=np.intp, count=len(rows))
+
+    in_range = period_codes >= 0
+    matrix = np.zeros((len(groups), len(periods)))
+    np.add.at(
+        matrix,
+        (group_codes[in_range], period_codes[in_range]),
+        frame['value'].fillna(0).to_numpy(dtype=float)[in_range],
+    )
+    return periods, groups, matrix
+
+
+def build_timeseries(user, metric, bucket, group_by=None, tz=None, start=None, end=None):
+    """
+    Run the grouped query for ``metric`` and return columnar chart data::
+
+        {'buckets': [...], 'series': [{'key', 'label', 'values'}], 'totals': [...]}
+    """
+    spec = METRICS[metric]
+    trunc_class = BUCKETS[bucket][0]
+    date_field = spec['date_field']
+    tz = tz or ZoneInfo('UTC')
+    start, end = resolve_range(start, end, bucket, tz)
+
+    queryset = spec['queryset'](user)
+    if date_field == 'date':
+        queryset = queryset.filter(date__gte=start, date__lte=end)
+        trunc = trunc_class(date_field)
+    else:
+        queryset = queryset.filter(**{
+            f'{date_field}__gte': datetime.combine(start, datetime.min.time(), tzinfo=tz),
+            f'{date_field}__lt': datetime.combine(end + timedelta(days=1), datetime.min.time(), tzinfo=tz),
+        })
+        trunc = trunc_class(date_field, tzinfo=tz)
+
+    group_fields = ()
+    if group_by:
+        group_fields = spec['group_fields'][group_by]
+
+    rows = queryset.annotate(bucket=trunc).values('bucket', *group_fields).annotate(
+        value=spec['aggregate']()
+    ).order_by()
+
+    labels = {}
+    records = []
+    for row in rows:
+        key = row[group_fields[0]] if group_fields else None
+        labels[key] = row[group_fields[1]] if group_fields else metric
+        records.append({'bucket': row['bucket'], 'group': key, 'value': row['value']})
+
+    periods, groups, matrix = gap_fill(records, start, end, bucket)
+    if not group_fields and not groups:
+        groups, matrix = [None], np.zeros((1, len(periods)))
+        labels[None] = metric
+
+    return {
+        'metric': metric,
+        'bucket': bucket,
+        'group_by': group_by,
+        'timezone': str(tz),
+        'start': start.isoformat(),
+        'end': end.isoformat(),
+        'buckets': [p.strftime('%Y-%m-%d') for p in periods.start_time],
+        'series': [
+            {
+                'key': key,
+                'label': labels.get(key) if labels.get(key) is not None else 'Unassigned',
+                'values': np.round(matrix[i], 2).tolist(),
+            }
+            for i, key in enumerate(groups)
+        ],
+        'totals': np.round(matrix.sum(axis=0), 2).tolist(),
+    }
+
+
+def parse_date(value):
+    """Parse an ISO date query param, returning None for blanks."""
+    if not value:
+        return None
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        raise ValueError(f"Invalid date '{value}'. Use YYYY-MM-DD.")
@@ -1,6 +1,6 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import LeadViewSet
+from .views import LeadViewSet, TimeSeriesView
 
 router = DefaultRouter()
 router.register(r'leads', LeadViewSet, basename='lead')
@@ -11,5 +11,7 @@ urlpatterns = [
     path('leads/export/', LeadViewSet.as_view({'get': 'export'}), name='lead-export'),
     path('leads/dashboard_stats/', LeadViewSet.as_view({'get': 'dashboard_stats'}), name='lead-dashboard-stats'),
     path('leads/team_performance/', LeadViewSet.as_view({'get': 'team_performance'}), name='lead-team-performance'),
+    path('leads/auto_assign/', LeadViewSet.as_view({'post': 'auto_assign'}), name='lead-auto-assign'),
     path('leads/builder_performance/', LeadViewSet.as_view({'get': 'builder_performance'}), name='lead-builder-performance'),
+    path('analytics/timeseries/', TimeSeriesView.as_view(), name='analytics-timeseries'),
 ]
@@ -1,4 +1,4 @@
-from django.core.mail import send_mail
+from django.core.mail import EmailMessage, send_mail
 from django.conf import settings
 from django.template.loader import render_to_string
 
@@ -52,3 +52,32 @@ CRM Team
         html_message=html_message,
         fail_silently=False,
     )
+
+
+def lead_assignment_digest(agent, leads):
+    """
+    One email listing every lead assigned to ``agent`` by a bulk assignment
+    (``leads`` are dicts with name, phone, status and interest).
+    """
+    lines = "\n".join(
+        f"- {lead['name']} ({lead['phone'] or 'no phone'}), {lead['status']}, interest: {lead['interest'] or 'Not specified'}"
+        for lead in leads
+    )
+    plain_message = f"""
+Hi {agent['first_name'] or agent['username']},
+
+{len(leads)} new lead{'s have' if len(leads) != 1 else ' has'} been assigned to you:
+
+{lines}
+
+Please follow up as soon as possible.
+
+Best regards,
+CRM Team
+    """.strip()
+    return EmailMessage(
+        subject=f"{len(leads)} New Lead{'s' if len(leads) != 1 else ''} Assigned",
+        body=plain_message,
+        from_email=settings.DEFAULT_FROM_EMAIL,
+        to=[agent['email']],
+    )
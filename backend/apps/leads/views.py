@@ -3,6 +3,7 @@
 from rest_framework import viewsets, permissions, filters, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
+from rest_framework.views import APIView
 from django_filters.rest_framework import DjangoFilterBackend
 from .models import Lead
 from .serializers import LeadSerializer
@@ -12,6 +13,7 @@ from django.utils import timezone
 from datetime import timedelta
 from rest_framework.parsers import MultiPartParser
 import pandas as pd
+import numpy as np
 from io import StringIO
 from django.http import HttpResponse
 from dateutil.relativedelta import relativedelta
@@ -19,15 +21,26 @@ from django.db.models import Count, Sum, F, Case, When, FloatField, IntegerField
 from django.db.models.functions import Coalesce, Cast, TruncMonth, TruncDate, TruncDay, Greatest
 from decimal import Decimal 
 from django.contrib.auth import get_user_model
-from apps.property.models import Property
+from apps.accounts.assignment import bulk_assign_leads, get_policy
+from apps.core.throttling import AdmissionControlMixin
+from apps.property.matching import match_params, matches_for_lead
+from apps.property.models import Property, UnitStatus
+from apps.property.units import unit_count
+from .timeseries import METRICS, BUCKETS, GROUP_BY_OPTIONS, build_timeseries, clean_budget_expression, gap_fill, parse_date, resolve_range, resolve_timezone
 
 User = get_user_model()
 
+# Metrics builder_performance can be sorted by
+BUILDER_PERFORMANCE_ORDERING = (
+    'title', 'leads', 'visits', 'visits_scheduled', 'visits_completed', 'conversions', 'rate',
+    'units_total', 'units_available', 'units_booked',
+)
+
 class NullIfEmpty(Func):
     function = 'NULLIF'
     template = "%(function)s(%(expressions)s, '')"
 
-class LeadViewSet(viewsets.ModelViewSet):
+class LeadViewSet(AdmissionControlMixin, viewsets.ModelViewSet):
     serializer_class = LeadSerializer
     permission_classes = [permissions.IsAuthenticated, IsOwnerOrAssignedOrAdmin]
     pagination_class = StandardResultsSetPagination
@@ -49,7 +62,7 @@ class LeadViewSet(viewsets.ModelViewSet):
             return [permissions.IsAuthenticated(), IsAdminOrManagerUser()]
         return [permission() for permission in self.permission_classes]
 
-    @action(detail=False, methods=['get'])
+    @action(detail=False, methods=['get'], throttle_scope='team_performance')
     def team_performance(self, request):
         """
         Get team performance metrics including:
@@ -236,58 +249,22 @@ class LeadViewSet(viewsets.ModelViewSet):
 
             # Calculate revenue with robust budget handling
             revenue_by_period = queryset.annotate(
-                period=trunc_period,
-                clean_budget=Case(
-                    When(
-                        Q(budget='') | Q(budget__isnull=True),
-                        then=Value(0.0)
-                    ),
-                    When(
-                        Q(budget__regex=r'^[^0-9.-]'),  # Non-numeric values
-                        then=Value(0.0)
-                    ),
-                    default=Case(
-                        When(
-                            Q(budget__regex=r'^-?\d*\.?\d*$'),  # Valid number
-                            then=functions.Greatest(
-                                Cast('budget', output_field=FloatField()),
-                                Value(0.0)
-                            )
-                        ),
-                        default=Value(0.0),
-                        output_field=FloatField(),
-                    ),
-                    output_field=FloatField(),
-                )
+                period=trunc_period
             ).values('period').annotate(
-                total_revenue=Sum('clean_budget')
+                total_revenue=Sum(clean_budget_expression())
             ).values('period', 'total_revenue').order_by('period')
 
-            # Generate all periods in range for consistent data points
-            all_periods = []
-            current = start_date
-            end_date = now.replace(hour=23, minute=59, second=59)  # Include full current day
-
-            while current <= end_date:
-                period = current.replace(hour=0, minute=0, second=0, microsecond=0)
-                if group_by_day:
-                    all_periods.append(period)
-                    current += timedelta(days=1)
-                else:
-                    all_periods.append(period.replace(day=1))  # First day of month for monthly grouping
-                    current += relativedelta(months=1)
-                    current = current.replace(day=1)
-
-            # Create lookup table for existing data
-            existing_data = {
-                item['period'].replace(hour=0, minute=0, second=0, microsecond=0): item['total_revenue'] or 0.0
-                for item in revenue_by_period
-            }
+            # Spread the sparse SQL rows over every period in range (missing periods become 0)
+            periods, _, matrix = gap_fill(
+                [{'bucket': item['period'], 'group': None, 'value': item['total_revenue']} for item in revenue_by_period],
+                start_date.date(), now.date(), 'day' if group_by_day else 'month'
+            )
+            revenues = matrix[0] if len(matrix) else np.zeros(len(periods))
 
             # Format response with all periods and calculated values
             formatted_data = []
-            for period in all_periods:
-                revenue = float(existing_data.get(period, 0.0))
+            for period, revenue in zip(periods.start_time, revenues):
+                revenue = float(revenue)
                 sales_commission = round(revenue * 0.6, 2)  # 60% commission rate
                 
                 formatted_data.append({
@@ -333,9 +310,12 @@ class LeadViewSet(viewsets.ModelViewSet):
                                    .annotate(count=Count('id'))\
                                    .order_by('date')
         
-        counts_by_date = {item['date'].strftime('%Y-%m-%d'): item['count'] for item in daily_leads_data}
-        all_dates_in_range = [start_date + timedelta(days=i) for i in range((today - start_date).days + 1)]
-        formatted_daily_leads = [{'date': dt.strftime('%Y-%m-%d'), 'count': counts_by_date.get(dt.strftime('%Y-%m-%d'), 0)} for dt in all_dates_in_range]
+        periods, _, matrix = gap_fill(
+            [{'bucket': item['date'], 'group': None, 'value': item['count']} for item in daily_leads_data],
+            start_date, today, 'day'
+        )
+        counts = matrix[0] if len(matrix) else np.zeros(len(periods))
+        formatted_daily_leads = [{'date': day, 'count': int(count)} for day, count in zip(periods.strftime('%Y-%m-%d'), counts)]
 
         overall_total_leads = queryset.count()
         overall_converted_leads = queryset.filter(status='Converted').count()
@@ -360,7 +340,7 @@ class LeadViewSet(viewsets.ModelViewSet):
             'daily_leads_added': formatted_daily_leads,
         })
         
-    @action(detail=False, methods=['post'], parser_classes=[MultiPartParser])
+    @action(detail=False, methods=['post'], parser_classes=[MultiPartParser], throttle_scope='lead_import')
     def import_leads(self, request):
         if 'file' not in request.FILES:
             return Response({'error': 'No file provided'}, status=status.HTTP_400_BAD_REQUEST)
@@ -502,7 +482,7 @@ class LeadViewSet(viewsets.ModelViewSet):
             )
 
 
-    @action(detail=False, methods=['get'])
+    @action(detail=False, methods=['get'], throttle_scope='lead_export')
     def export(self, request):
         queryset = self.filter_queryset(self.get_queryset())
         serializer = LeadSerializer(queryset, many=True, context={'request': request})
@@ -560,41 +540,117 @@ class LeadViewSet(viewsets.ModelViewSet):
         df.to_csv(response, index=False, encoding='utf-8-sig')
         return response
     
+    @action(detail=False, methods=['post'], permission_classes=[permissions.IsAuthenticated, IsAdminOrManagerUser],
+            throttle_scope='lead_assignment')
+    def auto_assign(self, request):
+        """
+        Assign unassigned leads to agents with the assignment engine.
+        Body: policy (round_robin, least_loaded, affinity; default
+        ASSIGNMENT_DEFAULT_POLICY), optional lead_ids, dry_run.
+        """
+        data = request.data if hasattr(request.data, 'get') else {}
+        queryset = Lead.objects.all()
+        lead_ids = data.get('lead_ids')
+        if lead_ids is not None:
+            if not isinstance(lead_ids, list) or not all(isinstance(pk, int) for pk in lead_ids):
+                return Response({'error': 'lead_ids must be a list of lead ids'}, status=status.HTTP_400_BAD_REQUEST)
+            queryset = queryset.filter(pk__in=lead_ids)
+
+        try:
+            policy = get_policy(data.get('policy'))
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            report = bulk_assign_leads(queryset, policy=policy.name, dry_run=str(data.get('dry_run', '')).lower() in ('1', 'true', 'yes'))
+        except Exception as e:
+            print(f"Error in auto_assign endpoint: {str(e)}")
+            return Response({'error': 'An error occurred while assigning leads'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+        return Response(report)
+
+    @action(detail=True, methods=['get'])
+    def matches(self, request, pk=None):
+        """
+        Properties that best fit this lead's budget, interest and requirements
+        (see apps.property.matching), best first. Query: limit, min_score (0-1).
+        """
+        lead = self.get_object()
+        try:
+            limit, min_score = match_params(request.query_params)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            results = matches_for_lead(lead, limit=limit, min_score=min_score)
+            details = Property.objects.in_bulk([result['property'] for result in results])
+            for result in results:
+                prop = details.get(result['property'])
+                result['property_details'] = prop and {
+                    'id': prop.id,
+                    'title': prop.title,
+                    'location': prop.location,
+                    'price': prop.price,
+                    'property_type': prop.property_type,
+                    'listing_type': prop.listing_type,
+                    'status': prop.status,
+                }
+        except Exception as e:
+            print(f"Error in matches endpoint: {str(e)}")
+            return Response({'error': 'An error occurred while matching properties'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+        return Response([result for result in results if result['property_details']])
+
     @action(detail=False, methods=['get'], permission_classes=[permissions.IsAuthenticated, IsAdminOrManagerUser])
     def builder_performance(self, request):
         """
         Aggregates performance metrics for each property (builder project).
         - Total Leads
-        - Total Site Visits (based on Lead status)
+        - Site Visits (scheduled + completed, from the SiteVisit table)
         - Total Conversions
         - Conversion Rate
+        - Units total, available and booked (see apps.property.units)
+
+        Reads the per-property counters maintained by apps.property.counters,
+        so only properties with leads are loaded. Supports ?ordering=<metric>
+        (prefix with '-' for descending) and ?page=/?page_size= pagination.
         """
         try:
-            # This query annotates each Property with the required counts.
-            # I am assuming the property name field is 'title'. 
-            # Please change 'title' to the correct field name from your Property model.
-            performance_data = Property.objects.annotate(
-                leads=Count('lead'),
-                visits=Count('lead', filter=Q(lead__status__in=['Site Visit Done', 'Site Visit Scheduled'])),
-                conversions=Count('lead', filter=Q(lead__status='Converted'))
-            ).annotate(
-                rate=Case(
-                    When(leads__gt=0, then=Cast(F('conversions'), FloatField()) * 100.0 / Cast(F('leads'), FloatField())),
-                    default=Value(0.0),
-                    output_field=FloatField()
+            ordering = request.query_params.get('ordering', '-conversions')
+            if ordering.lstrip('-') not in BUILDER_PERFORMANCE_ORDERING:
+                return Response(
+                    {'error': f"Invalid ordering. Choose from: {', '.join(BUILDER_PERFORMANCE_ORDERING)}."},
+                    status=status.HTTP_400_BAD_REQUEST
                 )
+
+            performance_data = Property.objects.filter(lead_count__gt=0).annotate(
+                leads=F('lead_count'),
+                visits_scheduled=F('visits_scheduled_count'),
+                visits_completed=F('visits_completed_count'),
+                visits=F('visits_scheduled_count') + F('visits_completed_count'),
+                conversions=F('conversion_count'),
+                rate=Cast(F('conversion_count'), FloatField()) * 100.0 / Cast(F('lead_count'), FloatField()),
+                # Units booked through /api/properties/{id}/units/book/ (each row names its lead)
+                units_booked=unit_count(status=UnitStatus.BOOKED),
             ).values(
-                'title', # <-- IMPORTANT: Change 'title' if your property model uses a different field (e.g., 'name')
+                'id',
+                'title',
                 'leads',
                 'visits',
+                'visits_scheduled',
+                'visits_completed',
                 'conversions',
-                'rate'
-            ).order_by('-conversions') # Order by most conversions
+                'rate',
+                'units_total',
+                'units_available',
+                'units_booked',
+            ).order_by(ordering, 'id')
 
-            # Filter out properties that have no leads
-            active_projects = [p for p in performance_data if p['leads'] > 0]
+            # Paginate only when asked so existing chart clients keep getting a plain list
+            if 'page' in request.query_params:
+                paginator = StandardResultsSetPagination()
+                page = paginator.paginate_queryset(performance_data, request, view=self)
+                return paginator.get_paginated_response(page)
 
-            return Response(active_projects)
+            return Response(list(performance_data))
 
         except Exception as e:
             import traceback
@@ -603,4 +659,44 @@ class LeadViewSet(viewsets.ModelViewSet):
             return Response(
                 {'error': 'An error occurred while fetching builder performance data'},
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
-            )
\ No newline at end of file
+            )
+
+
+class TimeSeriesView(APIView):
+    """
+    Generic bucketed time series for the dashboard charts.
+
+    Query params:
+    - metric: leads_created | conversions | revenue | site_visits
+    - bucket: day | week | month | quarter (default: day)
+    - group_by: source | status | agent | property (optional)
+    - timezone: IANA name used for bucketing (default: UTC)
+    - start / end: YYYY-MM-DD (default: a range sized to the bucket, ending today;
+      at most TIMESERIES_MAX_DAYS long for the bucket)
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request):
+        metric = request.query_params.get('metric', 'leads_created')
+        bucket = request.query_params.get('bucket', 'day')
+        group_by = request.query_params.get('group_by') or None
+
+        if metric not in METRICS:
+            return Response({'error': f"Unknown metric. Choose from: {', '.join(METRICS)}."}, status=status.HTTP_400_BAD_REQUEST)
+        if bucket not in BUCKETS:
+            return Response({'error': f"Unknown bucket. Choose from: {', '.join(BUCKETS)}."}, status=status.HTTP_400_BAD_REQUEST)
+        if group_by and group_by not in GROUP_BY_OPTIONS:
+            return Response({'error': f"Unknown group_by. Choose from: {', '.join(GROUP_BY_OPTIONS)}."}, status=status.HTTP_400_BAD_REQUEST)
+        if group_by and group_by not in METRICS[metric]['group_fields']:
+            supported = ', '.join(METRICS[metric]['group_fields'])
+            return Response({'error': f"Metric '{metric}' cannot be grouped by '{group_by}'. Choose from: {supported}."}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            tz = resolve_timezone(request.query_params.get('timezone', 'UTC'))
+            start = parse_date(request.query_params.get('start'))
+            end = parse_date(request.query_params.get('end'))
+            start, end = resolve_range(start, end, bucket, tz)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response(build_timeseries(request.user, metric, bucket, group_by=group_by, tz=tz, start=start, end=end))
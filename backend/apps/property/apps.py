@@ -1,6 +1,13 @@
 # apps/property/apps.py
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
 
 class PropertyConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
-    name = 'apps.property'
\ No newline at end of file
+    name = 'apps.property'
+
+    def ready(self):
+        import apps.property.signals  # noqa: F401
+        from .search import ensure_search_indexes
+        # Full-text and attribute GIN indexes (PostgreSQL only), created once the table exists
+        post_migrate.connect(ensure_search_indexes, sender=self, dispatch_uid='property_search_indexes')
@@ -0,0 +1,99 @@
+# apps/property/attributes.py
+"""
+Denormalized amenity and specification attributes.
+
+``PropertyAmenity`` and ``PropertySpecification`` stay the source of truth
+(admin inlines, seeding), but filtering through them costs one join or
+EXISTS per condition. Each property also carries ``amenity_tags`` (sorted,
+lowercased amenity names) and ``spec_map`` (lowercased key -> value), kept in
+sync by the child-table signals. On PostgreSQL both are jsonb with GIN
+``jsonb_path_ops`` indexes, so "gym AND parking AND bedrooms=3" is a single
+indexed ``@>`` containment test; other databases use the child tables for
+amenities and JSON key lookups for specifications.
+"""
+from collections import defaultdict
+
+from django.db import connection
+from django.db.models import Exists, OuterRef
+from django.db.models.fields.json import KeyTransform
+from django.db.models.functions import Lower
+from django.utils import timezone
+
+from .models import Property, PropertyAmenity, PropertySpecification
+
+
+def amenity_tag(name):
+    return ' '.join(str(name or '').split()).lower()
+
+
+def spec_key(key):
+    return '_'.join(str(key or '').split()).lower()
+
+
+def parse_specs(value):
+    """``"bedrooms:3,parking_spots:1"`` -> ``{'bedrooms': '3', 'parking_spots': '1'}``."""
+    specs = {}
+    for item in str(value or '').split(','):
+        key, sep, spec_value = item.partition(':')
+        if sep and spec_key(key) and spec_value.strip():
+            specs[spec_key(key)] = spec_value.strip()
+    return specs
+
+
+def build_attributes(property_ids):
+    """(amenity_tags, spec_map) per property id, read with two queries."""
+    tags, specs = defaultdict(set), defaultdict(dict)
+    for property_id, name in PropertyAmenity.objects.filter(property_id__in=property_ids).values_list('property_id', 'name'):
+        if amenity_tag(name):
+            tags[property_id].add(amenity_tag(name))
+    rows = PropertySpecification.objects.filter(property_id__in=property_ids).order_by('pk')
+    for property_id, key, value in rows.values_list('property_id', 'key', 'value'):
+        if spec_key(key):
+            specs[property_id][spec_key(key)] = value
+    return {pk: (sorted(tags[pk]), specs[pk]) for pk in property_ids}
+
+
+def sync_property_attributes(property_ids, batch_size=1000):
+    """Rebuild the denormalized attributes of ``property_ids``. Returns the number of properties updated."""
+    property_ids = sorted(set(pk for pk in property_ids if pk is not None))
+    updated = 0
+    for start in range(0, len(property_ids), batch_size):
+        batch = property_ids[start:start + batch_size]
+        now = timezone.now()
+        rows = [
+            Property(pk=pk, amenity_tags=amenity_tags, spec_map=spec_map, updated_at=now)
+            for pk, (amenity_tags, spec_map) in build_attributes(batch).items()
+        ]
+        # One UPDATE ... CASE per batch; rows deleted meanwhile are simply not matched.
+        # updated_at moves too, so caches keyed on it (matching index, ICS ETags) notice.
+        updated += Property.objects.bulk_update(rows, ['amenity_tags', 'spec_map', 'updated_at'], batch_size=batch_size)
+    return updated
+
+
+def reconcile_property_attributes(queryset=None, batch_size=1000):
+    """Rebuild the attributes of ``queryset`` (default: every property)."""
+    if queryset is None:
+        queryset = Property.objects.all()
+    return sync_property_attributes(queryset.values_list('pk', flat=True), batch_size=batch_size)
+
+
+def filter_by_attributes(queryset, amenities=(), specs=None):
+    """Properties having every amenity in ``amenities`` and every key/value in ``specs``."""
+    amenities = sorted({amenity_tag(name) for name in amenities if amenity_tag(name)})
+    specs = {spec_key(key): str(value) for key, value in (specs or {}).items()}
+    if connection.vendor == 'postgresql':
+        if amenities:
+            queryset = queryset.filter(amenity_tags__contains=amenities)
+        if specs:
+            queryset = queryset.filter(spec_map__contains=specs)
+        return queryset
+
+    # Fallback for databases without JSON containment (SQLite in tests)
+    for amenity in amenities:
+        queryset = queryset.filter(Exists(
+            PropertyAmenity.objects.annotate(lower_name=Lower('name')).filter(property=OuterRef('pk'), lower_name=amenity)
+        ))
+    for n, (key, value) in enumerate(specs.items()):
+        # Explicit transform: keys may contain "__"
+        queryset = queryset.alias(**{f'spec_{n}': KeyTransform(key, 'spec_map')}).filter(**{f'spec_{n}': value})
+    return queryset
@@ -0,0 +1,96 @@
+# apps/property/counters.py
+"""
+Per-property activity counters (leads, conversions, scheduled and completed
+site visits).
+
+Lead and site-visit signals report each change as an ``(old, new)`` pair of
+``(property_id, status)`` snapshots; the difference is applied with a single
+atomic ``F()`` update per affected property, so concurrent writers never lose
+increments. ``reconcile_property_counters`` recomputes everything from the
+source tables for repairs (e.g. after ``bulk_create`` or raw SQL imports).
+"""
+from collections import Counter, defaultdict
+
+from django.db.models import Count, F, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from .models import Property
+
+OPEN_VISIT_STATUSES = ('scheduled', 'confirmed')
+
+
+def _lead_contribution(state):
+    property_id, status = state
+    return property_id, {
+        'lead_count': 1,
+        'conversion_count': int(status == 'Converted'),
+    }
+
+
+def _site_visit_contribution(state):
+    property_id, status = state
+    return property_id, {
+        'visits_scheduled_count': int(status in OPEN_VISIT_STATUSES),
+        'visits_completed_count': int(status == 'completed'),
+    }
+
+
+def _apply(old, new, contribution):
+    _apply_many(((old, -1), (new, 1)), contribution)
+
+
+def _apply_many(changes, contribution):
+    deltas = defaultdict(Counter)
+    for state, sign in changes:
+        if state is None:
+            continue
+        property_id, counts = contribution(state)
+        if property_id is None:
+            continue
+        for field, value in counts.items():
+            deltas[property_id][field] += sign * value
+
+    for property_id, fields in deltas.items():
+        updates = {field: F(field) + delta for field, delta in fields.items() if delta}
+        if updates:
+            Property.objects.filter(pk=property_id).update(**updates)
+
+
+def record_lead_change(old, new):
+    """Apply a lead change; ``old``/``new`` are (property_id, status) or None."""
+    _apply(old, new, _lead_contribution)
+
+
+def record_site_visit_change(old, new):
+    """Apply a site-visit change; ``old``/``new`` are (property_id, status) or None."""
+    _apply(old, new, _site_visit_contribution)
+
+
+def record_site_visits_added(states):
+    """Apply many new visits (``bulk_create``) at once; ``states`` are (property_id, status) pairs."""
+    _apply_many(((state, 1) for state in states), _site_visit_contribution)
+
+
+def _count_subquery(model, **filters):
+    counts = model.objects.filter(property=OuterRef('pk'), **filters).order_by().values('property').annotate(
+        n=Count('pk')
+    ).values('n')
+    return Coalesce(Subquery(counts, output_field=IntegerField()), 0)
+
+
+def reconcile_property_counters(queryset=None):
+    """
+    Recompute the counters of ``queryset`` (default: every property) from the
+    lead and site-visit tables in one UPDATE. Returns the number of rows updated.
+    """
+    from apps.leads.models import Lead
+    from apps.site_visits.models import SiteVisit
+
+    if queryset is None:
+        queryset = Property.objects.all()
+    return queryset.update(
+        lead_count=_count_subquery(Lead),
+        conversion_count=_count_subquery(Lead, status='Converted'),
+        visits_scheduled_count=_count_subquery(SiteVisit, status__in=OPEN_VISIT_STATUSES),
+        visits_completed_count=_count_subquery(SiteVisit, status='completed'),
+    )
@@ -0,0 +1,260 @@
+# apps/property/finance.py
+"""
+EMI (equated monthly instalment) calculations for property loans.
+
+EMI = P * r * (1 + r)^n / ((1 + r)^n - 1) for principal P, monthly rate r and
+n months. Everything after P is an annuity factor that depends only on the
+(rate, term) pair, so it is computed once per pair and an EMI is then a
+single multiply, for one loan or for an array of them.
+
+Affordability screening goes the other way: a monthly budget B and a down
+payment D afford any price up to D + B / factor. For-sale properties that
+aren't sold out are grouped into (rate, term) buckets - their own
+``interest_rate``/``loan_term``, else EMI_DEFAULT_RATE/EMI_DEFAULT_TERM_YEARS
+- each holding its prices sorted, so a screen is one ``searchsorted`` per
+bucket plus one vectorized EMI pass over the matches. The buckets are read
+from the in-memory matching index (apps.property.matching) and rebuilt
+when it changes.
+"""
+import threading
+from functools import lru_cache
+
+import numpy as np
+from django.conf import settings
+
+from .matching import LISTING_CODES, PROPERTY_INDEX, TYPE_CODES
+from .models import ListingType
+
+MAX_RATE = 50  # annual %, anything higher is a typo
+MAX_TERM_YEARS = 40
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+@lru_cache(maxsize=1024)
+def annuity_factor(annual_rate, years):
+    """EMI per rupee of principal at ``annual_rate`` % over ``years``."""
+    months = int(years) * 12
+    rate = float(annual_rate) / 12 / 100
+    if rate == 0:
+        return 1.0 / months
+    growth = (1 + rate) ** months
+    return rate * growth / (growth - 1)
+
+
+def emi(principal, annual_rate, years):
+    """Monthly instalment; ``principal`` may be a number or an array."""
+    return np.asarray(principal, dtype=np.float64) * annuity_factor(annual_rate, years)
+
+
+def amortization_schedule(principal, annual_rate, years, by='month'):
+    """
+    Payment, principal, interest and closing balance for every month (or
+    year, with ``by='year'``) of the loan, plus totals.
+    """
+    months = int(years) * 12
+    rate = float(annual_rate) / 12 / 100
+    payment = float(emi(principal, annual_rate, years))
+    paid = np.arange(1, months + 1)
+    # Closed-form balance after each payment, no running loop
+    if rate == 0:
+        balance = principal - payment * paid
+    else:
+        growth = (1 + rate) ** paid
+        balance = principal * growth - payment * (growth - 1) / rate
+    balance = np.maximum(balance, 0.0)
+    balance[-1] = 0.0
+    opening = np.concatenate(([float(principal)], balance[:-1]))
+    interest = opening * rate
+    principal_paid = opening - balance
+    payments = principal_paid + interest
+
+    if by == 'year':
+        starts = np.arange(0, months, 12)
+        periods = np.arange(1, len(starts) + 1)
+        payments, principal_paid, interest = (
+            np.add.reduceat(column, starts) for column in (payments, principal_paid, interest)
+        )
+        balance = balance[np.minimum(starts + 11, months - 1)]
+    else:
+        periods = paid
+    return {
+        'principal': round(float(principal), 2),
+        'interest_rate': float(annual_rate),
+        'loan_term': int(years),
+        'emi': round(payment, 2),
+        'total_payment': round(payment * months, 2),
+        'total_interest': round(payment * months - float(principal), 2),
+        'schedule': [
+            {
+                by: int(period), 'payment': round(p, 2), 'principal': round(pp, 2),
+                'interest': round(i, 2), 'balance': round(b, 2),
+            }
+            for period, p, pp, i, b in zip(
+                periods.tolist(), payments.tolist(), principal_paid.tolist(), interest.tolist(), balance.tolist(),
+            )
+        ],
+    }
+
+
+def _number(params, name, default=None):
+    value = params.get(name)
+    if value in (None, ''):
+        return default
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"{name} must be a number.")
+    if not np.isfinite(number) or number < 0:
+        raise ValueError(f"{name} must be a non-negative number.")
+    return number
+
+
+def loan_params(params, principal=None, rate=None, years=None):
+    """
+    (principal, annual rate %, term in years) from query parameters
+    ``principal``, ``rate`` and ``term``, falling back to the given values
+    and then the EMI_DEFAULT_* settings; raises ValueError when invalid.
+    """
+    principal = _number(params, 'principal', principal)
+    rate = _number(params, 'rate', rate if rate is not None else _setting('EMI_DEFAULT_RATE', 8.5))
+    years = _number(params, 'term', years or _setting('EMI_DEFAULT_TERM_YEARS', 20))
+    if principal is None or principal <= 0:
+        raise ValueError("principal must be a positive number.")
+    if rate > MAX_RATE:
+        raise ValueError(f"rate must be between 0 and {MAX_RATE} (annual %).")
+    if years != int(years) or not 1 <= years <= MAX_TERM_YEARS:
+        raise ValueError(f"term must be a whole number of years between 1 and {MAX_TERM_YEARS}.")
+    return principal, rate, int(years)
+
+
+# --- Affordability screening ---------------------------------------------------------
+
+class AffordabilityBuckets:
+    """
+    Sellable rows of a PropertyIndex grouped by their own (interest_rate,
+    loan_term), None where unset, each sorted by price.
+    """
+
+    def __init__(self, index):
+        self.index = index
+        self.lock = threading.Lock()
+        self._version = None
+        self._buckets = {}
+
+    def buckets(self):
+        """{(rate or None, term or None): (rows, prices)}, rebuilt when the index changed."""
+        with self.lock:
+            if self._version != self.index.version:
+                self._buckets = self._build()
+                self._version = self.index.version
+            return self._buckets
+
+    def _build(self):
+        size = self.index.size
+        data = {name: column[:size] for name, column in self.index.data.items()}
+        sellable = (
+            self.index.alive[:size] & data['available'] & ~np.isnan(data['price'])
+            & (data['listing'] == LISTING_CODES[ListingType.FOR_SALE])
+        )
+        rows = np.flatnonzero(sellable)
+        # Two decimals, like the model field, so equal rates share a bucket
+        rates = np.round(data['interest_rate'][rows], 2)
+        terms = data['loan_term'][rows].astype(np.int64)
+        keys = np.stack([np.nan_to_num(rates, nan=-1.0), terms.astype(np.float64)], axis=1)
+        buckets = {}
+        if not len(rows):
+            return buckets
+        unique, inverse = np.unique(keys, axis=0, return_inverse=True)
+        for n, (rate, term) in enumerate(unique):
+            members = rows[inverse.ravel() == n]
+            members = members[np.argsort(data['price'][members], kind='stable')]
+            key = (None if rate < 0 else float(rate), None if term <= 0 else int(term))
+            buckets[key] = (members, data['price'][members])
+        return buckets
+
+
+AFFORDABILITY = AffordabilityBuckets(PROPERTY_INDEX)
+
+
+def affordable_properties(monthly_budget, down_payment=0.0, rate=None, years=None, property_types=None,
+                          restrict_to=None, limit=50):
+    """
+    Sellable properties whose EMI on (price - down_payment) fits
+    ``monthly_budget``, most expensive first. ``rate``/``years`` override every
+    property's own loan terms. Returns (total matches, results).
+    """
+    PROPERTY_INDEX.refresh()
+    default_rate = _setting('EMI_DEFAULT_RATE', 8.5)
+    default_years = _setting('EMI_DEFAULT_TERM_YEARS', 20)
+    with PROPERTY_INDEX.lock:
+        data = PROPERTY_INDEX.data
+        found = []
+        for (own_rate, own_years), (rows, prices) in AFFORDABILITY.buckets().items():
+            bucket_rate = rate if rate is not None else (own_rate if own_rate is not None else default_rate)
+            bucket_years = years or own_years or default_years
+            factor = annuity_factor(bucket_rate, bucket_years)
+            ceiling = down_payment + monthly_budget / factor
+            end = np.searchsorted(prices, ceiling, side='right')
+            if end:
+                found.append((rows[:end], bucket_rate, bucket_years, factor))
+        if not found:
+            return 0, []
+
+        rows = np.concatenate([chunk for chunk, _, _, _ in found])
+        rates = np.concatenate([np.full(len(chunk), r) for chunk, r, _, _ in found])
+        terms = np.concatenate([np.full(len(chunk), t) for chunk, _, t, _ in found])
+        factors = np.concatenate([np.full(len(chunk), f) for chunk, _, _, f in found])
+        keep = np.ones(len(rows), dtype=bool)
+        if property_types:
+            keep &= np.isin(data['type'][rows], [TYPE_CODES[value] for value in property_types])
+        if restrict_to is not None:
+            allowed = np.zeros(PROPERTY_INDEX.size, dtype=bool)
+            allowed[PROPERTY_INDEX.rows_for(restrict_to)] = True
+            keep &= allowed[rows]
+        rows, rates, terms, factors = rows[keep], rates[keep], terms[keep], factors[keep]
+
+        prices = data['price'][rows]
+        principals = np.maximum(prices - down_payment, 0.0)
+        emis = principals * factors
+        order = np.argsort(-prices, kind='stable')[:limit]
+        results = [
+            {
+                'property': int(pk), 'price': round(price, 2), 'principal': round(principal, 2),
+                'interest_rate': float(r), 'loan_term': int(t), 'emi': round(e, 2),
+                'total_interest': round(e * t * 12 - principal, 2),
+            }
+            for pk, price, principal, r, t, e in zip(
+                PROPERTY_INDEX.ids[rows[order]].tolist(), prices[order].tolist(), principals[order].tolist(),
+                rates[order].tolist(), terms[order].tolist(), emis[order].tolist(),
+            )
+        ]
+        return len(rows), results
+
+
+def affordability_params(params):
+    """(monthly_budget, down_payment, rate, years, property_types, limit) from query parameters."""
+    monthly_budget = _number(params, 'monthly_budget')
+    if not monthly_budget:
+        raise ValueError("monthly_budget must be a positive number.")
+    down_payment = _number(params, 'down_payment', 0.0)
+    rate = _number(params, 'rate')
+    if rate is not None and rate > MAX_RATE:
+        raise ValueError(f"rate must be between 0 and {MAX_RATE} (annual %).")
+    years = _number(params, 'term')
+    if years is not None and (years != int(years) or not 1 <= years <= MAX_TERM_YEARS):
+        raise ValueError(f"term must be a whole number of years between 1 and {MAX_TERM_YEARS}.")
+    property_types = [value for value in (params.get('property_type') or '').split(',') if value]
+    unknown = [value for value in property_types if value not in TYPE_CODES]
+    if unknown:
+        raise ValueError(f"Unknown property_type: {', '.join(unknown)}.")
+    maximum = _setting('EMI_MAX_RESULTS', 500)
+    try:
+        limit = int(params.get('limit', 50))
+    except (TypeError, ValueError):
+        raise ValueError("limit must be an integer.")
+    if not 1 <= limit <= maximum:
+        raise ValueError(f"limit must be between 1 and {maximum}.")
+    return monthly_budget, down_payment, rate, int(years) if years else None, property_types, limit
@@ -0,0 +1,209 @@
+# apps/property/geo.py
+"""
+Geospatial search without PostGIS.
+
+Every geocoded property stores its ``geohash`` (derived from latitude and
+longitude on save). Geohashes sharing a prefix share a grid cell, so a
+radius or bounding-box query first turns its box into a handful of covering
+cells at a suitable precision and reads only the properties whose geohash
+starts with one of them (an indexed prefix scan). The candidates' exact
+distances are then computed in one vectorized NumPy haversine pass, and the
+matches returned nearest first.
+
+Coordinates come from an offline gazetteer (``data/gazetteer.csv``) matched
+against the free-text ``location`` by the ``geocode_properties`` command.
+"""
+import csv
+import math
+import re
+from functools import lru_cache
+from pathlib import Path
+
+import numpy as np
+from django.conf import settings
+from django.db.models import Q
+
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180
+GEOHASH_PRECISION = 9  # ~4.8 m x 4.8 m cells
+BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+GAZETTEER_PATH = Path(__file__).resolve().parent / 'data' / 'gazetteer.csv'
+
+
+def geohash_encode(latitude, longitude, precision=GEOHASH_PRECISION):
+    lat_range, lng_range = [-90.0, 90.0], [-180.0, 180.0]
+    chars, bits, value, even = [], 0, 0, True
+    while len(chars) < precision:
+        # Bits alternate longitude, latitude, starting with longitude
+        span, coordinate = (lng_range, longitude) if even else (lat_range, latitude)
+        middle = (span[0] + span[1]) / 2
+        value <<= 1
+        if coordinate >= middle:
+            value |= 1
+            span[0] = middle
+        else:
+            span[1] = middle
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(BASE32[value])
+            bits, value = 0, 0
+    return ''.join(chars)
+
+
+def cell_size(precision):
+    """(height, width) in degrees of a geohash cell."""
+    lng_bits = (5 * precision + 1) // 2
+    lat_bits = 5 * precision // 2
+    return 180.0 / 2 ** lat_bits, 360.0 / 2 ** lng_bits
+
+
+def covering_cells(min_lat, min_lng, max_lat, max_lng, max_cells=None):
+    """
+    Geohash prefixes whose cells cover the box: the finest precision that
+    needs at most ``max_cells`` of them (GEO_MAX_CELLS).
+    """
+    max_cells = max_cells or getattr(settings, 'GEO_MAX_CELLS', 32)
+    for precision in range(GEOHASH_PRECISION, 0, -1):
+        height, width = cell_size(precision)
+        rows = range(math.floor((min_lat + 90) / height), math.floor((max_lat + 90) / height) + 1)
+        columns = range(math.floor((min_lng + 180) / width), math.floor((max_lng + 180) / width) + 1)
+        if len(rows) * len(columns) <= max_cells or precision == 1:
+            return sorted({
+                geohash_encode(
+                    min(-90 + (row + 0.5) * height, 90.0), min(-180 + (column + 0.5) * width, 180.0), precision,
+                )
+                for row in rows for column in columns
+            })
+
+
+def bounding_box(latitude, longitude, radius_km):
+    """(min_lat, min_lng, max_lat, max_lng) around a point; clamped, no antimeridian wrap."""
+    dlat = radius_km / KM_PER_DEGREE
+    dlng = radius_km / (KM_PER_DEGREE * max(math.cos(math.radians(latitude)), 1e-6))
+    return (
+        max(latitude - dlat, -90.0), max(longitude - dlng, -180.0),
+        min(latitude + dlat, 90.0), min(longitude + dlng, 180.0),
+    )
+
+
+def haversine_km(latitude, longitude, latitudes, longitudes):
+    """Great-circle distance from one point to arrays of points, in km."""
+    lat1, lng1 = math.radians(latitude), math.radians(longitude)
+    lat2, lng2 = np.radians(latitudes), np.radians(longitudes)
+    a = np.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * np.cos(lat2) * np.sin((lng2 - lng1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+def in_box(queryset, box):
+    """Properties inside ``box``: a geohash prefix scan narrowed by the exact coordinates."""
+    min_lat, min_lng, max_lat, max_lng = box
+    cells = Q()
+    for cell in covering_cells(*box):
+        cells |= Q(geohash__startswith=cell)
+    return queryset.filter(cells).filter(
+        latitude__gte=min_lat, latitude__lte=max_lat, longitude__gte=min_lng, longitude__lte=max_lng,
+    )
+
+
+def nearest(queryset, latitude, longitude, radius_km, limit=None):
+    """[(pk, distance_km)] of the properties within ``radius_km``, nearest first."""
+    rows = list(in_box(queryset.order_by(), bounding_box(latitude, longitude, radius_km)).values_list(
+        'pk', 'latitude', 'longitude',
+    ))
+    if not rows:
+        return []
+    ids, latitudes, longitudes = (np.array(column) for column in zip(*rows))
+    distances = haversine_km(latitude, longitude, latitudes.astype(float), longitudes.astype(float))
+    inside = np.flatnonzero(distances <= radius_km)
+    order = inside[np.argsort(distances[inside], kind='stable')]
+    if limit:
+        order = order[:limit]
+    return [(int(ids[i]), round(float(distances[i]), 3)) for i in order]
+
+
+def parse_point(value):
+    """``"lat,lng"`` -> (lat, lng); raises ValueError when malformed or out of range."""
+    parts = str(value or '').split(',')
+    if len(parts) != 2:
+        raise ValueError("Expected 'latitude,longitude'.")
+    latitude, longitude = float(parts[0]), float(parts[1])
+    if not (-90 <= latitude <= 90 and -180 <= longitude <= 180) or math.isnan(latitude) or math.isnan(longitude):
+        raise ValueError("Latitude must be within -90..90 and longitude within -180..180.")
+    return latitude, longitude
+
+
+# --- Gazetteer geocoding -------------------------------------------------------
+
+def normalize_place(text):
+    return ' '.join(re.sub(r'[^a-z0-9]+', ' ', str(text or '').lower()).split())
+
+
+def phrases(text, max_words):
+    """Every run of 1..``max_words`` consecutive words of the normalized text."""
+    words = normalize_place(text).split()
+    return {
+        ' '.join(words[start:start + size])
+        for size in range(1, max_words + 1) for start in range(len(words) - size + 1)
+    }
+
+
+class Gazetteer:
+    """Places keyed by their normalized names (and aliases), for phrase lookups."""
+
+    def __init__(self, places):
+        self.places = places
+        self.by_name = {}
+        for place in places:
+            for name in place['names']:
+                self.by_name.setdefault(name, []).append(place)
+        self.max_words = max((len(name.split()) for name in self.by_name), default=1)
+
+
+@lru_cache(maxsize=4)
+def load_gazetteer(path=None):
+    """
+    The gazetteer CSV (name, aliases separated by "|", kind "city" or
+    "locality", city, latitude, longitude).
+    """
+    places = []
+    with open(path or GAZETTEER_PATH, newline='', encoding='utf-8') as fh:
+        for row in csv.DictReader(fh):
+            names = [row['name']] + [alias for alias in (row.get('aliases') or '').split('|') if alias.strip()]
+            places.append({
+                'name': row['name'],
+                'kind': row['kind'],
+                'city': normalize_place(row.get('city') or row['name']),
+                'names': [normalize_place(name) for name in names if normalize_place(name)],
+                'latitude': float(row['latitude']),
+                'longitude': float(row['longitude']),
+            })
+    return Gazetteer(places)
+
+
+def geocode(location, gazetteer=None):
+    """
+    Best gazetteer match for a free-text location, or None. A locality beats
+    its city, and a locality is only taken when the text names its city (or
+    no known city at all), so "Sector 62, Noida" doesn't land in Gurugram.
+    """
+    gazetteer = gazetteer or load_gazetteer()
+    # Phrase lookups keep this cheap enough to run over every lead
+    matched = {}
+    for phrase in phrases(location, gazetteer.max_words):
+        for place in gazetteer.by_name.get(phrase, ()):
+            matched[id(place)] = (place, max(len(phrase), matched.get(id(place), (None, 0))[1]))
+    if not matched:
+        return None
+
+    cities = {place['city'] for place, _ in matched.values() if place['kind'] == 'city'}
+    best, best_key = None, None
+    for place, length in matched.values():
+        if place['kind'] == 'locality' and cities and place['city'] not in cities:
+            continue
+        key = (place['kind'] == 'locality', length)
+        if best_key is None or key > best_key:
+            best, best_key = place, key
+    if best is None:
+        return None
+    return {'name': best['name'], 'kind': best['kind'], 'latitude': best['latitude'], 'longitude': best['longitude']}
@@ -0,0 +1,197 @@
+import json
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand
+
+from apps.property.geo import load_gazetteer
+from apps.property.matching import (
+    AMENITY_WORDS, LEAD_INDEX, PROPERTY_INDEX, LeadIndex, PropertyIndex, match_leads, match_properties, safe_log,
+)
+
+AMENITY_COUNT = 14
+SUB_TYPE_COUNT = 12
+
+
+def _points(rng, size, share):
+    """Gazetteer coordinates scattered over a few km for ``share`` of the rows, NaN for the rest."""
+    places = load_gazetteer().places
+    centres = np.array([(place['latitude'], place['longitude']) for place in places])
+    picks = centres[rng.integers(len(centres), size=size)] + rng.normal(0, 0.02, size=(size, 2))
+    picks[rng.random(size) >= share] = np.nan
+    return picks[:, 0], picks[:, 1]
+
+
+def _amenity_words(rng, size, probability):
+    bits = rng.random((size, AMENITY_COUNT)) < probability
+    words = np.zeros((size, AMENITY_WORDS), dtype=np.uint64)
+    for code in range(AMENITY_COUNT):
+        words[bits[:, code], code // 64] |= np.uint64(1) << np.uint64(code % 64)
+    return words, bits.sum(axis=1)
+
+
+def synthetic_properties(rng, size):
+    index = PropertyIndex()
+    latitude, longitude = _points(rng, size, 0.95)
+    property_type = rng.choice(3, size=size, p=[0.7, 0.2, 0.1]).astype(np.int8)
+    bedrooms = rng.integers(1, 6, size=size).astype(np.float32)
+    bedrooms[property_type != 0] = np.nan
+    amenities, _ = _amenity_words(rng, size, 0.4)
+    price = rng.lognormal(15.9, 0.6, size=size)
+    index.upsert(np.arange(1, size + 1), {
+        'price': price,
+        'log_price': safe_log(price),
+        'area': rng.lognormal(7.0, 0.5, size=size),
+        'type': property_type,
+        'sub_type': rng.integers(0, SUB_TYPE_COUNT, size=size).astype(np.int16),
+        'listing': rng.choice(2, size=size, p=[0.8, 0.2]).astype(np.int8),
+        'available': rng.random(size) < 0.9,
+        'latitude': latitude,
+        'longitude': longitude,
+        'bedrooms': bedrooms,
+        'amenities': amenities,
+    })
+    return index
+
+
+def synthetic_leads(rng, size, properties):
+    index = LeadIndex()
+    low = rng.lognormal(15.9, 0.6, size=size)
+    low[rng.random(size) < 0.15] = np.nan
+    high = low * rng.uniform(1.0, 1.3, size=size)
+    type_mask = np.where(rng.random(size) < 0.7, 1 << rng.choice(3, size=size, p=[0.7, 0.2, 0.1]), 0).astype(np.uint8)
+    sub_mask = np.where(rng.random(size) < 0.3, np.left_shift(np.uint64(1), rng.integers(0, SUB_TYPE_COUNT, size=size).astype(np.uint64)), 0).astype(np.uint64)
+    latitude, longitude = _points(rng, size, 0.6)
+    bedrooms = rng.integers(1, 5, size=size).astype(np.float32)
+    bedrooms[rng.random(size) < 0.5] = np.nan
+    amenities, amenity_count = _amenity_words(rng, size, 0.1)
+    index.upsert(np.arange(1, size + 1), {
+        'budget_low': low,
+        'budget_high': high,
+        'log_budget_low': safe_log(low),
+        'log_budget_high': safe_log(high),
+        'type_mask': type_mask,
+        'sub_mask': sub_mask,
+        'listing': rng.choice([-1, 0, 1], size=size, p=[0.6, 0.3, 0.1]).astype(np.int8),
+        'latitude': latitude,
+        'longitude': longitude,
+        'bedrooms': bedrooms,
+        'amenities': amenities,
+        'amenity_count': amenity_count.astype(np.int16),
+        'property': np.where(rng.random(size) < 0.5, rng.integers(1, properties + 1, size=size), -1),
+    })
+    return index
+
+
+def _row(index, row):
+    return {name: column[row] for name, column in index.data.items()}
+
+
+def _latency(samples):
+    samples = np.array(samples) * 1000
+    return {
+        'p50': round(float(np.percentile(samples, 50)), 2),
+        'p95': round(float(np.percentile(samples, 95)), 2),
+        'max': round(float(samples.max()), 2),
+        'mean': round(float(samples.mean()), 2),
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark the lead/property matching engine on synthetic feature indexes "
+        "(default 50k properties x 500k leads): build time, memory and per-query latency "
+        "for lead -> all properties and property -> all open leads. With --database, also "
+        "time building the real indexes and matching against them."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--properties', type=int, default=50000)
+        parser.add_argument('--leads', type=int, default=500000)
+        parser.add_argument('--queries', type=int, default=200, help="Queries per direction")
+        parser.add_argument('--limit', type=int, default=10)
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--database', action='store_true', help="Also benchmark the indexes built from the database")
+        parser.add_argument('--output', help="Write the results to this JSON file")
+
+    def handle(self, *args, **options):
+        rng = np.random.default_rng(options['seed'])
+        results = {'synthetic': self._synthetic(rng, options)}
+        if options['database']:
+            results['database'] = self._database(rng, options)
+        if options['output']:
+            with open(options['output'], 'w') as fh:
+                json.dump(results, fh, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"Results written to {options['output']}"))
+
+    def _synthetic(self, rng, options):
+        self.stdout.write(self.style.MIGRATE_HEADING(
+            f"Synthetic: {options['properties']} properties x {options['leads']} leads"
+        ))
+        started = time.perf_counter()
+        properties = synthetic_properties(rng, options['properties'])
+        leads = synthetic_leads(rng, options['leads'], options['properties'])
+        build = time.perf_counter() - started
+        result = self._measure(rng, properties, leads, options)
+        result.update({
+            'properties': properties.count,
+            'leads': leads.count,
+            'build_seconds': round(build, 3),
+            'memory_mb': round((properties.nbytes() + leads.nbytes()) / 2 ** 20, 1),
+        })
+        self._report(result)
+        return result
+
+    def _database(self, rng, options):
+        self.stdout.write(self.style.MIGRATE_HEADING("Database indexes"))
+        started = time.perf_counter()
+        PROPERTY_INDEX.rebuild()
+        property_build = time.perf_counter() - started
+        started = time.perf_counter()
+        LEAD_INDEX.rebuild()
+        lead_build = time.perf_counter() - started
+        if not PROPERTY_INDEX.count or not LEAD_INDEX.count:
+            self.stdout.write("No properties or open leads to match.")
+            return {}
+        result = self._measure(rng, PROPERTY_INDEX, LEAD_INDEX, options)
+        result.update({
+            'properties': PROPERTY_INDEX.count,
+            'leads': LEAD_INDEX.count,
+            'property_build_seconds': round(property_build, 3),
+            'lead_build_seconds': round(lead_build, 3),
+            'build_seconds': round(property_build + lead_build, 3),
+            'memory_mb': round((PROPERTY_INDEX.nbytes() + LEAD_INDEX.nbytes()) / 2 ** 20, 1),
+        })
+        self._report(result)
+        return result
+
+    def _measure(self, rng, properties, leads, options):
+        limit = options['limit']
+        lead_rows = np.flatnonzero(leads.alive[:leads.size])
+        property_rows = np.flatnonzero(properties.alive[:properties.size])
+        forward, reverse = [], []
+        for row in rng.choice(lead_rows, size=options['queries']):
+            started = time.perf_counter()
+            match_properties(properties, _row(leads, row), limit=limit)
+            forward.append(time.perf_counter() - started)
+        for row in rng.choice(property_rows, size=options['queries']):
+            started = time.perf_counter()
+            match_leads(leads, _row(properties, row), limit=limit, exclude_property=int(properties.ids[row]))
+            reverse.append(time.perf_counter() - started)
+        return {
+            'lead_to_properties_ms': _latency(forward),
+            'property_to_leads_ms': _latency(reverse),
+            'scored_per_second': round(
+                (len(forward) * len(property_rows) + len(reverse) * len(lead_rows)) / (sum(forward) + sum(reverse))
+            ),
+        }
+
+    def _report(self, result):
+        forward, reverse = result['lead_to_properties_ms'], result['property_to_leads_ms']
+        self.stdout.write(
+            f"{result['properties']} properties, {result['leads']} leads: built in {result['build_seconds']}s, "
+            f"{result['memory_mb']} MB"
+        )
+        self.stdout.write(f"lead -> properties  p50={forward['p50']:>8.2f}ms p95={forward['p95']:>8.2f}ms")
+        self.stdout.write(f"property -> leads   p50={reverse['p50']:>8.2f}ms p95={reverse['p95']:>8.2f}ms")
+        self.stdout.write(f"{result['scored_per_second']:,} pairs scored per second")
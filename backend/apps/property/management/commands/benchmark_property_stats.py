@@ -0,0 +1,104 @@
+import json
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from apps.property.geo import load_gazetteer
+from apps.property.matching import LISTING_CODES, TYPE_CODES
+from apps.property.stats import (
+    MARKET_SNAPSHOT, STATUS_CODES, MarketSnapshot, city_of, market_stats, month_number,
+)
+
+# group_by combinations timed per run
+SCENARIOS = [
+    ('overall', ()),
+    ('city', ('city',)),
+    ('city-type', ('city', 'property_type')),
+    ('location-type-listing', ('location', 'property_type', 'listing_type')),
+]
+
+
+def synthetic_snapshot(rng, size):
+    """A MarketSnapshot of ``size`` listings spread over the gazetteer's places and the last three years."""
+    snapshot = MarketSnapshot()
+    places = load_gazetteer().places
+    names = [f"{place['name']}, {place['city'].title()}" if place['kind'] == 'locality' else place['name'] for place in places]
+    picks = rng.integers(len(names), size=size)
+    area = rng.lognormal(7.0, 0.5, size=size)
+    current = month_number(timezone.now())
+    snapshot.upsert(np.arange(1, size + 1), {
+        'price': area * rng.lognormal(9.0, 0.4, size=size),
+        'area': area,
+        'type': rng.choice(len(TYPE_CODES), size=size, p=[0.7, 0.2, 0.1]).astype(np.int8),
+        'listing': rng.choice(len(LISTING_CODES), size=size, p=[0.8, 0.2]).astype(np.int8),
+        'status': rng.integers(len(STATUS_CODES), size=size).astype(np.int8),
+        'location': np.array([snapshot.locations.code(names[i]) for i in picks], dtype=np.int32),
+        'city': np.array([snapshot.cities.code(city_of(names[i])) for i in picks], dtype=np.int32),
+        'month': (current - rng.integers(0, 36, size=size)).astype(np.int32),
+    })
+    return snapshot
+
+
+def _latency(samples):
+    samples = np.array(samples) * 1000
+    return {
+        'p50': round(float(np.percentile(samples, 50)), 2),
+        'p95': round(float(np.percentile(samples, 95)), 2),
+        'max': round(float(samples.max()), 2),
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark the market statistics behind /api/properties/stats/ on a synthetic "
+        "snapshot (default 100k listings): build time, memory and latency per group_by "
+        "combination, uncached. With --database, also time building the real snapshot."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--properties', type=int, default=100000)
+        parser.add_argument('--queries', type=int, default=20, help="Runs per group_by combination")
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--database', action='store_true', help="Also benchmark the snapshot built from the database")
+        parser.add_argument('--output', help="Write the results to this JSON file")
+
+    def handle(self, *args, **options):
+        rng = np.random.default_rng(options['seed'])
+        self.stdout.write(self.style.MIGRATE_HEADING(f"Synthetic: {options['properties']} listings"))
+        started = time.perf_counter()
+        snapshot = synthetic_snapshot(rng, options['properties'])
+        results = {'synthetic': self._measure(snapshot, time.perf_counter() - started, options)}
+
+        if options['database']:
+            self.stdout.write(self.style.MIGRATE_HEADING("Database snapshot"))
+            started = time.perf_counter()
+            MARKET_SNAPSHOT.rebuild()
+            results['database'] = self._measure(MARKET_SNAPSHOT, time.perf_counter() - started, options)
+
+        if options['output']:
+            with open(options['output'], 'w') as fh:
+                json.dump(results, fh, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"Results written to {options['output']}"))
+
+    def _measure(self, snapshot, build, options):
+        result = {
+            'listings': snapshot.count,
+            'build_seconds': round(build, 3),
+            'memory_mb': round(snapshot.nbytes() / 2 ** 20, 1),
+            'scenarios': {},
+        }
+        self.stdout.write(f"{snapshot.count} listings: built in {result['build_seconds']}s, {result['memory_mb']} MB")
+        for name, group_by in SCENARIOS:
+            timings = []
+            for _ in range(options['queries']):
+                started = time.perf_counter()
+                stats = market_stats(snapshot, group_by=group_by)
+                timings.append(time.perf_counter() - started)
+            result['scenarios'][name] = {'groups': stats['groups_total'], 'latency_ms': _latency(timings)}
+            latency = result['scenarios'][name]['latency_ms']
+            self.stdout.write(
+                f"{name:<24} groups={stats['groups_total']:<6} p50={latency['p50']:>8.2f}ms p95={latency['p95']:>8.2f}ms"
+            )
+        return result
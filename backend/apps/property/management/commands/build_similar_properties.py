@@ -0,0 +1,30 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from apps.property.similarity import rebuild_similar_properties, update_similar_properties
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute the similar-properties table (the k nearest neighbours of every property) "
+        "served by /api/properties/{id}/similar/. With property ids, only patch around those."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('property_ids', nargs='*', type=int, help="Only update around these properties")
+        parser.add_argument('--k', type=int, help="Neighbours per property (default: SIMILAR_PROPERTIES_K)")
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        if options['property_ids']:
+            updated = update_similar_properties(options['property_ids'], k=options['k'])
+            self.stdout.write(self.style.SUCCESS(
+                f"Updated the similar properties of {updated} properties in {time.perf_counter() - started:.2f}s."
+            ))
+            return
+        properties, rows = rebuild_similar_properties(k=options['k'], batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Stored {rows} neighbours for {properties} properties in {time.perf_counter() - started:.2f}s."
+        ))
@@ -0,0 +1,65 @@
+from collections import Counter
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from apps.property.geo import geocode, geohash_encode, load_gazetteer
+from apps.property.models import Property
+
+
+class Command(BaseCommand):
+    help = (
+        "Fill property latitude/longitude (and geohash) by matching the free-text location "
+        "against the offline gazetteer. No network access is needed."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('property_ids', nargs='*', type=int, help="Only geocode these properties")
+        parser.add_argument('--all', action='store_true', help="Also re-geocode properties that already have coordinates")
+        parser.add_argument('--gazetteer', help="CSV with name,aliases,kind,city,latitude,longitude (default: bundled)")
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--dry-run', action='store_true')
+
+    def handle(self, *args, **options):
+        gazetteer = load_gazetteer(options['gazetteer'])
+        queryset = Property.objects.order_by('pk')
+        if options['property_ids']:
+            queryset = queryset.filter(pk__in=options['property_ids'])
+        if not options['all']:
+            queryset = queryset.filter(latitude=None)
+
+        # Many properties share a location string; geocode each string once
+        cache, kinds, unmatched = {}, Counter(), Counter()
+        batch, updated = [], 0
+        for pk, location in queryset.values_list('pk', 'location').iterator(chunk_size=options['batch_size']):
+            if location not in cache:
+                cache[location] = geocode(location, gazetteer)
+            match = cache[location]
+            if match is None:
+                unmatched[location] += 1
+                continue
+            kinds[match['kind']] += 1
+            batch.append(Property(
+                pk=pk, latitude=match['latitude'], longitude=match['longitude'],
+                geohash=geohash_encode(match['latitude'], match['longitude']), updated_at=timezone.now(),
+            ))
+            if len(batch) >= options['batch_size']:
+                updated += self._flush(batch, options['dry_run'])
+                batch = []
+        updated += self._flush(batch, options['dry_run'])
+
+        verb = "Would geocode" if options['dry_run'] else "Geocoded"
+        self.stdout.write(self.style.SUCCESS(
+            f"{verb} {updated} properties ({kinds['locality']} to a locality, {kinds['city']} to a city centre); "
+            f"{sum(unmatched.values())} unmatched."
+        ))
+        for location, count in unmatched.most_common(10):
+            self.stdout.write(f"  unmatched: {location!r} x{count}")
+
+    def _flush(self, batch, dry_run):
+        if not batch:
+            return 0
+        if dry_run:
+            return len(batch)
+        # bulk_update skips Property.save, so the geohash and updated_at are set explicitly
+        return Property.objects.bulk_update(batch, ['latitude', 'longitude', 'geohash', 'updated_at'])
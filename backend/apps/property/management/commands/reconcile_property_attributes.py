@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from apps.property.attributes import reconcile_property_attributes
+from apps.property.models import Property
+
+
+class Command(BaseCommand):
+    help = "Rebuild the denormalized amenity_tags/spec_map of properties from their amenity and specification rows."
+
+    def add_arguments(self, parser):
+        parser.add_argument('property_ids', nargs='*', type=int, help="Only reconcile these properties (default: all)")
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        queryset = Property.objects.all()
+        if options['property_ids']:
+            queryset = queryset.filter(pk__in=options['property_ids'])
+        updated = reconcile_property_attributes(queryset, batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Reconciled attributes for {updated} properties."))
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from apps.property.counters import reconcile_property_counters
+from apps.property.models import Property
+
+
+class Command(BaseCommand):
+    help = "Recompute per-property lead, conversion and site-visit counters from the source tables."
+
+    def add_arguments(self, parser):
+        parser.add_argument('property_ids', nargs='*', type=int, help="Only reconcile these properties (default: all)")
+
+    def handle(self, *args, **options):
+        queryset = Property.objects.all()
+        if options['property_ids']:
+            queryset = queryset.filter(pk__in=options['property_ids'])
+        updated = reconcile_property_counters(queryset)
+        self.stdout.write(self.style.SUCCESS(f"Reconciled counters for {updated} properties."))
@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand
+
+from apps.property.models import Property
+from apps.property.units import create_units, reconcile_unit_counters, release_expired_holds
+
+
+class Command(BaseCommand):
+    help = (
+        "Release expired unit holds and recompute units_total/units_available of unit-managed "
+        "properties from their units. Run it periodically; holds also expire lazily on use. "
+        "With --create, first give properties that only have hand-kept unit counts their Unit rows."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('property_ids', nargs='*', type=int, help="Only these properties (default: all)")
+        parser.add_argument('--create', action='store_true', help="Create units for properties without them")
+
+    def handle(self, *args, **options):
+        queryset = Property.objects.all()
+        if options['property_ids']:
+            queryset = queryset.filter(pk__in=options['property_ids'])
+
+        if options['create']:
+            created = 0
+            for property_instance in queryset.filter(units_managed=False, units_total__gt=0).iterator():
+                created += len(create_units(property_instance))
+            self.stdout.write(f"Created {created} units.")
+
+        if options['property_ids']:
+            released = sum(release_expired_holds(pk) for pk in options['property_ids'])
+        else:
+            released = release_expired_holds()
+        updated = reconcile_unit_counters(queryset.filter(units_managed=True) if options['property_ids'] else None)
+        self.stdout.write(self.style.SUCCESS(f"Released {released} expired holds; reconciled {updated} properties."))
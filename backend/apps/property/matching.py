@@ -0,0 +1,674 @@
+# apps/property/matching.py
+"""
+Lead-to-property matching.
+
+Properties and open leads are encoded once into in-memory NumPy feature
+columns (``PropertyIndex`` / ``LeadIndex``): price, area, type and sub-type
+codes, listing type, coordinates, bedrooms and an amenity bitset (one bit per
+amenity in a shared vocabulary, packed into uint64 words). A lead's free-text
+budget, interest and requirements are parsed into the same terms, falling
+back to its linked property for whatever it doesn't say.
+
+Scoring a lead against every property, or every open lead against one
+property, is then a single vectorized pass over the columns. Each component
+(budget, type, listing, location, amenities, bedrooms) scores 0..1; the
+score is their weighted mean (MATCHING_WEIGHTS) over the components the lead
+specifies, scaled down for leads that specify little, so vague leads don't
+outrank precise ones.
+
+The indexes are process-local. Saves and deletes mark rows stale through
+signals and are re-read on the next query; every MATCHING_REFRESH_SECONDS a
+single aggregate query also picks up rows other processes changed (newer
+``updated_at``) and rebuilds when rows went missing.
+"""
+import re
+import threading
+import time
+
+import numpy as np
+from django.conf import settings
+from django.db.models import Count, Max, Q
+
+from apps.accounts.workload import CLOSED_LEAD_STATUSES
+
+from .geo import geocode, haversine_km, phrases
+from .models import ListingType, Property, PropertyStatus, PropertyType
+
+AMENITY_WORDS = 2  # amenity bitset width in uint64 words (128 amenities)
+TYPE_CODES = {value: code for code, value in enumerate(PropertyType.values)}
+LISTING_CODES = {value: code for code, value in enumerate(ListingType.values)}
+
+DEFAULT_WEIGHTS = {'budget': 0.35, 'type': 0.2, 'location': 0.2, 'amenities': 0.1, 'bedrooms': 0.1, 'listing': 0.05}
+# Price above budget is penalised much faster than price below it
+OVER_BUDGET_SIGMA = 0.12
+UNDER_BUDGET_SIGMA = 0.45
+
+TYPE_WORDS = {
+    PropertyType.HOUSE: ('house', 'home', 'apartment', 'flat', 'villa', 'penthouse', 'studio', 'residential', 'bhk'),
+    PropertyType.COMMERCIAL: ('commercial', 'office', 'shop', 'showroom', 'warehouse', 'retail'),
+    PropertyType.LAND: ('land', 'plot', 'acre', 'acres', 'agricultural'),
+}
+LISTING_WORDS = {
+    ListingType.FOR_RENT: ('rent', 'rental', 'lease', 'renting'),
+    ListingType.FOR_SALE: ('buy', 'purchase', 'buying', 'investment', 'resale'),
+}
+SUB_TYPE_ALIASES = {'flat': 'apartment', 'plot': 'residential_plot', 'row house': 'row_house'}
+AMENITY_ALIASES = {
+    'pool': 'swimming_pool', 'elevator': 'lift', 'clubhouse': 'club_house', 'car parking': 'parking',
+    'power back up': 'power_backup', 'backup': 'power_backup', 'internet': 'wifi', 'wi fi': 'wifi',
+}
+BUDGET_UNITS = {
+    'k': 1e3, 'thousand': 1e3, 'l': 1e5, 'lac': 1e5, 'lacs': 1e5, 'lakh': 1e5, 'lakhs': 1e5,
+    'cr': 1e7, 'crore': 1e7, 'crores': 1e7, 'm': 1e6, 'mn': 1e6, 'million': 1e6,
+}
+BUDGET_AMOUNT = re.compile(r'(\d+(?:\.\d+)?)\s*(' + '|'.join(sorted(BUDGET_UNITS, key=len, reverse=True)) + r')?\b')
+BEDROOMS = re.compile(r'(\d+)\s*(?:bhk|bed(?:room)?s?\b|br\b)')
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def parse_budget(text):
+    """
+    (low, high) in rupees from a free-text budget ("45 lakh", "1.2 Cr",
+    "₹45,00,000", "50-60 lakh"), or None. A number without a unit takes the
+    next unit after it, so ranges can name the unit once.
+    """
+    text = BEDROOMS.sub(' ', str(text or '').lower().replace(',', ''))
+    found = BUDGET_AMOUNT.findall(text)
+    amounts, pending = [], []
+    for number, unit in found:
+        if not unit:
+            pending.append(float(number))
+            continue
+        amounts.extend(value * BUDGET_UNITS[unit] for value in pending + [float(number)])
+        pending = []
+    amounts.extend(pending)
+    # Anything under 10k is a count or a typo, not a property budget
+    amounts = [amount for amount in amounts if amount >= 10000]
+    if not amounts:
+        return None
+    return min(amounts), max(amounts)
+
+
+class Vocabulary:
+    """Tags numbered in the order they are first seen, up to ``limit``."""
+
+    def __init__(self, limit):
+        self.limit = limit
+        self.codes = {}
+        self.meta = {}
+        self.version = 0
+
+    def add(self, tag, meta=None):
+        code = self.codes.get(tag)
+        if code is None and tag and len(self.codes) < self.limit:
+            code = self.codes[tag] = len(self.codes)
+            self.meta[code] = meta
+            self.version += 1
+        return code
+
+    def phrase_codes(self, aliases=None):
+        """Phrase as written in free text ("swimming pool") -> code, aliases included."""
+        table = {tag.replace('_', ' '): code for tag, code in self.codes.items()}
+        for alias, tag in (aliases or {}).items():
+            if tag in self.codes:
+                table.setdefault(alias, self.codes[tag])
+        return table
+
+
+AMENITIES = Vocabulary(64 * AMENITY_WORDS)
+SUB_TYPES = Vocabulary(64)
+
+
+def safe_log(values):
+    """Natural log, NaN for missing or non-positive values."""
+    values = np.asarray(values, dtype=np.float64)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(values > 0, np.log(values), np.nan)
+
+
+def amenity_bits(codes):
+    words = np.zeros(AMENITY_WORDS, dtype=np.uint64)
+    for code in codes:
+        words[code // 64] |= np.uint64(1) << np.uint64(code % 64)
+    return words
+
+
+class FeatureIndex:
+    """
+    Rows of NumPy feature columns keyed by primary key. Subclasses declare
+    ``columns`` ({name: (dtype, fill, width)}), the queryset of rows to index
+    and how to encode a batch of ``values()`` rows.
+    """
+    columns = {}
+    fields = ()
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self._pending = set()
+        self._watermark = None
+        self._checked = 0.0
+        self.built = False
+        # Bumped on every change, for caches derived from the index
+        self.version = 0
+        self._reset(0)
+
+    def _reset(self, capacity):
+        self.version += 1
+        self.data = {
+            name: np.full((capacity, width) if width else capacity, fill, dtype=dtype)
+            for name, (dtype, fill, width) in self.columns.items()
+        }
+        self.ids = np.zeros(capacity, dtype=np.int64)
+        self.alive = np.zeros(capacity, dtype=bool)
+        self.pos = {}
+        self.size = 0
+
+    def _grow(self, needed):
+        capacity = len(self.ids)
+        if needed <= capacity:
+            return
+        capacity = max(needed, capacity * 2, 1024)
+        for name, (dtype, fill, width) in self.columns.items():
+            column = np.full((capacity, width) if width else capacity, fill, dtype=dtype)
+            column[:self.size] = self.data[name][:self.size]
+            self.data[name] = column
+        ids = np.zeros(capacity, dtype=np.int64)
+        ids[:self.size] = self.ids[:self.size]
+        alive = np.zeros(capacity, dtype=bool)
+        alive[:self.size] = self.alive[:self.size]
+        self.ids, self.alive = ids, alive
+
+    def upsert(self, ids, values):
+        """Insert or overwrite rows; ``values`` maps column names to arrays aligned with ``ids``."""
+        rows = np.empty(len(ids), dtype=np.int64)
+        new = []
+        for i, pk in enumerate(ids):
+            row = self.pos.get(int(pk))
+            if row is None:
+                new.append(i)
+            else:
+                rows[i] = row
+        self._grow(self.size + len(new))
+        for i in new:
+            rows[i] = self.pos[int(ids[i])] = self.size
+            self.size += 1
+        self.ids[rows] = ids
+        self.alive[rows] = True
+        self.version += 1
+        for name, column in values.items():
+            self.data[name][rows] = column
+
+    def remove(self, ids):
+        rows = [self.pos.pop(int(pk)) for pk in ids if int(pk) in self.pos]
+        self.alive[rows] = False
+        self.version += 1
+
+    def rows_for(self, ids):
+        return np.array([self.pos[pk] for pk in ids if pk in self.pos], dtype=np.int64)
+
+    @property
+    def count(self):
+        return len(self.pos)
+
+    def nbytes(self):
+        return sum(column.nbytes for column in self.data.values()) + self.ids.nbytes + self.alive.nbytes
+
+    # --- Loading from the database ---------------------------------------------
+
+    def all_rows(self):
+        raise NotImplementedError
+
+    def eligible(self):
+        """Filter (Q) for the rows to index; ``all_rows()`` may hold others."""
+        return Q()
+
+    def encode(self, rows):
+        """Column arrays for a list of ``values(*fields)`` dicts."""
+        raise NotImplementedError
+
+    def invalidate(self, pk):
+        """Called from signals: re-read this row on the next query."""
+        with self.lock:
+            self._pending.add(pk)
+
+    def _load(self, queryset, chunk_size=5000):
+        batch = []
+        for row in queryset.values(*self.fields).iterator(chunk_size=chunk_size):
+            batch.append(row)
+            if len(batch) == chunk_size:
+                self.upsert([r['pk'] for r in batch], self.encode(batch))
+                batch = []
+        if batch:
+            self.upsert([r['pk'] for r in batch], self.encode(batch))
+
+    def _stats(self):
+        # Latest change over all rows: a lead being closed must count as a change too
+        return self.all_rows().aggregate(n=Count('pk', filter=self.eligible()), latest=Max('updated_at'))
+
+    def rebuild(self):
+        with self.lock:
+            stats = self._stats()
+            self._reset(0)
+            self._load(self.all_rows().filter(self.eligible()).order_by())
+            self._watermark = stats['latest']
+            self._pending.clear()
+            self._checked = time.monotonic()
+            self.built = True
+
+    def reset(self):
+        """Drop every row; the next refresh() rebuilds from the database."""
+        with self.lock:
+            self._reset(0)
+            self._pending.clear()
+            self._watermark = None
+            self.built = False
+
+    def refresh(self):
+        """Bring the index up to date (see the module docstring)."""
+        with self.lock:
+            if not self.built:
+                self.rebuild()
+                return
+            stats = None
+            if time.monotonic() - self._checked >= _setting('MATCHING_REFRESH_SECONDS', 30):
+                stats = self._stats()
+            changed = []
+            if self._pending:
+                changed.append(Q(pk__in=list(self._pending)))
+            if stats and stats['latest'] is not None:
+                if self._watermark is None:
+                    self.rebuild()
+                    return
+                if stats['latest'] > self._watermark:
+                    # >= : rows sharing the watermark's timestamp may have committed after we read it
+                    changed.append(Q(updated_at__gte=self._watermark))
+            if changed:
+                condition = changed[0]
+                for extra in changed[1:]:
+                    condition |= extra
+                rows = self.all_rows().filter(condition).order_by()
+                seen = set(rows.values_list('pk', flat=True)) | self._pending
+                self._pending.clear()
+                keep = set(rows.filter(self.eligible()).values_list('pk', flat=True))
+                self.remove([pk for pk in seen if pk not in keep])
+                if keep:
+                    self._load(self.all_rows().filter(pk__in=keep).order_by())
+            if stats is not None:
+                self._checked = time.monotonic()
+                self._watermark = stats['latest'] or self._watermark
+                # Rows deleted or changed without touching updated_at (bulk
+                # updates), or too many dead slots: start over
+                if stats['n'] != self.count or self.size > 2 * self.count + 1024:
+                    self.rebuild()
+
+
+class PropertyIndex(FeatureIndex):
+    columns = {
+        'price': (np.float64, np.nan, 0),
+        'log_price': (np.float64, np.nan, 0),
+        'area': (np.float64, np.nan, 0),
+        'type': (np.int8, -1, 0),
+        'sub_type': (np.int16, -1, 0),
+        'listing': (np.int8, -1, 0),
+        'available': (bool, False, 0),
+        'latitude': (np.float64, np.nan, 0),
+        'longitude': (np.float64, np.nan, 0),
+        'bedrooms': (np.float32, np.nan, 0),
+        'amenities': (np.uint64, 0, AMENITY_WORDS),
+        # Loan terms for affordability screening (apps.property.finance)
+        'interest_rate': (np.float64, np.nan, 0),
+        'loan_term': (np.int16, -1, 0),
+    }
+    fields = (
+        'pk', 'price', 'area', 'property_type', 'property_sub_type', 'listing_type', 'status',
+        'latitude', 'longitude', 'amenity_tags', 'spec_map', 'interest_rate', 'loan_term',
+    )
+
+    def all_rows(self):
+        return Property.objects.all()
+
+    def eligible(self):
+        return Q(archived_at__isnull=True)
+
+    def encode(self, rows):
+        n = len(rows)
+        amenities = np.zeros((n, AMENITY_WORDS), dtype=np.uint64)
+        bedrooms = np.full(n, np.nan, dtype=np.float32)
+        sub_types = np.full(n, -1, dtype=np.int16)
+        for i, row in enumerate(rows):
+            amenities[i] = amenity_bits(
+                code for code in (AMENITIES.add(tag) for tag in row['amenity_tags'] or ()) if code is not None
+            )
+            value = (row['spec_map'] or {}).get('bedrooms')
+            if value is not None and str(value).strip().isdigit():
+                bedrooms[i] = int(str(value).strip())
+            tag = '_'.join(str(row['property_sub_type'] or '').lower().split())
+            code = SUB_TYPES.add(tag, meta=row['property_type'])
+            sub_types[i] = -1 if code is None else code
+        price = np.array([float(row['price'] or 'nan') for row in rows])
+        return {
+            'price': price,
+            'log_price': safe_log(price),
+            'area': np.array([float(row['area'] or 'nan') for row in rows]),
+            'type': np.array([TYPE_CODES.get(row['property_type'], -1) for row in rows], dtype=np.int8),
+            'sub_type': sub_types,
+            'listing': np.array([LISTING_CODES.get(row['listing_type'], -1) for row in rows], dtype=np.int8),
+            'available': np.array([row['status'] != PropertyStatus.SOLD_OUT for row in rows]),
+            'latitude': np.array([np.nan if row['latitude'] is None else row['latitude'] for row in rows]),
+            'longitude': np.array([np.nan if row['longitude'] is None else row['longitude'] for row in rows]),
+            'bedrooms': bedrooms,
+            'amenities': amenities,
+            'interest_rate': np.array([np.nan if row['interest_rate'] is None else float(row['interest_rate']) for row in rows]),
+            'loan_term': np.array([row['loan_term'] if row['loan_term'] and row['loan_term'] > 0 else -1 for row in rows], dtype=np.int16),
+        }
+
+
+class LeadIndex(FeatureIndex):
+    columns = {
+        'budget_low': (np.float64, np.nan, 0),
+        'budget_high': (np.float64, np.nan, 0),
+        # Logs of the budget edges, so scoring 500k leads needs no np.log per query
+        'log_budget_low': (np.float64, np.nan, 0),
+        'log_budget_high': (np.float64, np.nan, 0),
+        'type_mask': (np.uint8, 0, 0),
+        'sub_mask': (np.uint64, 0, 0),
+        'listing': (np.int8, -1, 0),
+        'latitude': (np.float64, np.nan, 0),
+        'longitude': (np.float64, np.nan, 0),
+        'bedrooms': (np.float32, np.nan, 0),
+        'amenities': (np.uint64, 0, AMENITY_WORDS),
+        'amenity_count': (np.int16, 0, 0),
+        'property': (np.int64, -1, 0),
+    }
+    fields = (
+        'pk', 'budget', 'interest', 'requirements', 'property_id',
+        'property__price', 'property__property_type', 'property__property_sub_type',
+        'property__latitude', 'property__longitude',
+    )
+
+    def __init__(self):
+        super().__init__()
+        self.vocabulary_version = None
+
+    def all_rows(self):
+        from apps.leads.models import Lead
+        return Lead.objects.all()
+
+    def eligible(self):
+        return ~Q(status__in=CLOSED_LEAD_STATUSES)
+
+    def refresh(self):
+        with self.lock:
+            # Leads are parsed against the amenity/sub-type vocabularies the properties define
+            if self.built and self.vocabulary_version != (AMENITIES.version, SUB_TYPES.version):
+                self.rebuild()
+            else:
+                super().refresh()
+
+    def rebuild(self):
+        with self.lock:
+            self.vocabulary_version = (AMENITIES.version, SUB_TYPES.version)
+            super().rebuild()
+
+    def encode(self, rows):
+        return encode_leads(rows)
+
+
+def lead_preferences(budget='', interest='', requirements='', linked=None):
+    """
+    Preferences parsed from a lead's text, as one row of LeadIndex columns;
+    ``linked`` ({price, property_type, property_sub_type, latitude,
+    longitude}) fills in what the text leaves out.
+    """
+    return encode_leads([{
+        'budget': budget, 'interest': interest, 'requirements': requirements, 'property_id': None,
+        **{f'property__{key}': value for key, value in (linked or {}).items()},
+    }])
+
+
+def encode_leads(rows):
+    n = len(rows)
+    columns = {name: np.full((n, width) if width else n, fill, dtype=dtype)
+               for name, (dtype, fill, width) in LeadIndex.columns.items()}
+    amenity_phrases = AMENITIES.phrase_codes(AMENITY_ALIASES)
+    sub_type_phrases = SUB_TYPES.phrase_codes(SUB_TYPE_ALIASES)
+    type_phrases = {word: TYPE_CODES[value] for value, words in TYPE_WORDS.items() for word in words}
+    listing_phrases = {word: LISTING_CODES[value] for value, words in LISTING_WORDS.items() for word in words}
+    max_words = max([len(phrase.split()) for phrase in list(amenity_phrases) + list(sub_type_phrases)] + [1])
+
+    for i, row in enumerate(rows):
+        text = f"{row.get('interest') or ''} {row.get('requirements') or ''}"
+        found = phrases(text, max_words)
+
+        budget = parse_budget(row.get('budget'))
+        if budget is None and row.get('property__price'):
+            # Linked property: its price, give or take 10%
+            price = float(row['property__price'])
+            budget = (price * 0.9, price * 1.1)
+        if budget is not None:
+            columns['budget_low'][i], columns['budget_high'][i] = budget
+
+        type_mask = 0
+        for phrase in found & type_phrases.keys():
+            type_mask |= 1 << type_phrases[phrase]
+        sub_mask = 0
+        for phrase in found & sub_type_phrases.keys():
+            code = sub_type_phrases[phrase]
+            sub_mask |= 1 << code
+            if SUB_TYPES.meta.get(code) in TYPE_CODES:
+                type_mask |= 1 << TYPE_CODES[SUB_TYPES.meta[code]]
+        if not type_mask and row.get('property__property_type') in TYPE_CODES:
+            type_mask = 1 << TYPE_CODES[row['property__property_type']]
+        columns['type_mask'][i] = type_mask
+        columns['sub_mask'][i] = sub_mask
+
+        listings = {listing_phrases[phrase] for phrase in found & listing_phrases.keys()}
+        if len(listings) == 1:
+            columns['listing'][i] = listings.pop()
+
+        place = geocode(text)
+        if place is not None:
+            columns['latitude'][i], columns['longitude'][i] = place['latitude'], place['longitude']
+        elif row.get('property__latitude') is not None and row.get('property__longitude') is not None:
+            columns['latitude'][i], columns['longitude'][i] = row['property__latitude'], row['property__longitude']
+
+        match = BEDROOMS.search(text.lower())
+        if match:
+            columns['bedrooms'][i] = int(match.group(1))
+
+        codes = {amenity_phrases[phrase] for phrase in found & amenity_phrases.keys()}
+        columns['amenities'][i] = amenity_bits(codes)
+        columns['amenity_count'][i] = len(codes)
+        columns['property'][i] = row.get('property_id') or -1
+    columns['log_budget_low'] = safe_log(columns['budget_low'])
+    columns['log_budget_high'] = safe_log(columns['budget_high'])
+    return columns
+
+
+# --- Scoring -----------------------------------------------------------------------
+
+def _weights():
+    weights = dict(DEFAULT_WEIGHTS)
+    weights.update(_setting('MATCHING_WEIGHTS', {}))
+    return weights
+
+
+def score(prop, lead, breakdown=False):
+    """
+    Scores for property features ``prop`` against lead features ``lead``.
+    Either side may be arrays (one entry per row) and the other scalars (one
+    row); the result broadcasts. With ``breakdown``, also returns the
+    per-component scores (NaN where the lead doesn't specify the component).
+    """
+    weights = _weights()
+    total = 0.0
+    specified = 0.0
+    components = {}
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        present = ~np.isnan(lead['log_budget_low'])
+        if np.any(present):
+            # Log-ratio of price to the budget edges: at most one of the two is non-zero
+            over = np.maximum(prop['log_price'] - lead['log_budget_high'], 0.0)
+            under = np.minimum(prop['log_price'] - lead['log_budget_low'], 0.0)
+            closeness = np.exp(-(over / OVER_BUDGET_SIGMA) ** 2 - (under / UNDER_BUDGET_SIGMA) ** 2)
+            components['budget'] = (present, np.nan_to_num(closeness))
+
+        type_mask = np.asarray(lead['type_mask']).astype(np.int64)
+        present = type_mask != 0
+        if np.any(present):
+            prop_type = np.asarray(prop['type']).astype(np.int64)
+            type_ok = (prop_type >= 0) & ((type_mask >> np.maximum(prop_type, 0)) & 1).astype(bool)
+            sub_mask = np.asarray(lead['sub_mask'])
+            sub_type = np.asarray(prop['sub_type']).astype(np.int64)
+            sub_ok = (sub_type >= 0) & ((sub_mask >> np.maximum(sub_type, 0).astype(np.uint64)) & np.uint64(1)).astype(bool)
+            # Right type: 1 if the lead named no sub-type, 0.7 if it named a different one
+            components['type'] = (present, np.where(sub_ok | (type_ok & (sub_mask == 0)), 1.0, np.where(type_ok, 0.7, 0.0)))
+
+        present = np.asarray(lead['listing']) >= 0
+        if np.any(present):
+            components['listing'] = (present, (np.asarray(prop['listing']) == lead['listing']).astype(float))
+
+        present = ~np.isnan(lead['latitude'])
+        if np.any(present):
+            if np.ndim(lead['latitude']) == 0:
+                distance = haversine_km(float(lead['latitude']), float(lead['longitude']), prop['latitude'], prop['longitude'])
+            else:
+                distance = haversine_km(float(prop['latitude']), float(prop['longitude']), lead['latitude'], lead['longitude'])
+            scale = _setting('MATCHING_DISTANCE_SCALE_KM', 10)
+            components['location'] = (present, np.nan_to_num(np.exp(-distance / scale)))
+
+        present = np.asarray(lead['amenity_count']) > 0
+        if np.any(present):
+            shared = np.bitwise_count(np.asarray(prop['amenities']) & np.asarray(lead['amenities'])).sum(axis=-1)
+            components['amenities'] = (present, shared / np.maximum(lead['amenity_count'], 1))
+
+        present = ~np.isnan(lead['bedrooms'])
+        if np.any(present):
+            gap = np.abs(prop['bedrooms'] - lead['bedrooms'])
+            components['bedrooms'] = (present, np.nan_to_num(np.where(gap == 0, 1.0, np.where(gap == 1, 0.5, 0.0))))
+
+    for name, (present, value) in components.items():
+        weight = weights.get(name, 0) * present
+        total = total + weight * value
+        specified = specified + weight
+    all_weights = sum(weights.values()) or 1.0
+    # Plain floats when no component applies; NumPy division handles the zeros
+    total, specified = np.asarray(total, dtype=float), np.asarray(specified, dtype=float)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        result = np.where(specified > 0, total / specified, 0.0) * (0.5 + 0.5 * specified / all_weights)
+    if not breakdown:
+        return result
+    return result, {name: np.where(present, value, np.nan) for name, (present, value) in components.items()}
+
+
+def _top(scores, candidates, limit, min_score):
+    scores = np.where(candidates, scores, -1.0)
+    eligible = np.flatnonzero(scores >= max(min_score, 1e-9))
+    if len(eligible) > limit:
+        eligible = eligible[np.argpartition(-scores[eligible], limit - 1)[:limit]]
+    return eligible[np.argsort(-scores[eligible], kind='stable')]
+
+
+def _results(index, rows, scores, components, key):
+    results = []
+    for i, row in enumerate(rows):
+        results.append({
+            key: int(index.ids[row]),
+            'score': round(float(scores[i]), 4),
+            'components': {
+                name: round(float(value[i]), 3) for name, value in components.items() if not np.isnan(value[i])
+            },
+        })
+    return results
+
+
+def _scalar_row(index, row):
+    return {name: column[row] for name, column in index.data.items()}
+
+
+def match_properties(properties, lead, limit=10, min_score=0.0, restrict_to=None, exclude=()):
+    """Best properties in ``properties`` (a PropertyIndex) for one lead's features (scalar columns)."""
+    size = properties.size
+    data = {name: column[:size] for name, column in properties.data.items()}
+    candidates = properties.alive[:size] & data['available']
+    if restrict_to is not None:
+        allowed = np.zeros(size, dtype=bool)
+        allowed[properties.rows_for(restrict_to)] = True
+        candidates &= allowed
+    if exclude:
+        candidates[properties.rows_for(exclude)] = False
+    rows = _top(score(data, lead), candidates, limit, min_score)
+    if not len(rows):
+        return []
+    scores, components = score({name: column[rows] for name, column in data.items()}, lead, breakdown=True)
+    return _results(properties, rows, np.atleast_1d(scores), components, 'property')
+
+
+def match_leads(leads, prop, limit=10, min_score=0.0, restrict_to=None, exclude_property=None):
+    """
+    Best open leads in ``leads`` (a LeadIndex) for one property's features
+    (scalar columns), leaving out leads already linked to ``exclude_property``.
+    """
+    size = leads.size
+    data = {name: column[:size] for name, column in leads.data.items()}
+    candidates = leads.alive[:size].copy()
+    if exclude_property is not None:
+        candidates &= data['property'] != exclude_property
+    if restrict_to is not None:
+        allowed = np.zeros(size, dtype=bool)
+        allowed[leads.rows_for(restrict_to)] = True
+        candidates &= allowed
+    rows = _top(score(prop, data), candidates, limit, min_score)
+    if not len(rows):
+        return []
+    scores, components = score(prop, {name: column[rows] for name, column in data.items()}, breakdown=True)
+    return _results(leads, rows, np.atleast_1d(scores), components, 'lead')
+
+
+PROPERTY_INDEX = PropertyIndex()
+LEAD_INDEX = LeadIndex()
+
+
+def matches_for_lead(lead, limit=10, min_score=0.0, restrict_to=None):
+    """Properties matching a Lead instance, best first; its own linked property is left out."""
+    PROPERTY_INDEX.refresh()
+    linked = None
+    if lead.property_id:
+        linked = Property.objects.filter(pk=lead.property_id).values(
+            'price', 'property_type', 'property_sub_type', 'latitude', 'longitude',
+        ).first()
+    with PROPERTY_INDEX.lock:
+        features = lead_preferences(lead.budget, lead.interest, lead.requirements, linked)
+        features = {name: column[0] for name, column in features.items()}
+        exclude = [lead.property_id] if lead.property_id else ()
+        return match_properties(PROPERTY_INDEX, features, limit, min_score, restrict_to, exclude)
+
+
+def leads_for_property(property, limit=10, min_score=0.0, restrict_to=None):
+    """Open leads matching a Property instance, best first; leads already linked to it are left out."""
+    PROPERTY_INDEX.refresh()
+    LEAD_INDEX.refresh()
+    with PROPERTY_INDEX.lock:
+        features = PROPERTY_INDEX.encode([{field: getattr(property, field) for field in PropertyIndex.fields}])
+    features = {name: column[0] for name, column in features.items()}
+    with LEAD_INDEX.lock:
+        return match_leads(LEAD_INDEX, features, limit, min_score, restrict_to, exclude_property=property.pk)
+
+
+def match_params(params):
+    """(limit, min_score) from query parameters; raises ValueError when invalid."""
+    try:
+        limit = int(params.get('limit', 10))
+        min_score = float(params.get('min_score', 0))
+    except (TypeError, ValueError):
+        raise ValueError("limit must be an integer and min_score a number.")
+    maximum = _setting('MATCHING_MAX_RESULTS', 100)
+    if not 1 <= limit <= maximum:
+        raise ValueError(f"limit must be between 1 and {maximum}.")
+    if not 0 <= min_score <= 1:
+        raise ValueError("min_score must be between 0 and 1.")
+    return limit, min_score
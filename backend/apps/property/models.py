@@ -1,6 +1,8 @@
 # apps/property/models.py
 from django.db import models
+from django.db.models.functions import Lower
 from django.contrib.auth import get_user_model
+from .geo import geohash_encode
 
 User = get_user_model()
 
@@ -19,6 +21,13 @@ class ListingType(models.TextChoices):
     FOR_SALE = 'for_sale', 'For Sale'
     FOR_RENT = 'for_rent', 'For Rent'
 
+# Denormalized activity counters, maintained by apps.property.counters
+COUNTER_FIELDS = ('lead_count', 'conversion_count', 'visits_scheduled_count', 'visits_completed_count')
+# Denormalized amenities/specifications, maintained by apps.property.attributes
+ATTRIBUTE_FIELDS = ('amenity_tags', 'spec_map')
+# Unit inventory counts, maintained by apps.property.units once a property has Unit rows
+UNIT_FIELDS = ('units_total', 'units_available')
+
 class Property(models.Model):
     # Basic Information
     title = models.CharField(max_length=255)
@@ -29,6 +38,11 @@ class Property(models.Model):
     
     # Location and Price
     location = models.CharField(max_length=255)
+    # Filled from the offline gazetteer (geocode_properties) or entered directly;
+    # geohash is derived on save and indexed for prefix (grid cell) scans
+    latitude = models.FloatField(null=True, blank=True)
+    longitude = models.FloatField(null=True, blank=True)
+    geohash = models.CharField(max_length=12, blank=True, default='', editable=False, db_index=True)
     price = models.DecimalField(max_digits=14, decimal_places=2)
     
     # Area Information
@@ -61,18 +75,64 @@ class Property(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     thumbnail_image = models.ImageField(upload_to='property_images/', null=True, blank=True)
+    # Set by the bulk archive endpoint (apps.property.removal); archived
+    # properties leave lists, searches, matching and statistics but keep their rows
+    archived_at = models.DateTimeField(null=True, blank=True, editable=False)
     
     # Progress (for under construction properties)
     progress = models.IntegerField(default=0, help_text="Construction progress in percentage")
     units_total = models.IntegerField(default=0)
     units_available = models.IntegerField(default=0)
+    # Set when Unit rows are created; from then on the counts above follow the
+    # units (see apps.property.units) and are no longer edited directly
+    units_managed = models.BooleanField(default=False, editable=False)
+
+    # Activity counters (see apps.property.counters); never edited directly
+    lead_count = models.IntegerField(default=0, editable=False)
+    conversion_count = models.IntegerField(default=0, editable=False)
+    visits_scheduled_count = models.IntegerField(default=0, editable=False)
+    visits_completed_count = models.IntegerField(default=0, editable=False)
+
+    # Copies of the amenity/specification rows for indexed filtering (see apps.property.attributes)
+    amenity_tags = models.JSONField(default=list, blank=True, editable=False)
+    spec_map = models.JSONField(default=dict, blank=True, editable=False)
     
     class Meta:
         verbose_name_plural = "Properties"
         ordering = ['-created_at']
+        # Serve the search filters (apps.property.search) and the default ordering;
+        # the full-text and attribute GIN indexes are created separately on PostgreSQL
+        indexes = [
+            models.Index(fields=['property_type', 'status', 'price'], name='property_type_status_price_idx'),
+            models.Index(fields=['listing_type', 'status', 'price'], name='property_listing_status_idx'),
+            models.Index(fields=['status', 'area'], name='property_status_area_idx'),
+            models.Index(fields=['-created_at'], name='property_created_idx'),
+        ]
     
     def __str__(self):
         return self.title
+
+    def save(self, *args, **kwargs):
+        # Counters and attributes are updated in place by their own modules;
+        # saving an existing property must not write back (possibly stale)
+        # in-memory values.
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            skipped = COUNTER_FIELDS + ATTRIBUTE_FIELDS + ('units_managed', 'archived_at')
+            if self.units_managed:
+                skipped += UNIT_FIELDS
+            kwargs['update_fields'] = [
+                f.name for f in self._meta.concrete_fields
+                if not f.primary_key and f.name not in skipped
+            ]
+        self.geohash = geohash_encode(self.latitude, self.longitude) if self.has_coordinates else ''
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and {'latitude', 'longitude'} & set(update_fields):
+            kwargs['update_fields'] = set(update_fields) | {'geohash'}
+        super().save(*args, **kwargs)
+
+    @property
+    def has_coordinates(self):
+        return self.latitude is not None and self.longitude is not None
     
     @property
     def units_available_display(self):
@@ -80,6 +140,42 @@ class Property(models.Model):
             return f"{self.units_available} of {self.units_total} units available"
         return "N/A"
 
+class UnitStatus(models.TextChoices):
+    AVAILABLE = 'available', 'Available'
+    HELD = 'held', 'Held'
+    BOOKED = 'booked', 'Booked'
+
+class Unit(models.Model):
+    """
+    One sellable unit of a project. Holds and bookings change these rows with
+    conditional updates only (see apps.property.units), never through save().
+    """
+    property = models.ForeignKey(Property, on_delete=models.CASCADE, related_name='units')
+    number = models.CharField(max_length=50)
+    status = models.CharField(max_length=20, choices=UnitStatus.choices, default=UnitStatus.AVAILABLE)
+    # The lead the unit is held for or was booked by
+    lead = models.ForeignKey('leads.Lead', on_delete=models.SET_NULL, null=True, blank=True, related_name='units')
+    # The agent holding the unit, or who booked it
+    held_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='unit_holds')
+    hold_expires_at = models.DateTimeField(null=True, blank=True)
+    booked_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['property', 'number']
+        constraints = [
+            models.UniqueConstraint(fields=['property', 'number'], name='unit_property_number_unique'),
+        ]
+        indexes = [
+            # Picking free units of a project, and sweeping expired holds
+            models.Index(fields=['property', 'status'], name='unit_property_status_idx'),
+            models.Index(fields=['status', 'hold_expires_at'], name='unit_hold_expiry_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.property_id} unit {self.number} ({self.status})"
+
 class PropertyImage(models.Model):
     property = models.ForeignKey(Property, related_name='images', on_delete=models.CASCADE)
     image = models.ImageField(upload_to='property_images/')
@@ -98,6 +194,10 @@ class PropertyAmenity(models.Model):
     
     class Meta:
         verbose_name_plural = "Property Amenities"
+        indexes = [
+            # Amenity filter and facet counts look properties up by lowercased name
+            models.Index(Lower('name'), 'property', name='property_amenity_name_idx'),
+        ]
     
     def __str__(self):
         return self.name
@@ -111,4 +211,33 @@ class PropertySpecification(models.Model):
         verbose_name_plural = "Property Specifications"
     
     def __str__(self):
-        return f"{self.key}: {self.value}"
\ No newline at end of file
+        return f"{self.key}: {self.value}"
+
+class SimilarProperty(models.Model):
+    """
+    One row of the precomputed nearest-neighbour table behind
+    /api/properties/{id}/similar/ (see apps.property.similarity).
+    """
+    property = models.ForeignKey(Property, on_delete=models.CASCADE, related_name='similar_entries')
+    # No database constraint: rows pointing at a deleted property are left for
+    # the next incremental update to replace (the serving join skips them), so
+    # deleting properties costs no extra lookups
+    similar = models.ForeignKey(
+        Property, on_delete=models.DO_NOTHING, db_constraint=False, related_name='similar_to',
+    )
+    rank = models.PositiveSmallIntegerField()
+    distance = models.FloatField()
+
+    class Meta:
+        verbose_name_plural = "Similar Properties"
+        ordering = ['property', 'rank']
+        constraints = [
+            models.UniqueConstraint(fields=['property', 'similar'], name='similar_property_unique'),
+        ]
+        indexes = [
+            # Serving a recommendation list is one range scan on this index
+            models.Index(fields=['property', 'rank'], name='similar_property_rank_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.property_id} -> {self.similar_id} (#{self.rank})"
@@ -0,0 +1,225 @@
+# apps/property/removal.py
+"""
+Bulk deletion and archiving of properties.
+
+``Model.delete()`` goes through Django's collector, which loads every
+related site visit, lead, image, amenity and specification into Python and
+fires their signals one row at a time, and leaves the image files on disk.
+``remove_properties`` instead works in batches of ids, each in its own
+short transaction, with one statement per related table: CASCADE relations
+are deleted with a single DELETE, SET_NULL ones unlinked with a single
+UPDATE, then the properties themselves are deleted. Nothing is locked beyond
+the rows being removed.
+
+What the skipped per-row signals would have done is done once per batch:
+the agents' open-visit counters drop by the open visits deleted, and the
+matching index, market snapshot, similar-properties table and lead index
+re-read the affected rows. Image and thumbnail files are removed by a
+background thread after commit, except those another row still uses (the
+seeded sample images are shared).
+
+``archive_properties`` hides properties instead (``archived_at``): they
+leave lists, searches, matching and statistics, and keep all their rows.
+"""
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import connection, models, transaction
+from django.db.models import Count
+from django.utils import timezone
+
+from apps.accounts.workload import OPEN_VISIT_STATUSES, apply_workload_deltas
+
+from .matching import LEAD_INDEX, PROPERTY_INDEX
+from .models import Property, PropertyImage
+from .similarity import queue_similar_update
+from .stats import MARKET_SNAPSHOT
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+# --- Background file cleanup -------------------------------------------------------
+
+def _remove_files(paths):
+    try:
+        # Shared files stay while any property or image still points at them
+        in_use = set(PropertyImage.objects.filter(image__in=paths).values_list('image', flat=True))
+        in_use |= set(Property.objects.filter(thumbnail_image__in=paths).values_list('thumbnail_image', flat=True))
+        removed = 0
+        for path in sorted(set(paths) - in_use):
+            try:
+                default_storage.delete(path)
+                removed += 1
+            except Exception as e:
+                print(f"Error removing property file {path}: {e}")
+        print(f"Removed {removed} of {len(paths)} property files")
+    except Exception as e:
+        print(f"Error in property file cleanup: {e}")
+    finally:
+        connection.close()
+
+
+def queue_file_removal(paths):
+    """Delete ``paths`` from storage in the background after the current transaction commits."""
+    paths = sorted({path for path in paths if path})
+    if not paths:
+        return
+
+    def start():
+        threading.Thread(target=_remove_files, args=(paths,), name='property-file-cleanup', daemon=True).start()
+
+    transaction.on_commit(start)
+
+
+# --- Deletion ----------------------------------------------------------------------
+
+def _relations():
+    """The foreign keys pointing at Property: (model, field name, on_delete)."""
+    for relation in Property._meta.related_objects:
+        if relation.many_to_many or not relation.field.concrete:
+            continue
+        yield relation.related_model, relation.field.name, relation.on_delete
+
+
+def _delete(queryset):
+    model = queryset.model
+    if model._meta.related_objects:
+        # Rows others point at need the collector to follow them
+        return queryset.delete()[0]
+    # The collector's fast path: one DELETE, no rows loaded and no signals
+    return queryset._raw_delete(queryset.db)
+
+
+def _side_effects(property_ids):
+    """Files, open visits per agent and linked leads of a batch, read before it is deleted."""
+    from apps.leads.models import Lead
+    from apps.site_visits.models import SiteVisit
+
+    files = list(PropertyImage.objects.filter(property_id__in=property_ids).values_list('image', flat=True))
+    files += list(Property.objects.filter(pk__in=property_ids).values_list('thumbnail_image', flat=True))
+    open_visits = SiteVisit.objects.filter(
+        property_id__in=property_ids, status__in=OPEN_VISIT_STATUSES, agent__isnull=False,
+    ).order_by().values('agent_id').annotate(n=Count('pk'))
+    leads = list(Lead.objects.filter(property_id__in=property_ids).values_list('pk', flat=True))
+    return files, {row['agent_id']: {'open_visits': -row['n']} for row in open_visits}, leads
+
+
+def _delete_batch(property_ids, report):
+    with transaction.atomic():
+        files, workload, lead_ids = _side_effects(property_ids)
+        for model, field, on_delete in _relations():
+            rows = model._base_manager.filter(**{f'{field}__in': property_ids})
+            name = model._meta.model_name
+            if on_delete is models.CASCADE:
+                report['deleted'][name] += _delete(rows)
+            elif on_delete is models.SET_NULL:
+                fields = {field: None}
+                if any(f.name == 'updated_at' for f in model._meta.concrete_fields):
+                    # So other processes' indexes notice the change (see apps.property.matching)
+                    fields['updated_at'] = timezone.now()
+                report['unlinked'][name] += rows.update(**fields)
+            elif on_delete is not models.DO_NOTHING:
+                raise ValueError(f"Can't bulk delete properties referenced by {name}.{field} ({on_delete.__name__}).")
+        deleted = Property.objects.filter(pk__in=property_ids)._raw_delete(Property.objects.db)
+        report['properties'] += deleted
+        apply_workload_deltas(workload)
+        queue_file_removal(files)
+        report['files_queued'] += len({path for path in files if path})
+
+        for pk in property_ids:
+            PROPERTY_INDEX.invalidate(pk)
+            MARKET_SNAPSHOT.invalidate(pk)
+            queue_similar_update(pk)
+        for pk in lead_ids:
+            LEAD_INDEX.invalidate(pk)
+
+
+def _dry_run_batch(property_ids, report):
+    files, _, _ = _side_effects(property_ids)
+    for model, field, on_delete in _relations():
+        count = model._base_manager.filter(**{f'{field}__in': property_ids}).count()
+        if on_delete is models.CASCADE:
+            report['deleted'][model._meta.model_name] += count
+        elif on_delete is models.SET_NULL:
+            report['unlinked'][model._meta.model_name] += count
+    report['properties'] += len(property_ids)
+    report['files_queued'] += len({path for path in files if path})
+
+
+def _batches(property_ids, batch_size):
+    batch_size = batch_size or _setting('PROPERTY_BULK_BATCH_SIZE', 500)
+    for start in range(0, len(property_ids), batch_size):
+        yield property_ids[start:start + batch_size]
+
+
+def remove_properties(property_ids, batch_size=None, dry_run=False):
+    """
+    Delete ``property_ids`` with everything that cascades from them, in
+    batches of ``batch_size`` (default PROPERTY_BULK_BATCH_SIZE). Returns a
+    report of what was deleted, unlinked and queued for file removal; with
+    ``dry_run``, of what would be.
+    """
+    started = time.perf_counter()
+    requested = sorted(set(property_ids))
+    existing = sorted(Property.objects.filter(pk__in=requested).values_list('pk', flat=True))
+    report = {
+        'action': 'delete',
+        'dry_run': dry_run,
+        'properties': 0,
+        'deleted': Counter(),
+        'unlinked': Counter(),
+        'files_queued': 0,
+        'not_found': sorted(set(requested) - set(existing)),
+        'batches': 0,
+    }
+    for batch in _batches(existing, batch_size):
+        (_dry_run_batch if dry_run else _delete_batch)(batch, report)
+        report['batches'] += 1
+    report['deleted'] = dict(report['deleted'])
+    report['unlinked'] = dict(report['unlinked'])
+    report['seconds'] = round(time.perf_counter() - started, 3)
+    return report
+
+
+# --- Archiving ---------------------------------------------------------------------
+
+def archive_properties(property_ids, archive=True, batch_size=None, dry_run=False):
+    """
+    Set (or with ``archive=False`` clear) ``archived_at`` on ``property_ids``,
+    one UPDATE per batch. Returns a report like ``remove_properties``.
+    """
+    started = time.perf_counter()
+    requested = sorted(set(property_ids))
+    existing = Property.objects.filter(pk__in=requested)
+    changing = sorted(existing.filter(archived_at__isnull=archive).values_list('pk', flat=True))
+    report = {
+        'action': 'archive' if archive else 'unarchive',
+        'dry_run': dry_run,
+        'properties': 0,
+        'unchanged': sorted(set(existing.values_list('pk', flat=True)) - set(changing)),
+        'not_found': sorted(set(requested) - set(existing.values_list('pk', flat=True))),
+        'batches': 0,
+    }
+    for batch in _batches(changing, batch_size):
+        report['batches'] += 1
+        if dry_run:
+            report['properties'] += len(batch)
+            continue
+        now = timezone.now()
+        with transaction.atomic():
+            # updated_at too, so other processes' indexes pick the change up
+            report['properties'] += Property.objects.filter(pk__in=batch, archived_at__isnull=archive).update(
+                archived_at=now if archive else None, updated_at=now,
+            )
+            for pk in batch:
+                PROPERTY_INDEX.invalidate(pk)
+                MARKET_SNAPSHOT.invalidate(pk)
+                queue_similar_update(pk)
+    report['seconds'] = round(time.perf_counter() - started, 3)
+    return report
+
@@ -0,0 +1,236 @@
+# apps/property/search.py
+"""
+Server-side property search and facet counts.
+
+``PropertyFilter`` handles price/area ranges, the choice fields (comma
+separated for several values), amenities (all must be present) and text
+search. On PostgreSQL text search is full-text over title (weight A),
+location (B) and description (C), ranked, and backed by a GIN expression
+index built from the very same expression after ``migrate`` (see
+``ensure_search_indexes``); other databases fall back to ``icontains``.
+Amenity and specification filters go through the denormalized attributes
+(``apps.property.attributes``); ``near``/``radius_km`` and ``bbox`` through
+the geohash grid (``apps.property.geo``).
+
+``facet_counts`` gives, for each facet, the number of matching properties
+per value *ignoring that facet's own selection* (so picking "house" still
+shows how many "land" listings there are). The choice facets come from one
+GROUP BY over all four fields, combined in Python; amenities take a second
+grouped query.
+"""
+from collections import Counter
+
+import django_filters
+from django.conf import settings
+from django.db import connection, connections
+from django.db.models import Case, Count, FloatField, Max, Min, Q, Value, When
+from rest_framework.exceptions import ValidationError
+from django.db.models.functions import Lower
+
+from .attributes import filter_by_attributes, parse_specs
+from .geo import in_box, nearest, parse_point
+from .models import ListingType, Property, PropertyAmenity, PropertyStatus, PropertyType
+
+SEARCH_CONFIG = 'english'
+SEARCH_INDEX_NAME = 'property_search_idx'
+
+# Facet field -> labels for its values (None: free-text values, listed as found)
+FACETS = {
+    'property_type': dict(PropertyType.choices),
+    'listing_type': dict(ListingType.choices),
+    'status': dict(PropertyStatus.choices),
+    'furnishing_status': None,
+}
+
+
+def split_values(value):
+    return [item.strip() for item in str(value or '').split(',') if item.strip()]
+
+
+def search_vector():
+    from django.contrib.postgres.search import SearchVector
+    return (
+        SearchVector('title', weight='A', config=SEARCH_CONFIG)
+        + SearchVector('location', weight='B', config=SEARCH_CONFIG)
+        + SearchVector('description', weight='C', config=SEARCH_CONFIG)
+    )
+
+
+def text_search(queryset, text):
+    text = (text or '').strip()
+    if not text:
+        return queryset
+    if connection.vendor == 'postgresql':
+        from django.contrib.postgres.search import SearchQuery, SearchRank
+        query = SearchQuery(text, search_type='websearch', config=SEARCH_CONFIG)
+        vector = search_vector()
+        # Matching on the indexed expression lets PostgreSQL use the GIN index
+        return queryset.alias(search_document=vector).filter(search_document=query).annotate(
+            search_rank=SearchRank(vector, query),
+        ).order_by('-search_rank', '-created_at')
+    for term in text.split():
+        queryset = queryset.filter(
+            Q(title__icontains=term) | Q(location__icontains=term) | Q(description__icontains=term)
+        )
+    return queryset
+
+
+class CharInFilter(django_filters.BaseInFilter, django_filters.CharFilter):
+    pass
+
+
+class PropertyFilter(django_filters.FilterSet):
+    min_price = django_filters.NumberFilter(field_name='price', lookup_expr='gte')
+    max_price = django_filters.NumberFilter(field_name='price', lookup_expr='lte')
+    min_area = django_filters.NumberFilter(field_name='area', lookup_expr='gte')
+    max_area = django_filters.NumberFilter(field_name='area', lookup_expr='lte')
+    property_type = CharInFilter(field_name='property_type')
+    listing_type = CharInFilter(field_name='listing_type')
+    status = CharInFilter(field_name='status')
+    furnishing_status = CharInFilter(field_name='furnishing_status')
+    amenities = django_filters.CharFilter(method='filter_amenities')
+    spec = django_filters.CharFilter(method='filter_spec')
+    search = django_filters.CharFilter(method='filter_search')
+    near = django_filters.CharFilter(method='filter_near')
+    radius_km = django_filters.NumberFilter(method='filter_radius')
+    bbox = django_filters.CharFilter(method='filter_bbox')
+
+    class Meta:
+        model = Property
+        fields = []
+
+    def filter_amenities(self, queryset, name, value):
+        return filter_by_attributes(queryset, amenities=split_values(value))
+
+    def filter_spec(self, queryset, name, value):
+        # "bedrooms:3,parking_spots:1": every pair must match
+        return filter_by_attributes(queryset, specs=parse_specs(value))
+
+    def filter_search(self, queryset, name, value):
+        return text_search(queryset, value)
+
+    def filter_near(self, queryset, name, value):
+        """
+        "lat,lng": properties within ``radius_km`` (GEO_DEFAULT_RADIUS_KM),
+        nearest first, at most GEO_MAX_RESULTS, annotated with ``distance_km``.
+        """
+        try:
+            latitude, longitude = parse_point(value)
+        except ValueError as e:
+            raise ValidationError({'near': [str(e)]})
+        radius = self.form.cleaned_data.get('radius_km')
+        radius = float(radius) if radius is not None else getattr(settings, 'GEO_DEFAULT_RADIUS_KM', 5)
+        if not 0 < radius <= getattr(settings, 'GEO_MAX_RADIUS_KM', 100):
+            raise ValidationError({'radius_km': [f"Must be between 0 and {getattr(settings, 'GEO_MAX_RADIUS_KM', 100)}."]})
+        matches = nearest(queryset, latitude, longitude, radius, limit=getattr(settings, 'GEO_MAX_RESULTS', 500))
+        if not matches:
+            return queryset.none()
+        return queryset.filter(pk__in=[pk for pk, _ in matches]).annotate(distance_km=Case(
+            *[When(pk=pk, then=Value(distance)) for pk, distance in matches], output_field=FloatField(),
+        )).order_by('distance_km', 'pk')
+
+    def filter_radius(self, queryset, name, value):
+        # Read by filter_near
+        return queryset
+
+    def filter_bbox(self, queryset, name, value):
+        # "min_lat,min_lng,max_lat,max_lng"
+        try:
+            min_lat, min_lng = parse_point(','.join(value.split(',')[:2]))
+            max_lat, max_lng = parse_point(','.join(value.split(',')[2:]))
+        except ValueError:
+            raise ValidationError({'bbox': ["Expected 'min_lat,min_lng,max_lat,max_lng'."]})
+        if min_lat > max_lat or min_lng > max_lng:
+            raise ValidationError({'bbox': ["Minimums must not exceed maximums."]})
+        return in_box(queryset, (min_lat, min_lng, max_lat, max_lng))
+
+
+def facet_counts(queryset, params):
+    """
+    Facet counts for the properties in ``queryset`` filtered by ``params``
+    (query parameters as for PropertyFilter). Returns the total, the counts
+    per facet value and the price/area range of the matching properties.
+    """
+    matching = PropertyFilter(params, queryset=queryset)
+    if not matching.is_valid():
+        raise django_filters.utils.translate_validation(matching.errors)
+    base_params = params.copy()
+    for facet in FACETS:
+        base_params.pop(facet, None)
+    base = PropertyFilter(base_params, queryset=queryset).qs.order_by()
+    selected = {facet: set(split_values(params.get(facet))) for facet in FACETS}
+
+    rows = base.values(*FACETS).annotate(
+        n=Count('pk'), min_price=Min('price'), max_price=Max('price'), min_area=Min('area'), max_area=Max('area'),
+    )
+    counts = {facet: Counter() for facet in FACETS}
+    total = 0
+    price, area = [None, None], [None, None]
+    for row in rows:
+        matches = {facet: not selected[facet] or row[facet] in selected[facet] for facet in FACETS}
+        for facet in FACETS:
+            # A facet's counts honour every selection except its own
+            if all(ok for other, ok in matches.items() if other != facet):
+                counts[facet][row[facet]] += row['n']
+        if all(matches.values()):
+            total += row['n']
+            price = [_lowest(price[0], row['min_price']), _highest(price[1], row['max_price'])]
+            area = [_lowest(area[0], row['min_area']), _highest(area[1], row['max_area'])]
+
+    amenities = (
+        PropertyAmenity.objects.filter(property__in=matching.qs.order_by().values('pk'))
+        .annotate(value=Lower('name')).values('value').annotate(count=Count('property', distinct=True))
+        .order_by('-count', 'value')
+    )
+
+    facets = {}
+    for facet, labels in FACETS.items():
+        values = labels or {value: value for value in counts[facet] if value}
+        facets[facet] = [
+            {'value': value, 'label': label, 'count': counts[facet].get(value, 0)}
+            for value, label in values.items()
+        ]
+    facets['amenities'] = list(amenities)
+    return {
+        'count': total,
+        'facets': facets,
+        'price': {'min': price[0], 'max': price[1]},
+        'area': {'min': area[0], 'max': area[1]},
+    }
+
+
+def _lowest(current, value):
+    return value if current is None or (value is not None and value < current) else current
+
+
+def _highest(current, value):
+    return value if current is None or (value is not None and value > current) else current
+
+
+def search_indexes():
+    from django.contrib.postgres.indexes import GinIndex
+    return [
+        GinIndex(search_vector(), name=SEARCH_INDEX_NAME),
+        # jsonb_path_ops: smaller than the default opclass and enough for @>
+        GinIndex(fields=['amenity_tags'], name='property_amenity_tags_gin', opclasses=['jsonb_path_ops']),
+        GinIndex(fields=['spec_map'], name='property_spec_map_gin', opclasses=['jsonb_path_ops']),
+    ]
+
+
+def ensure_search_indexes(using='default', **kwargs):
+    """
+    Create the GIN indexes on PostgreSQL. The full-text one is built from
+    ``search_vector()`` so it matches the expression queries use; they can't
+    live in Meta.indexes because other databases can't create them.
+    """
+    conn = connections[using]
+    if conn.vendor != 'postgresql':
+        return
+    indexes = search_indexes()
+    with conn.cursor() as cursor:
+        cursor.execute("SELECT indexname FROM pg_indexes WHERE indexname = ANY(%s)", [[index.name for index in indexes]])
+        existing = {row[0] for row in cursor.fetchall()}
+    with conn.schema_editor() as schema_editor:
+        for index in indexes:
+            if index.name not in existing:
+                schema_editor.execute(index.create_sql(Property, schema_editor))
@@ -1,6 +1,6 @@
 # apps/property/serializers.py
 from rest_framework import serializers
-from .models import Property, PropertyImage
+from .models import Property, PropertyImage, Unit
 import logging
 
 logger = logging.getLogger(__name__)
@@ -11,14 +11,48 @@ class PropertyImageSerializer(serializers.ModelSerializer):
         fields = ['id', 'image', 'is_primary', 'created_at']
         read_only_fields = ['id', 'created_at']
 
+class UnitSerializer(serializers.ModelSerializer):
+    # Changed only through the hold/book/release endpoints (apps.property.units)
+    class Meta:
+        model = Unit
+        fields = ['id', 'number', 'status', 'lead', 'held_by', 'hold_expires_at', 'booked_at', 'updated_at']
+        read_only_fields = fields
+
 class PropertySerializer(serializers.ModelSerializer):
     images = PropertyImageSerializer(many=True, read_only=True)
+    # Set by the ?near= filter, null otherwise
+    distance_km = serializers.SerializerMethodField()
     
     class Meta:
         model = Property
         fields = '__all__'
         read_only_fields = ['id', 'created_by', 'created_at', 'updated_at']
 
+    def get_distance_km(self, obj):
+        return getattr(obj, 'distance_km', None)
+
+    def validate_latitude(self, value):
+        if value is not None and not -90 <= value <= 90:
+            raise serializers.ValidationError("Latitude must be between -90 and 90.")
+        return value
+
+    def validate_longitude(self, value):
+        if value is not None and not -180 <= value <= 180:
+            raise serializers.ValidationError("Longitude must be between -180 and 180.")
+        return value
+
+    def validate(self, attrs):
+        latitude = attrs.get('latitude', getattr(self.instance, 'latitude', None))
+        longitude = attrs.get('longitude', getattr(self.instance, 'longitude', None))
+        if (latitude is None) != (longitude is None):
+            raise serializers.ValidationError("Latitude and longitude must be given together.")
+        # Unit counts of a unit-managed property follow its units; the values a
+        # client sends back are whatever it last read, so they are ignored
+        if self.instance is not None and self.instance.units_managed:
+            attrs.pop('units_total', None)
+            attrs.pop('units_available', None)
+        return attrs
+
     def create(self, validated_data):
         try:
             request = self.context.get('request')
@@ -0,0 +1,41 @@
+# apps/property/signals.py
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from .models import Property, PropertyAmenity, PropertySpecification
+from .attributes import sync_property_attributes
+from .matching import PROPERTY_INDEX
+from .similarity import queue_similar_update
+from .stats import MARKET_SNAPSHOT
+
+
+@receiver(post_save, sender=PropertyAmenity)
+@receiver(post_delete, sender=PropertyAmenity)
+@receiver(post_save, sender=PropertySpecification)
+@receiver(post_delete, sender=PropertySpecification)
+def update_property_attributes(sender, instance, **kwargs):
+    """
+    Keep the property's denormalized amenity_tags/spec_map in step with its
+    amenity and specification rows.
+    """
+    sync_property_attributes([instance.property_id])
+    PROPERTY_INDEX.invalidate(instance.property_id)
+    queue_similar_update(instance.property_id)
+
+
+@receiver(post_save, sender=Property)
+@receiver(post_delete, sender=Property)
+def update_matching_index(sender, instance, **kwargs):
+    """
+    Have the in-memory matching index (apps.property.matching) re-read this
+    property on its next query, and patch the similar-properties table
+    around it after commit.
+    """
+    PROPERTY_INDEX.invalidate(instance.pk)
+    queue_similar_update(instance.pk)
+
+
+@receiver(post_save, sender=Property)
+@receiver(post_delete, sender=Property)
+def update_market_snapshot(sender, instance, **kwargs):
+    """Have the market statistics snapshot (apps.property.stats) re-read this property."""
+    MARKET_SNAPSHOT.invalidate(instance.pk)
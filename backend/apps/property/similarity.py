@@ -0,0 +1,328 @@
+# apps/property/similarity.py
+"""
+Similar-property recommendations.
+
+Every property keeps its SIMILAR_PROPERTIES_K nearest neighbours in the
+``SimilarProperty`` table, so /api/properties/{id}/similar/ is one indexed
+range scan. Neighbours share the property's type and listing type and are
+ranked by Euclidean distance over a few scaled features: price per sqft and
+area (log scale), sub-type, location (points on a sphere, so the distance
+between two grows with the km between them) and the amenity set.
+
+Features come from the in-memory matching index (apps.property.matching).
+Only properties in the same geohash-grid cell (SIMILAR_PROPERTIES_CELL_PRECISION)
+or the eight around it are compared, blockwise with one matrix product per
+block; a cell with too few candidates falls back to the whole group.
+
+``rebuild_similar_properties`` recomputes the table. Saves and deletes queue
+an incremental update that runs after commit on a background thread (with
+SIMILAR_PROPERTIES_BACKGROUND, the default), so writes don't wait for it:
+the changed properties get new lists, and so do the nearby properties whose
+list held them or should now.
+"""
+import threading
+from collections import defaultdict
+
+import numpy as np
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Count, Max
+
+from .geo import EARTH_RADIUS_KM, cell_size
+from .matching import PROPERTY_INDEX, safe_log
+from .models import SimilarProperty
+
+# One unit of distance is roughly a 28% difference in price per sqft, a 50%
+# difference in area, 5 km, a different sub-type or no amenities in common
+PRICE_PER_SQFT_SCALE = 0.25
+AREA_SCALE = 0.4
+LOCATION_SCALE_KM = 5
+SUB_TYPE_WEIGHT = 1.0
+AMENITY_WEIGHT = 1.0
+
+BLOCK_SIZE = 1024  # query rows per distance block
+RECHECK = 256  # nearby properties checked for a changed property entering their list
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def _impute(values):
+    """Missing values take the median, so they don't push rows apart."""
+    if np.all(np.isnan(values)):
+        return np.zeros_like(values)
+    return np.where(np.isnan(values), np.nanmedian(values), values)
+
+
+def feature_matrix(data):
+    """One float64 feature row per index slot of PropertyIndex columns ``data``."""
+    log_area = safe_log(data['area'])
+    parts = [
+        (_impute(data['log_price'] - log_area) / PRICE_PER_SQFT_SCALE)[:, None],
+        (_impute(log_area) / AREA_SCALE)[:, None],
+    ]
+
+    # On a sphere of radius R / scale the chord between two points is their
+    # distance in scale units; no coordinates -> the centre, equally far from all
+    latitude, longitude = np.radians(data['latitude']), np.radians(data['longitude'])
+    points = np.stack([
+        np.cos(latitude) * np.cos(longitude), np.cos(latitude) * np.sin(longitude), np.sin(latitude),
+    ], axis=1)
+    parts.append(np.nan_to_num(points) * (EARTH_RADIUS_KM / LOCATION_SCALE_KM))
+
+    # One-hot sub-type and unit-length amenity set, scaled so a mismatch /
+    # disjoint sets are SUB_TYPE_WEIGHT / AMENITY_WEIGHT apart
+    sub_type = data['sub_type'].astype(np.int64)
+    codes = np.unique(sub_type[sub_type >= 0])
+    parts.append((sub_type[:, None] == codes[None, :]) * (SUB_TYPE_WEIGHT / np.sqrt(2)))
+    bits = np.unpackbits(data['amenities'].view(np.uint8), axis=1, bitorder='little')
+    bits = bits[:, bits.any(axis=0)].astype(np.float64)
+    norms = np.sqrt(bits.sum(axis=1, keepdims=True))
+    parts.append(bits / np.maximum(norms, 1) * (AMENITY_WEIGHT / np.sqrt(2)))
+    return np.hstack(parts)
+
+
+class _Cells:
+    """Rows grouped by (group, cell row, cell col), sorted once for range lookups."""
+
+    def __init__(self, keys, rows):
+        order = np.argsort(keys, kind='stable')
+        self.keys = keys[order]
+        self.rows = rows[order]
+
+    def get(self, key):
+        start, end = np.searchsorted(self.keys, [key, key + 1])
+        return self.rows[start:end]
+
+
+# Cell coordinates are packed into one int64 key; +1 keeps -1 (unlocated) non-negative
+CELL_BITS = 21
+
+
+def _pack(group, cell_row, cell_col):
+    return (((group << CELL_BITS) + cell_row + 1) << CELL_BITS) + cell_col + 1
+
+
+class _Space:
+    """Features, groups and grid cells of every row in the property index."""
+
+    def __init__(self, index):
+        size = index.size
+        # Copies: the index is patched in place once the lock is released
+        data = {name: column[:size].copy() for name, column in index.data.items()}
+        self.ids = index.ids[:size].copy()
+        self.alive = index.alive[:size].copy()
+        self.candidate = self.alive & data['available']
+        self.features = feature_matrix(data)
+        self.group = (data['type'].astype(np.int64) + 1) * 8 + data['listing'] + 1
+        height, width = cell_size(_setting('SIMILAR_PROPERTIES_CELL_PRECISION', 4))
+        located = ~np.isnan(data['latitude']) & ~np.isnan(data['longitude'])
+        self.cell_row = np.where(located, np.floor((np.nan_to_num(data['latitude']) + 90) / height), -1).astype(np.int64)
+        self.cell_col = np.where(located, np.floor((np.nan_to_num(data['longitude']) + 180) / width), -1).astype(np.int64)
+        self.located = located
+        self.rows = dict(index.pos)
+
+        # Candidates (available) by cell and by group; every live row by cell,
+        # since sold-out properties keep a list too
+        keys = _pack(self.group, self.cell_row, self.cell_col)
+        rows = np.arange(size)
+        self.by_cell = _Cells(keys[self.candidate & located], rows[self.candidate & located])
+        self.live_by_cell = _Cells(keys[self.alive & located], rows[self.alive & located])
+        self._by_group = {}
+
+    def key(self, row):
+        return self.group[row], self.cell_row[row], self.cell_col[row]
+
+    def around(self, key, cells):
+        """Rows of ``cells`` in the cell ``key`` and the eight around it."""
+        group, cell_row, cell_col = key
+        return np.concatenate([
+            cells.get(_pack(group, cell_row + dr, cell_col + dc)) for dr in (-1, 0, 1) for dc in (-1, 0, 1)
+        ])
+
+    def candidates(self, key, k):
+        if key[1] >= 0:
+            rows = self.around(key, self.by_cell)
+            if len(rows) > k:
+                return rows
+        group = key[0]
+        if group not in self._by_group:
+            self._by_group[group] = np.flatnonzero(self.candidate & (self.group == group))
+        return self._by_group[group]
+
+
+_space_cache = (None, None)
+
+
+def _space(index):
+    """The _Space of ``index`` as of its current version; call with the index lock held."""
+    global _space_cache
+    version, space = _space_cache
+    if version != (id(index), index.version):
+        space = _Space(index)
+        _space_cache = ((id(index), index.version), space)
+    return space
+
+
+def _distances(features, queries, candidates):
+    """Squared distances, queries x candidates, as one matrix product."""
+    # Centred first: the location features are large and the expansion below
+    # would otherwise lose the small differences between nearby points
+    centre = features[candidates].mean(axis=0)
+    query = features[queries] - centre
+    candidate = features[candidates] - centre
+    squared = (query ** 2).sum(axis=1)[:, None] + (candidate ** 2).sum(axis=1)[None, :] - 2 * query @ candidate.T
+    return np.maximum(squared, 0.0)
+
+
+def nearest(space, rows, k):
+    """{row: [(neighbour row, distance), ...]} for ``rows``, nearest first."""
+    buckets = defaultdict(list)
+    for row in rows:
+        buckets[space.key(row)].append(row)
+    result = {}
+    for key, queries in buckets.items():
+        candidates = space.candidates(key, k)
+        for start in range(0, len(queries), BLOCK_SIZE):
+            block = np.array(queries[start:start + BLOCK_SIZE], dtype=np.int64)
+            if not len(candidates):
+                result.update({int(row): [] for row in block})
+                continue
+            squared = _distances(space.features, block, candidates)
+            squared[block[:, None] == candidates[None, :]] = np.inf
+            keep = min(k, len(candidates))
+            top = np.argpartition(squared, keep - 1, axis=1)[:, :keep]
+            top_squared = np.take_along_axis(squared, top, axis=1)
+            order = np.argsort(top_squared, axis=1, kind='stable')
+            # Whole blocks to Python lists at once; per-element NumPy scalars are slow
+            others = candidates[np.take_along_axis(top, order, axis=1)].tolist()
+            distances = np.sqrt(np.take_along_axis(top_squared, order, axis=1)).tolist()
+            for row, row_others, row_distances in zip(block.tolist(), others, distances):
+                result[row] = [(other, d) for other, d in zip(row_others, row_distances) if d != np.inf]
+    return result
+
+
+def _save(space, neighbours, batch_size=5000):
+    entries = [
+        SimilarProperty(property_id=int(space.ids[row]), similar_id=int(space.ids[other]), rank=rank, distance=distance)
+        for row, found in neighbours.items() for rank, (other, distance) in enumerate(found)
+    ]
+    SimilarProperty.objects.bulk_create(entries, batch_size=batch_size, ignore_conflicts=True)
+    return len(entries)
+
+
+def rebuild_similar_properties(k=None, batch_size=5000):
+    """Recompute the whole table. Returns (properties, rows written)."""
+    k = k or _setting('SIMILAR_PROPERTIES_K', 12)
+    with PROPERTY_INDEX.lock:
+        # Re-read everything: bulk imports bypass the signals that keep the index fresh
+        PROPERTY_INDEX.rebuild()
+        space = _space(PROPERTY_INDEX)
+        neighbours = nearest(space, list(space.rows.values()), k)
+    with transaction.atomic():
+        SimilarProperty.objects.all().delete()
+        written = _save(space, neighbours, batch_size)
+    return len(neighbours), written
+
+
+def update_similar_properties(property_ids, k=None):
+    """
+    Patch the table after ``property_ids`` changed (or were deleted). Returns
+    the number of properties whose list was rewritten.
+    """
+    k = k or _setting('SIMILAR_PROPERTIES_K', 12)
+    changed = set(property_ids)
+    # Lists holding a changed property: it may have moved away, sold out or gone
+    stale = set(SimilarProperty.objects.filter(similar_id__in=changed).values_list('property_id', flat=True))
+    PROPERTY_INDEX.refresh()
+    with PROPERTY_INDEX.lock:
+        space = _space(PROPERTY_INDEX)
+        recompute = {space.rows[pk] for pk in changed | stale if pk in space.rows}
+
+        # Nearby lists a changed property may now belong to: where it is
+        # closer than the current last entry, or the list is short
+        nearby = {}
+        for pk in changed:
+            row = space.rows.get(pk)
+            if row is None or not space.candidate[row]:
+                continue
+            if not space.located[row]:
+                continue
+            others = space.around(space.key(row), space.live_by_cell)
+            others = others[others != row]
+            if not len(others):
+                continue
+            distances = np.sqrt(_distances(space.features, np.array([row]), others)[0])
+            closest = np.argsort(distances, kind='stable')[:RECHECK]
+            for other, distance in zip(others[closest], distances[closest]):
+                nearby[int(other)] = min(distance, nearby.get(int(other), np.inf))
+        if nearby:
+            ids = {int(space.ids[row]): row for row in nearby}
+            lists = SimilarProperty.objects.filter(property_id__in=list(ids)).values('property_id').annotate(
+                n=Count('pk'), worst=Max('distance'),
+            )
+            current = {entry['property_id']: entry for entry in lists}
+            for pk, row in ids.items():
+                entry = current.get(pk)
+                if entry is None or entry['n'] < k or nearby[row] < entry['worst']:
+                    recompute.add(row)
+
+        neighbours = nearest(space, sorted(recompute), k)
+    with transaction.atomic():
+        SimilarProperty.objects.filter(property_id__in=changed | {int(space.ids[row]) for row in recompute}).delete()
+        _save(space, neighbours)
+    return len(neighbours)
+
+
+# --- Queuing updates from signals ---------------------------------------------------
+
+_pending = set()
+_pending_lock = threading.Lock()
+# One flush at a time; at most one more thread waits to pick up what arrives meanwhile
+_flush_lock = threading.Lock()
+_flush_queued = False
+
+
+def queue_similar_update(property_id):
+    """Update the neighbours of and around this property once the current transaction commits."""
+    with _pending_lock:
+        _pending.add(property_id)
+    if _setting('SIMILAR_PROPERTIES_BACKGROUND', True):
+        transaction.on_commit(_start_flush)
+    else:
+        transaction.on_commit(flush_similar_updates)
+
+
+def _start_flush():
+    global _flush_queued
+    with _pending_lock:
+        if _flush_queued:
+            return
+        _flush_queued = True
+    # Not a daemon: a management command exiting right after its saves still gets its patch
+    threading.Thread(target=_flush_in_background, name='similar-properties', daemon=False).start()
+
+
+def _flush_in_background():
+    global _flush_queued
+    try:
+        with _flush_lock:
+            with _pending_lock:
+                _flush_queued = False
+            flush_similar_updates()
+    finally:
+        connection.close()
+
+
+def flush_similar_updates():
+    # Several saves in one transaction queue one update; later callbacks find nothing left
+    with _pending_lock:
+        property_ids = set(_pending)
+        _pending.clear()
+    if not property_ids:
+        return
+    try:
+        update_similar_properties(property_ids)
+    except Exception as e:
+        print(f"Error in update_similar_properties: {str(e)}")
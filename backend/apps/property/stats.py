@@ -0,0 +1,352 @@
+# apps/property/stats.py
+"""
+Market statistics for property pricing.
+
+``MarketSnapshot`` keeps the columns the statistics need (price, area, type,
+listing type, status, location and city codes, creation month) in memory,
+refreshed the same way as the matching indexes: signals mark saved or
+deleted properties stale, and a periodic aggregate query picks up other
+processes' changes (see apps.property.matching.FeatureIndex).
+
+``market_stats`` then answers /api/properties/stats/ with NumPy alone:
+rows are sorted once by (group, value) so every group's percentiles are
+read off by position, histograms are one ``bincount`` over (group, bin)
+and monthly trends reuse the percentile pass over (group, month). Results
+are cached per snapshot version.
+"""
+import threading
+from collections import OrderedDict
+
+import numpy as np
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+
+from .geo import normalize_place
+from .matching import LISTING_CODES, TYPE_CODES, FeatureIndex
+from .models import Property, PropertyStatus
+
+STATUS_CODES = {value: code for code, value in enumerate(PropertyStatus.values)}
+METRICS = ('price', 'area', 'price_per_sqft')
+# group_by option -> snapshot column
+GROUP_FIELDS = {
+    'city': 'city', 'location': 'location', 'property_type': 'type', 'listing_type': 'listing', 'status': 'status',
+}
+DEFAULT_PERCENTILES = (10, 25, 50, 75, 90)
+CACHE_SIZE = 32
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def month_number(moment):
+    """Months since January 1970 of an aware datetime, in the current time zone."""
+    moment = timezone.localtime(moment)
+    return (moment.year - 1970) * 12 + moment.month - 1
+
+
+def month_label(number):
+    return f"{1970 + number // 12:04d}-{number % 12 + 1:02d}"
+
+
+def city_of(location):
+    """The city part of a free-text location: its last comma-separated part."""
+    parts = [part.strip() for part in str(location or '').split(',') if part.strip()]
+    return parts[-1] if parts else ''
+
+
+class Labels:
+    """Free-text values numbered by their normalized form; the first spelling seen is displayed."""
+
+    def __init__(self):
+        self.codes = {}
+        self.names = []
+
+    def code(self, text):
+        key = normalize_place(text)
+        if not key:
+            return -1
+        code = self.codes.get(key)
+        if code is None:
+            code = self.codes[key] = len(self.names)
+            self.names.append(str(text).strip())
+        return code
+
+    def lookup(self, text):
+        return self.codes.get(normalize_place(text), -1)
+
+
+class MarketSnapshot(FeatureIndex):
+    columns = {
+        'price': (np.float64, np.nan, 0),
+        'area': (np.float64, np.nan, 0),
+        'type': (np.int8, -1, 0),
+        'listing': (np.int8, -1, 0),
+        'status': (np.int8, -1, 0),
+        'location': (np.int32, -1, 0),
+        'city': (np.int32, -1, 0),
+        'month': (np.int32, -1, 0),
+    }
+    fields = ('pk', 'price', 'area', 'property_type', 'listing_type', 'status', 'location', 'created_at')
+
+    def __init__(self):
+        super().__init__()
+        self.locations = Labels()
+        self.cities = Labels()
+
+    def all_rows(self):
+        return Property.objects.all()
+
+    def eligible(self):
+        return Q(archived_at__isnull=True)
+
+    def encode(self, rows):
+        return {
+            'price': np.array([float(row['price'] or 'nan') for row in rows]),
+            'area': np.array([float(row['area'] or 'nan') for row in rows]),
+            'type': np.array([TYPE_CODES.get(row['property_type'], -1) for row in rows], dtype=np.int8),
+            'listing': np.array([LISTING_CODES.get(row['listing_type'], -1) for row in rows], dtype=np.int8),
+            'status': np.array([STATUS_CODES.get(row['status'], -1) for row in rows], dtype=np.int8),
+            'location': np.array([self.locations.code(row['location']) for row in rows], dtype=np.int32),
+            'city': np.array([self.cities.code(city_of(row['location'])) for row in rows], dtype=np.int32),
+            'month': np.array([month_number(row['created_at']) if row['created_at'] else -1 for row in rows], dtype=np.int32),
+        }
+
+    def label(self, field, code):
+        if code < 0:
+            return None
+        if field == 'city':
+            return self.cities.names[code]
+        if field == 'location':
+            return self.locations.names[code]
+        values = {'property_type': TYPE_CODES, 'listing_type': LISTING_CODES, 'status': STATUS_CODES}[field]
+        return next(value for value, value_code in values.items() if value_code == code)
+
+
+def grouped_percentiles(groups, values, group_count, percentiles=()):
+    """
+    Per group (``groups`` holds 0..group_count-1): count, mean, min, max,
+    median and the given percentiles of ``values``, NaN values left out.
+    One sort by (group, value) serves every group.
+    """
+    present = ~np.isnan(values)
+    groups, values = groups[present], values[present]
+    counts = np.bincount(groups, minlength=group_count)
+    sums = np.bincount(groups, weights=values, minlength=group_count)
+    # Sort by value, then stably by group: on a narrow integer type the second
+    # sort is a radix sort, much faster than np.lexsort
+    order = np.argsort(values)
+    narrow = groups.astype(np.int16 if group_count <= np.iinfo(np.int16).max else np.int64)
+    values = values[order[np.argsort(narrow[order], kind='stable')]]
+    starts = np.cumsum(counts) - counts
+    filled = counts > 0
+    last = np.maximum(starts + counts - 1, 0)
+
+    result = {'count': counts}
+    if not len(values):
+        empty = np.full(group_count, np.nan)
+        result.update({'mean': empty, 'min': empty, 'max': empty, 'median': empty})
+        result.update({f'p{p:g}': empty for p in percentiles})
+        return result
+    with np.errstate(invalid='ignore', divide='ignore'):
+        result['mean'] = np.where(filled, sums / counts, np.nan)
+    result['min'] = np.where(filled, values[np.minimum(starts, len(values) - 1)], np.nan)
+    result['max'] = np.where(filled, values[last], np.nan)
+    for name, p in [('median', 50)] + [(f'p{p:g}', p) for p in percentiles]:
+        # Linear interpolation between the two nearest ranks, as np.percentile does
+        position = starts + (counts - 1).clip(0) * (p / 100)
+        lower = np.minimum(np.floor(position).astype(np.int64), last)
+        upper = np.minimum(lower + 1, last)
+        result[name] = np.where(filled, values[lower] + (values[upper] - values[lower]) * (position - lower), np.nan)
+    return result
+
+
+def _number(value, digits=2):
+    return None if value is None or np.isnan(value) else round(float(value), digits)
+
+
+def market_stats(snapshot, group_by=(), percentiles=DEFAULT_PERCENTILES, bins=20, months=12, filters=None,
+                 restrict_to=None, limit=100):
+    """
+    Price, area and price-per-sqft statistics of the snapshot's rows per
+    ``group_by`` combination (largest groups first): summary percentiles,
+    histograms over shared bins and monthly trends of the last ``months``.
+    ``filters`` maps group_by fields to lists of codes to keep; an empty
+    list keeps no rows.
+    """
+    size = snapshot.size
+    data = {name: column[:size] for name, column in snapshot.data.items()}
+    keep = snapshot.alive[:size].copy()
+    for field, codes in (filters or {}).items():
+        if not codes:
+            keep[:] = False
+            break
+        keep &= np.isin(data[GROUP_FIELDS[field]], codes)
+    if restrict_to is not None:
+        allowed = np.zeros(size, dtype=bool)
+        allowed[snapshot.rows_for(restrict_to)] = True
+        keep &= allowed
+    rows = np.flatnonzero(keep)
+
+    price, area = data['price'][rows], data['area'][rows]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        values = {'price': price, 'area': area, 'price_per_sqft': np.where(area > 0, price / area, np.nan)}
+
+    if group_by:
+        # One int64 key per row (mixed radix over the group_by columns, codes
+        # shifted past -1): 1-D np.unique is far faster than unique rows
+        columns = [data[GROUP_FIELDS[field]][rows].astype(np.int64) + 1 for field in group_by]
+        radixes = [int(column.max()) + 1 if len(column) else 1 for column in columns]
+        combined = np.zeros(len(rows), dtype=np.int64)
+        for column, radix in zip(columns, radixes):
+            combined = combined * radix + column
+        combined, groups = np.unique(combined, return_inverse=True)
+        keys = np.empty((len(combined), len(columns)), dtype=np.int64)
+        for i, radix in reversed(list(enumerate(radixes))):
+            combined, keys[:, i] = np.divmod(combined, radix)
+        keys -= 1
+    else:
+        keys, groups = np.zeros((1, 0), dtype=np.int64), np.zeros(len(rows), dtype=np.int64)
+    group_count = len(keys)
+    summaries = {metric: grouped_percentiles(groups, values[metric], group_count, percentiles) for metric in METRICS}
+
+    # Shared bins per metric from the 1st to the 99th percentile of all the
+    # rows, so groups compare bin by bin; outliers land in the end bins
+    histograms = {}
+    for metric in METRICS:
+        present = ~np.isnan(values[metric])
+        if not present.any():
+            continue
+        low, high = np.percentile(values[metric][present], [1, 99])
+        if high <= low:
+            high = low + max(abs(low) * 0.01, 1.0)
+        slot = ((values[metric][present] - low) / (high - low) * bins).astype(np.int64).clip(0, bins - 1)
+        counts = np.bincount(groups[present] * bins + slot, minlength=group_count * bins).reshape(group_count, bins)
+        histograms[metric] = (np.linspace(low, high, bins + 1), counts)
+
+    trends = None
+    if months:
+        first = month_number(timezone.now()) - months + 1
+        month = data['month'][rows]
+        recent = (month >= first) & (month < first + months)
+        trend_groups = groups[recent] * months + (month[recent] - first)
+        trends = {
+            metric: grouped_percentiles(trend_groups, values[metric][recent], group_count * months)
+            for metric in ('price', 'price_per_sqft')
+        }
+        trend_counts = np.bincount(trend_groups, minlength=group_count * months)
+
+    sizes = np.bincount(groups, minlength=group_count)
+    order = np.lexsort((np.arange(group_count), -sizes))[:limit]
+    results = []
+    for g in order.tolist():
+        entry = {
+            'key': {field: snapshot.label(field, int(code)) for field, code in zip(group_by, keys[g])},
+            'count': int(sizes[g]),
+        }
+        for metric in METRICS:
+            summary = summaries[metric]
+            entry[metric] = {
+                name: int(column[g]) if name == 'count' else _number(column[g]) for name, column in summary.items()
+            }
+            if metric in histograms:
+                entry[metric]['histogram'] = histograms[metric][1][g].tolist()
+        if trends is not None:
+            entry['trend'] = [
+                {
+                    'month': month_label(first + m),
+                    'count': int(trend_counts[g * months + m]),
+                    'median_price': _number(trends['price']['median'][g * months + m]),
+                    'median_price_per_sqft': _number(trends['price_per_sqft']['median'][g * months + m]),
+                }
+                for m in range(months)
+            ]
+        results.append(entry)
+    return {
+        'count': int(len(rows)),
+        'group_by': list(group_by),
+        'groups_total': int(group_count),
+        'histogram_edges': {metric: [round(float(edge), 2) for edge in edges] for metric, (edges, _) in histograms.items()},
+        'groups': results,
+    }
+
+
+def stats_params(params, snapshot):
+    """
+    market_stats keyword arguments from query parameters (group_by,
+    percentiles, bins, months, limit and a comma-separated filter per
+    group_by field); raises ValueError when invalid.
+    """
+    group_by = [field for field in (params.get('group_by') or '').split(',') if field]
+    unknown = [field for field in group_by if field not in GROUP_FIELDS]
+    if unknown:
+        raise ValueError(f"Unknown group_by: {', '.join(unknown)}. Choose from: {', '.join(GROUP_FIELDS)}.")
+    if len(set(group_by)) != len(group_by) or len(group_by) > 3:
+        raise ValueError("group_by takes up to 3 different fields.")
+    try:
+        percentiles = tuple(sorted({
+            float(p) for p in (params.get('percentiles') or ','.join(map(str, DEFAULT_PERCENTILES))).split(',') if p
+        }))
+        bins = int(params.get('bins', 20))
+        months = int(params.get('months', 12))
+        limit = int(params.get('limit', 100))
+    except (TypeError, ValueError):
+        raise ValueError("percentiles must be numbers; bins, months and limit integers.")
+    if not percentiles or len(percentiles) > 9 or not all(0 <= p <= 100 for p in percentiles):
+        raise ValueError("percentiles takes 1 to 9 values between 0 and 100.")
+    if not 1 <= bins <= 100:
+        raise ValueError("bins must be between 1 and 100.")
+    if not 0 <= months <= 60:
+        raise ValueError("months must be between 0 and 60.")
+    maximum = _setting('PROPERTY_STATS_MAX_GROUPS', 500)
+    if not 1 <= limit <= maximum:
+        raise ValueError(f"limit must be between 1 and {maximum}.")
+
+    filters = {}
+    for field in GROUP_FIELDS:
+        wanted = [value for value in (params.get(field) or '').split(',') if value.strip()]
+        if not wanted:
+            continue
+        if field in ('city', 'location'):
+            labels = snapshot.cities if field == 'city' else snapshot.locations
+            # A label no property has matches nothing; its -1 is also the blank-location code
+            filters[field] = [code for code in map(labels.lookup, wanted) if code >= 0]
+        else:
+            codes = {'property_type': TYPE_CODES, 'listing_type': LISTING_CODES, 'status': STATUS_CODES}[field]
+            if any(value not in codes for value in wanted):
+                raise ValueError(f"Unknown {field}. Choose from: {', '.join(codes)}.")
+            filters[field] = [codes[value] for value in wanted]
+    return {
+        'group_by': tuple(group_by), 'percentiles': percentiles, 'bins': bins, 'months': months,
+        'filters': filters, 'limit': limit,
+    }
+
+
+MARKET_SNAPSHOT = MarketSnapshot()
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def property_stats(params, restrict_to=None):
+    """
+    /api/properties/stats/ for query ``params``; unrestricted results are
+    cached until the snapshot changes. Raises ValueError for invalid params.
+    """
+    MARKET_SNAPSHOT.refresh()
+    with MARKET_SNAPSHOT.lock:
+        options = stats_params(params, MARKET_SNAPSHOT)
+        key = None
+        if restrict_to is None:
+            key = (MARKET_SNAPSHOT.version, month_number(timezone.now()), repr(sorted(options.items())))
+            with _cache_lock:
+                if key in _cache:
+                    _cache.move_to_end(key)
+                    return _cache[key]
+        result = market_stats(MARKET_SNAPSHOT, restrict_to=restrict_to, **options)
+    if key is not None:
+        with _cache_lock:
+            _cache[key] = result
+            while len(_cache) > CACHE_SIZE:
+                _cache.popitem(last=False)
+    return result
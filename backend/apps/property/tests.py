@@ -1,3 +1,106 @@
-from django.test import TestCase
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.db import OperationalError, connection
+from django.test import TransactionTestCase, override_settings
+from django.utils import timezone
+
+from apps.leads.models import Lead
+from apps.property.models import Property, Unit, UnitStatus
+from apps.property.units import UnitsUnavailable, book_units, create_units, hold_units, release_expired_holds
+
+User = get_user_model()
+
+
+# Property saves here really commit; patch similar properties inline rather
+# than on a background thread that would outlive the test's tables
+@override_settings(SIMILAR_PROPERTIES_BACKGROUND=False)
+class UnitBookingConcurrencyTests(TransactionTestCase):
+    """
+    Many agents booking the same project at once must never sell a unit
+    twice or sell more units than exist, and the property's counts must
+    match the unit rows afterwards.
+    """
+    UNITS = 20
+    BOOKINGS = 60
+    WORKERS = 12
+
+    def setUp(self):
+        self.agent = User.objects.create_user(username='unit_agent', password='x', role='agent')
+        self.property = Property.objects.create(
+            title='Unit Towers', property_type='house', property_sub_type='apartment', status='under_construction',
+            location='Andheri, Mumbai', price=9000000, area=900, description='Units', created_by=self.agent,
+        )
+        create_units(self.property, count=self.UNITS)
+        self.leads = [
+            Lead.objects.create(name=f'Buyer {n}', email=f'buyer{n}@example.com', phone='9000000000')
+            for n in range(self.BOOKINGS)
+        ]
+
+    def _in_parallel(self, task, items):
+        start = threading.Barrier(min(self.WORKERS, len(items)))
+
+        def run(item):
+            try:
+                try:
+                    start.wait(timeout=5)
+                except threading.BrokenBarrierError:
+                    pass
+                return task(item)
+            finally:
+                connection.close()
+
+        with ThreadPoolExecutor(max_workers=self.WORKERS) as pool:
+            return list(pool.map(run, items))
+
+    def _book_one(self, lead):
+        try:
+            return [unit.pk for unit in book_units(self.property.pk, self.agent, count=1, lead=lead)]
+        except UnitsUnavailable:
+            return []
+        except OperationalError:
+            # SQLite refuses concurrent writers ("database table is locked"); the booking rolled back
+            return []
+
+    def assert_consistent(self, sold):
+        self.assertEqual(len(sold), len(set(sold)), "A unit was booked twice")
+        booked = Unit.objects.filter(property=self.property, status=UnitStatus.BOOKED)
+        self.assertEqual(booked.count(), len(sold))
+        self.assertLessEqual(len(sold), self.UNITS)
+        self.property.refresh_from_db()
+        self.assertEqual(self.property.units_total, self.UNITS)
+        self.assertEqual(
+            self.property.units_available,
+            Unit.objects.filter(property=self.property, status=UnitStatus.AVAILABLE).count(),
+        )
+
+    def test_parallel_bookings_never_oversell(self):
+        results = self._in_parallel(self._book_one, self.leads)
+        sold = [pk for units in results for pk in units]
+        self.assert_consistent(sold)
+        self.assertEqual(self.property.units_available, self.UNITS - len(sold))
+        if connection.features.has_select_for_update_skip_locked:
+            # With row locks every booking either gets a unit or finds none left
+            self.assertEqual(len(sold), self.UNITS)
+
+        # Each booked unit names its own lead, now converted on this property
+        buyers = list(Unit.objects.filter(pk__in=sold).values_list('lead_id', flat=True))
+        self.assertEqual(len(set(buyers)), len(sold))
+        self.assertEqual(
+            Lead.objects.filter(pk__in=buyers, status='Converted', property=self.property).count(), len(sold),
+        )
+
+    def test_holds_expire_back_to_available(self):
+        held = hold_units(self.property.pk, self.agent, count=5, minutes=10)
+        self.property.refresh_from_db()
+        self.assertEqual(self.property.units_available, self.UNITS - 5)
+        with self.assertRaises(UnitsUnavailable):
+            book_units(self.property.pk, self.agent, unit_ids=[unit.pk for unit in held] + [0])
+
+        Unit.objects.filter(pk__in=[unit.pk for unit in held]).update(hold_expires_at=timezone.now() - timedelta(minutes=1))
+        self.assertEqual(release_expired_holds(self.property.pk), 5)
+        # Expired holds can't be booked; the units are simply free again
+        results = self._in_parallel(self._book_one, self.leads[:self.UNITS + 5])
+        self.assert_consistent([pk for units in results for pk in units])
@@ -0,0 +1,283 @@
+# apps/property/units.py
+"""
+Unit inventory of under-construction projects: holds and bookings.
+
+Every unit is a ``Unit`` row that moves available -> held -> booked (or back
+to available on release or when a hold expires). Each move is one
+conditional UPDATE (``WHERE status = <expected>``), so two agents can never
+take the same unit: the second update matches no row and the booking fails
+instead of overwriting the first. Free units are picked with
+``select_for_update(skip_locked=True)``, so parallel bookings on one project
+take different units instead of queueing behind each other's row locks.
+
+``Property.units_total``/``units_available`` become copies of the unit rows
+once a property has units (``units_managed``); every move adjusts
+``units_available`` with an ``F()`` update in the same transaction, and
+``reconcile_unit_counters`` recomputes both from the table. Held units count
+as unavailable until booked, released or expired; expired holds are
+released lazily before every hold and listing, and by the
+``reconcile_property_units`` command.
+"""
+from collections import Counter
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, F, IntegerField, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import Property, Unit, UnitStatus
+
+
+class UnitsUnavailable(Exception):
+    """Fewer units than asked for were free (or held by the caller)."""
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+# --- Counters ----------------------------------------------------------------------
+
+def unit_count(**filters):
+    """Number of the outer property's units matching ``filters``, as a subquery expression."""
+    counts = Unit.objects.filter(property=OuterRef('pk'), **filters).order_by().values('property').annotate(
+        n=Count('pk')
+    ).values('n')
+    return Coalesce(Subquery(counts, output_field=IntegerField()), 0)
+
+
+def reconcile_unit_counters(queryset=None):
+    """
+    Recompute ``units_total``/``units_available`` of ``queryset`` (default:
+    every property with units) from the unit table in one UPDATE and mark them
+    unit-managed. Returns the number of rows updated.
+    """
+    if queryset is None:
+        queryset = Property.objects.filter(Q(units_managed=True) | Q(units__isnull=False)).distinct()
+    return Property.objects.filter(pk__in=queryset.values('pk')).update(
+        units_total=unit_count(),
+        units_available=unit_count(status=UnitStatus.AVAILABLE),
+        units_managed=True,
+    )
+
+
+def _adjust_available(deltas):
+    for property_id, delta in deltas.items():
+        if delta:
+            Property.objects.filter(pk=property_id).update(units_available=F('units_available') + delta)
+
+
+# --- Creating units ----------------------------------------------------------------
+
+def create_units(property, count=None, numbers=None):
+    """
+    Add units to ``property``, numbered ``numbers`` or the next ``count``
+    free numbers. A property without units that still has its old hand-kept
+    counts gets ``units_total`` units, ``units_total - units_available`` of
+    them already booked (without a lead). Returns the created units.
+    """
+    existing = set(Unit.objects.filter(property=property).values_list('number', flat=True))
+    booked = 0
+    if numbers is None:
+        if count is None and not property.units_managed and not existing:
+            count = property.units_total
+            booked = max(property.units_total - property.units_available, 0)
+        numbers, n = [], 0
+        while len(numbers) < (count or 0):
+            n += 1
+            if str(n) not in existing:
+                numbers.append(str(n))
+    duplicates = sorted(set(numbers) & existing)
+    if duplicates:
+        raise ValueError(f"Units already exist: {', '.join(duplicates[:10])}.")
+
+    with transaction.atomic():
+        created = Unit.objects.bulk_create([
+            Unit(property=property, number=number, status=UnitStatus.BOOKED if i < booked else UnitStatus.AVAILABLE)
+            for i, number in enumerate(numbers)
+        ], batch_size=1000)
+        reconcile_unit_counters(Property.objects.filter(pk=property.pk))
+    return created
+
+
+# --- Holds and bookings ------------------------------------------------------------
+
+def release_expired_holds(property_id=None):
+    """Return every expired hold (of one property, or all) to available. Returns the number released."""
+    now = timezone.now()
+    expired = Unit.objects.filter(status=UnitStatus.HELD, hold_expires_at__lte=now)
+    if property_id is not None:
+        property_ids = [property_id]
+    else:
+        property_ids = list(expired.order_by().values_list('property_id', flat=True).distinct())
+    released = 0
+    for pk in property_ids:
+        with transaction.atomic():
+            n = expired.filter(property_id=pk).update(
+                status=UnitStatus.AVAILABLE, held_by=None, lead=None, hold_expires_at=None, updated_at=now,
+            )
+            _adjust_available({pk: n})
+        released += n
+    return released
+
+
+def _take(property_id, status, count=None, unit_ids=None, **fields):
+    """
+    Move ``count`` free units (or exactly ``unit_ids``) of a property to
+    ``status``; must run inside a transaction. Returns their ids.
+    """
+    wanted = len(unit_ids) if unit_ids is not None else count
+    if not wanted:
+        return []
+    free = Unit.objects.filter(property_id=property_id, status=UnitStatus.AVAILABLE)
+    if unit_ids is not None:
+        free = free.filter(pk__in=unit_ids)
+    # Units locked by another booking in flight are skipped, not waited for
+    picked = list(
+        free.select_for_update(skip_locked=True, of=('self',)).order_by('pk').values_list('pk', flat=True)[:wanted]
+    )
+    if len(picked) < wanted:
+        raise UnitsUnavailable(f"Only {len(picked)} of the {wanted} units asked for are available.")
+    # Still conditional: without row locks (SQLite) two bookings can pick the
+    # same units, and then only one of the updates matches them
+    taken = Unit.objects.filter(pk__in=picked, status=UnitStatus.AVAILABLE).update(status=status, **fields)
+    if taken < wanted:
+        raise UnitsUnavailable("Some of these units were just taken by another booking. Please retry.")
+    _adjust_available({property_id: -taken})
+    return picked
+
+
+def hold_units(property_id, user, count=None, unit_ids=None, lead=None, minutes=None):
+    """
+    Hold ``count`` free units (or ``unit_ids``) for ``minutes`` (default
+    UNIT_HOLD_MINUTES), optionally for ``lead``. Raises UnitsUnavailable
+    when they aren't all free; nothing is held then.
+    """
+    release_expired_holds(property_id)
+    now = timezone.now()
+    minutes = minutes or _setting('UNIT_HOLD_MINUTES', 30)
+    with transaction.atomic():
+        ids = _take(
+            property_id, UnitStatus.HELD, count, unit_ids, held_by=user, lead=lead,
+            hold_expires_at=now + timedelta(minutes=minutes), booked_at=None, updated_at=now,
+        )
+        return list(Unit.objects.filter(pk__in=ids))
+
+
+def book_units(property_id, user, count=None, unit_ids=None, lead=None, any_holder=False):
+    """
+    Book ``unit_ids`` - each either held by ``user`` (any holder with
+    ``any_holder``) and unexpired, or free - or ``count`` free units. The
+    booking lead (``lead``, else the one the hold was for) is linked to the
+    property and marked Converted. All or nothing: raises UnitsUnavailable.
+    """
+    now = timezone.now()
+    fields = {'booked_at': now, 'hold_expires_at': None, 'updated_at': now}
+    if lead is not None:
+        fields['lead'] = lead
+    with transaction.atomic():
+        booked = []
+        if unit_ids is not None:
+            held = Unit.objects.filter(
+                property_id=property_id, pk__in=unit_ids, status=UnitStatus.HELD, hold_expires_at__gt=now,
+            )
+            if not any_holder:
+                held = held.filter(held_by=user)
+            booked = list(held.select_for_update(of=('self',)).values_list('pk', flat=True))
+            # Held units are already off the available count
+            if Unit.objects.filter(pk__in=booked, status=UnitStatus.HELD).update(status=UnitStatus.BOOKED, **fields) < len(booked):
+                raise UnitsUnavailable("Some of these holds were just released. Please retry.")
+            unit_ids = [pk for pk in unit_ids if pk not in set(booked)]
+            count = None
+        booked += _take(property_id, UnitStatus.BOOKED, count, unit_ids, held_by=user, **fields)
+
+        units = list(Unit.objects.filter(pk__in=booked))
+        _convert_leads({unit.lead_id for unit in units if unit.lead_id}, property_id, units)
+        return units
+
+
+def _convert_leads(lead_ids, property_id, units):
+    from apps.leads.models import Lead
+
+    for lead in Lead.objects.filter(pk__in=lead_ids):
+        numbers = ', '.join(unit.number for unit in units if unit.lead_id == lead.pk)
+        lead.property_id = property_id
+        lead.status = 'Converted'
+        lead.last_activity = f"Booked unit {numbers}"
+        # save(), not update(): the lead signals keep the property and agent counters
+        lead.save()
+
+
+def release_units(property_id, user, unit_ids, manage=False):
+    """
+    Return ``unit_ids`` to available: holds of ``user``, or with ``manage``
+    any hold or booking. Raises UnitsUnavailable when some of them can't be
+    released; nothing changes then.
+    """
+    now = timezone.now()
+    releasable = Q(status=UnitStatus.HELD, held_by=user)
+    if manage:
+        releasable = Q(status__in=[UnitStatus.HELD, UnitStatus.BOOKED])
+    with transaction.atomic():
+        released = Unit.objects.filter(releasable, property_id=property_id, pk__in=unit_ids).update(
+            status=UnitStatus.AVAILABLE, held_by=None, lead=None, hold_expires_at=None, booked_at=None, updated_at=now,
+        )
+        if released < len(unit_ids):
+            raise UnitsUnavailable("Some of these units aren't held by you (or booked, for managers).")
+        _adjust_available({property_id: released})
+    return released
+
+
+def unit_summary(units):
+    """Counts per status of ``units`` (Unit rows or status strings)."""
+    counts = Counter(getattr(unit, 'status', unit) for unit in units)
+    return {'total': sum(counts.values()), **{value: counts.get(value, 0) for value in UnitStatus.values}}
+
+
+# --- Request parameters ------------------------------------------------------------
+
+def _integer(value, name, minimum=1, maximum=None):
+    try:
+        number = int(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"{name} must be an integer.")
+    if number < minimum or (maximum is not None and number > maximum):
+        raise ValueError(f"{name} must be between {minimum} and {maximum}." if maximum else f"{name} must be at least {minimum}.")
+    return number
+
+
+def unit_params(data, require_ids=False):
+    """
+    (count, unit_ids, minutes, lead id) from a hold/book/release request
+    body; exactly one of ``count`` and ``unit_ids``. Raises ValueError.
+    """
+    maximum = _setting('UNIT_MAX_PER_REQUEST', 50)
+    unit_ids = data.get('unit_ids')
+    count = data.get('count')
+    if unit_ids not in (None, '', []):
+        if isinstance(unit_ids, str):
+            unit_ids = unit_ids.split(',')
+        if not isinstance(unit_ids, (list, tuple)):
+            raise ValueError("unit_ids must be a list of unit ids.")
+        unit_ids = sorted({_integer(pk, 'unit_ids') for pk in unit_ids})
+        if len(unit_ids) > maximum:
+            raise ValueError(f"At most {maximum} units per request.")
+        count = None
+    elif require_ids:
+        raise ValueError("unit_ids is required.")
+    elif count in (None, ''):
+        raise ValueError("Give either count or unit_ids.")
+    else:
+        unit_ids = None
+        count = _integer(count, 'count', maximum=maximum)
+
+    minutes = data.get('minutes')
+    if minutes not in (None, ''):
+        minutes = _integer(minutes, 'minutes', maximum=_setting('UNIT_HOLD_MAX_MINUTES', 24 * 60))
+    else:
+        minutes = None
+    lead = data.get('lead')
+    lead = _integer(lead, 'lead') if lead not in (None, '') else None
+    return count, unit_ids, minutes, lead
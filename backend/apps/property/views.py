@@ -1,26 +1,51 @@
 # apps/property/views.py
-from rest_framework import viewsets, status
+from rest_framework import viewsets, status, filters
 from rest_framework.response import Response
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
 from rest_framework.permissions import IsAuthenticated
 from django.shortcuts import get_object_or_404
-from django.db import transaction
+from django.conf import settings
+from django.db import IntegrityError
+from django.db.models import F
+from django_filters.rest_framework import DjangoFilterBackend
 from .models import Property, PropertyImage
-from .serializers import PropertySerializer, PropertyImageSerializer
+from .search import PropertyFilter, facet_counts
+from .finance import affordability_params, affordable_properties, amortization_schedule, loan_params
+from .matching import leads_for_property, match_params
+from .serializers import PropertySerializer, PropertyImageSerializer, UnitSerializer
+from .stats import property_stats
+from .removal import archive_properties, queue_file_removal, remove_properties
+from .units import (
+    UnitsUnavailable, book_units, create_units, hold_units, release_expired_holds, release_units, unit_params,
+    unit_summary,
+)
 from django.core.mail import send_mail
 
 class PropertyViewSet(viewsets.ModelViewSet):
     serializer_class = PropertySerializer
     permission_classes = [IsAuthenticated]
+    # Query parameters are documented on PropertyFilter; without ?ordering=
+    # results keep search rank (when searching) or newest first
+    filter_backends = [DjangoFilterBackend, filters.OrderingFilter]
+    filterset_class = PropertyFilter
+    ordering_fields = ['created_at', 'price', 'area', 'title']
     
     def get_queryset(self):
         try:
             user = self.request.user
+            # Images are rendered by PropertySerializer for every row
+            queryset = Property.objects.prefetch_related('images')
+            # Archived properties stay reachable by id; lists and searches
+            # show them only with ?archived=true, and then only them
+            if not self.detail:
+                archived = str(self.request.query_params.get('archived', '')).lower() in ('1', 'true', 'yes')
+                queryset = queryset.filter(archived_at__isnull=not archived)
             # Return all properties for admins and managers
             if hasattr(user, 'is_admin') and (user.is_admin() or user.is_manager() or user.is_agent()):
-                return Property.objects.all().order_by('-created_at')
+                return queryset.order_by('-created_at')
             # Return own properties for others
-            return Property.objects.filter(created_by=user).order_by('-created_at')
+            return queryset.filter(created_by=user).order_by('-created_at')
         except Exception as e:
             print(f"Error in get_queryset: {str(e)}")
             return Property.objects.none()
@@ -28,7 +53,311 @@ class PropertyViewSet(viewsets.ModelViewSet):
     def perform_create(self, serializer):
         # Set the created_by field to the current user
         serializer.save(created_by=self.request.user)
+
+    @action(detail=False, methods=['get'])
+    def facets(self, request):
+        """
+        Counts per filter value for the current search (each facet ignores its
+        own selection), plus the price and area range of the matches.
+        """
+        try:
+            return Response(facet_counts(self.get_queryset(), request.query_params))
+        except ValidationError:
+            raise
+        except Exception as e:
+            print(f"Error in facets: {str(e)}")
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
     
+    @action(detail=False, methods=['get'])
+    def stats(self, request):
+        """
+        Price, area and price-per-sqft percentiles, histograms and monthly
+        trends per group (see apps.property.stats). Query: group_by (city,
+        location, property_type, listing_type, status), percentiles, bins,
+        months, limit, and a comma-separated filter on any group_by field.
+        """
+        try:
+            user = request.user
+            restrict_to = None
+            if not (hasattr(user, 'is_admin') and (user.is_admin() or user.is_manager() or user.is_agent())):
+                restrict_to = list(self.get_queryset().values_list('pk', flat=True))
+            return Response(property_stats(request.query_params, restrict_to=restrict_to))
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        except Exception as e:
+            print(f"Error in stats: {str(e)}")
+            return Response({'error': 'An error occurred while computing property statistics'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+    @action(detail=False, methods=['get'], url_path='emi')
+    def emi_calculator(self, request):
+        """
+        EMI and amortization schedule for any loan. Query: principal, rate
+        (annual %), term (years), by (month or year).
+        """
+        return self._emi_response(request)
+
+    @action(detail=True, methods=['get'])
+    def emi(self, request, pk=None):
+        """
+        EMI and amortization schedule for this property's loan: its
+        loan_amount (or price less ?down_payment), interest_rate and
+        loan_term, each overridable like /api/properties/emi/.
+        """
+        property_instance = self.get_object()
+        principal = property_instance.loan_amount
+        if principal is None and property_instance.price is not None:
+            try:
+                down_payment = float(request.query_params.get('down_payment') or 0)
+            except ValueError:
+                return Response({'error': 'down_payment must be a number.'}, status=status.HTTP_400_BAD_REQUEST)
+            principal = max(float(property_instance.price) - down_payment, 0)
+        return self._emi_response(
+            request,
+            principal=float(principal) if principal is not None else None,
+            rate=float(property_instance.interest_rate) if property_instance.interest_rate is not None else None,
+            years=property_instance.loan_term,
+        )
+
+    def _emi_response(self, request, **defaults):
+        try:
+            principal, rate, years = loan_params(request.query_params, **defaults)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        by = request.query_params.get('by', 'month')
+        if by not in ('month', 'year'):
+            return Response({'error': "by must be 'month' or 'year'."}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            return Response(amortization_schedule(principal, rate, years, by=by))
+        except Exception as e:
+            print(f"Error in emi: {str(e)}")
+            return Response({'error': 'An error occurred while calculating the EMI'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+    @action(detail=False, methods=['get'])
+    def affordable(self, request):
+        """
+        For-sale properties (not sold out) whose EMI fits a monthly budget,
+        most expensive first. Query: monthly_budget, down_payment, rate and
+        term (override each property's own loan terms), property_type, limit.
+        """
+        try:
+            monthly_budget, down_payment, rate, years, property_types, limit = affordability_params(request.query_params)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            user = request.user
+            restrict_to = None
+            if not (hasattr(user, 'is_admin') and (user.is_admin() or user.is_manager() or user.is_agent())):
+                restrict_to = list(self.get_queryset().values_list('pk', flat=True))
+            count, results = affordable_properties(
+                monthly_budget, down_payment, rate, years, property_types, restrict_to=restrict_to, limit=limit,
+            )
+            details = {
+                row['id']: row for row in Property.objects.filter(pk__in=[result['property'] for result in results]).values(
+                    'id', 'title', 'location', 'property_type', 'property_sub_type', 'status',
+                )
+            }
+            for result in results:
+                result['property_details'] = details.get(result['property'])
+        except Exception as e:
+            print(f"Error in affordable: {str(e)}")
+            return Response({'error': 'An error occurred while screening properties'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+        return Response({'count': count, 'results': [result for result in results if result['property_details']]})
+
+    @action(detail=True, methods=['get'], url_path='matching-leads')
+    def matching_leads(self, request, pk=None):
+        """
+        Open leads whose budget, interest and requirements best fit this
+        property (see apps.property.matching), best first. Agents only see
+        leads assigned to them. Query: limit, min_score (0-1).
+        """
+        user = request.user
+        if not (hasattr(user, 'is_admin') and (user.is_admin() or user.is_manager() or user.is_agent())):
+            return Response({'error': 'You do not have permission to view leads'}, status=status.HTTP_403_FORBIDDEN)
+        property_instance = self.get_object()
+        try:
+            limit, min_score = match_params(request.query_params)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            from apps.leads.models import Lead
+            restrict_to = None
+            if not (user.is_superuser or user.is_admin() or user.is_manager()):
+                restrict_to = list(Lead.objects.filter(assigned_to=user).values_list('pk', flat=True))
+            results = leads_for_property(property_instance, limit=limit, min_score=min_score, restrict_to=restrict_to)
+            details = {
+                row['id']: row for row in Lead.objects.filter(pk__in=[result['lead'] for result in results]).values(
+                    'id', 'name', 'email', 'phone', 'status', 'priority', 'budget', 'interest', 'assigned_to',
+                )
+            }
+            for result in results:
+                result['lead_details'] = details.get(result['lead'])
+        except Exception as e:
+            print(f"Error in matching_leads: {str(e)}")
+            return Response({'error': 'An error occurred while matching leads'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+        return Response([result for result in results if result['lead_details']])
+
+    @action(detail=True, methods=['get'])
+    def similar(self, request, pk=None):
+        """
+        Properties most like this one, nearest first, read from the
+        precomputed neighbour table (see apps.property.similarity).
+        Query: limit (default 6, at most SIMILAR_PROPERTIES_K).
+        """
+        maximum = getattr(settings, 'SIMILAR_PROPERTIES_K', 12)
+        try:
+            limit = int(request.query_params.get('limit', min(6, maximum)))
+        except (TypeError, ValueError):
+            limit = 0
+        if not 1 <= limit <= maximum:
+            return Response({'error': f'limit must be between 1 and {maximum}'}, status=status.HTTP_400_BAD_REQUEST)
+        property_instance = self.get_object()
+
+        try:
+            # One range scan on (property, rank); the join drops neighbours
+            # deleted since the table was last patched
+            queryset = self.get_queryset().filter(similar_to__property=property_instance, archived_at__isnull=True).annotate(
+                similar_rank=F('similar_to__rank'), similar_distance=F('similar_to__distance'),
+            ).order_by('similar_rank')[:limit]
+            results = []
+            for similar in queryset:
+                data = self.get_serializer(similar).data
+                data['similarity'] = round(1 / (1 + similar.similar_distance), 4)
+                results.append(data)
+        except Exception as e:
+            print(f"Error in similar: {str(e)}")
+            return Response({'error': 'An error occurred while finding similar properties'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+        return Response(results)
+
+    def _is_staff(self, user):
+        return hasattr(user, 'is_admin') and (user.is_admin() or user.is_manager() or user.is_agent())
+
+    def _is_manager(self, user):
+        return user.is_superuser or (hasattr(user, 'is_admin') and (user.is_admin() or user.is_manager()))
+
+    @action(detail=True, methods=['get', 'post'])
+    def units(self, request, pk=None):
+        """
+        GET: the property's units (?status=) with counts per status.
+        POST: add units, {"count": n} or {"numbers": [...]}; a property
+        without units and no body gets units_total units, the sold ones
+        (units_total - units_available) booked. Admins, managers and the
+        property's creator only.
+        """
+        property_instance = self.get_object()
+        if request.method == 'POST':
+            return self._create_units(request, property_instance)
+        try:
+            release_expired_holds(property_instance.pk)
+            units = list(property_instance.units.all())
+            summary = unit_summary(units)
+            wanted = request.query_params.get('status')
+            if wanted:
+                units = [unit for unit in units if unit.status in wanted.split(',')]
+        except Exception as e:
+            print(f"Error in units: {str(e)}")
+            return Response({'error': 'An error occurred while fetching units'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+        return Response({'summary': summary, 'results': UnitSerializer(units, many=True).data})
+
+    def _create_units(self, request, property_instance):
+        user = request.user
+        if not (self._is_manager(user) or property_instance.created_by_id == user.pk):
+            return Response({'error': 'You do not have permission to add units'}, status=status.HTTP_403_FORBIDDEN)
+        maximum = getattr(settings, 'UNIT_MAX_CREATE', 2000)
+        count, numbers = request.data.get('count'), request.data.get('numbers')
+        try:
+            if numbers not in (None, '', []):
+                if not isinstance(numbers, (list, tuple)) or not all(str(number).strip() for number in numbers):
+                    raise ValueError("numbers must be a list of unit numbers.")
+                numbers = [str(number).strip()[:50] for number in numbers]
+                if len(set(numbers)) != len(numbers):
+                    raise ValueError("numbers must not repeat.")
+                count = None
+            else:
+                numbers = None
+                count = int(count) if count not in (None, '') else None
+                if count is None and (property_instance.units_managed or property_instance.units_total <= 0):
+                    raise ValueError("Give count or numbers.")
+            wanted = len(numbers) if numbers is not None else (count if count is not None else property_instance.units_total)
+            if not 1 <= wanted <= maximum:
+                raise ValueError(f"Between 1 and {maximum} units per request.")
+            created = create_units(property_instance, count=count, numbers=numbers)
+        except (TypeError, ValueError) as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        except IntegrityError:
+            return Response({'error': 'Some of these units were just added by another request. Please retry.'}, status=status.HTTP_409_CONFLICT)
+        except Exception as e:
+            print(f"Error in create units: {str(e)}")
+            return Response({'error': 'An error occurred while adding units'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+        return Response({'created': len(created)}, status=status.HTTP_201_CREATED)
+
+    @action(detail=True, methods=['post'], url_path='units/hold')
+    def hold(self, request, pk=None):
+        """
+        Hold units for a while before booking: {"count": n} or
+        {"unit_ids": [...]}, optional "lead" and "minutes" (default
+        UNIT_HOLD_MINUTES). 409 when they aren't all free.
+        """
+        return self._unit_request(request, 'hold')
+
+    @action(detail=True, methods=['post'], url_path='units/book')
+    def book(self, request, pk=None):
+        """
+        Book units: {"unit_ids": [...]} held by you (managers: by anyone) or
+        free, or {"count": n} free ones; optional "lead", which is linked to
+        the property and marked Converted. 409 when they can't all be booked.
+        """
+        return self._unit_request(request, 'book')
+
+    @action(detail=True, methods=['post'], url_path='units/release')
+    def release(self, request, pk=None):
+        """
+        Release {"unit_ids": [...]}: your holds, or (managers) any hold or
+        booking. 409 when some of them can't be released.
+        """
+        return self._unit_request(request, 'release')
+
+    def _unit_request(self, request, operation):
+        user = request.user
+        if not self._is_staff(user):
+            return Response({'error': 'You do not have permission to book units'}, status=status.HTTP_403_FORBIDDEN)
+        property_instance = self.get_object()
+        manage = self._is_manager(user)
+        try:
+            count, unit_ids, minutes, lead_id = unit_params(request.data, require_ids=operation == 'release')
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        lead = None
+        if lead_id is not None:
+            from apps.leads.models import Lead
+            # Agents can only book for leads assigned to them
+            leads = Lead.objects.all() if manage else Lead.objects.filter(assigned_to=user)
+            lead = leads.filter(pk=lead_id).first()
+            if lead is None:
+                return Response({'error': 'Lead not found'}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            if operation == 'hold':
+                units = hold_units(property_instance.pk, user, count, unit_ids, lead=lead, minutes=minutes)
+            elif operation == 'book':
+                units = book_units(property_instance.pk, user, count, unit_ids, lead=lead, any_holder=manage)
+            else:
+                release_units(property_instance.pk, user, unit_ids, manage=manage)
+                units = list(property_instance.units.filter(pk__in=unit_ids))
+        except UnitsUnavailable as e:
+            return Response({'error': str(e)}, status=status.HTTP_409_CONFLICT)
+        except Exception as e:
+            print(f"Error in units {operation}: {str(e)}")
+            return Response({'error': f'An error occurred while trying to {operation} units'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+        property_instance.refresh_from_db(fields=['units_total', 'units_available'])
+        return Response({
+            'units': UnitSerializer(units, many=True).data,
+            'units_total': property_instance.units_total,
+            'units_available': property_instance.units_available,
+        })
+
     @action(detail=True, methods=['post'])
     def set_primary_image(self, request, pk=None):
         property_instance = self.get_object()
@@ -69,8 +398,9 @@ class PropertyViewSet(viewsets.ModelViewSet):
         # Check if this is the primary image
         is_primary = image.is_primary
         
-        # Delete the image
+        # Delete the image; the file goes in the background (kept if shared)
         image.delete()
+        queue_file_removal([image.image.name])
         
         # If this was the primary image, set another image as primary if available
         if is_primary:
@@ -81,14 +411,55 @@ class PropertyViewSet(viewsets.ModelViewSet):
         
         return Response({'success': True})
     
+    @action(detail=False, methods=['post'])
+    def bulk(self, request):
+        """
+        Delete, archive or unarchive many properties:
+        {"action": "delete" | "archive" | "unarchive", "ids": [...], "dry_run": false}.
+        Works in batches of set-based statements (see apps.property.removal) and
+        returns a report of what was removed. Admins and managers may touch any
+        property, others only the ones they created; other ids are listed as
+        not_found.
+        """
+        operation = request.data.get('action', 'delete')
+        if operation not in ('delete', 'archive', 'unarchive'):
+            return Response({'error': 'action must be one of: delete, archive, unarchive.'}, status=status.HTTP_400_BAD_REQUEST)
+        ids = request.data.get('ids')
+        maximum = getattr(settings, 'PROPERTY_BULK_MAX_IDS', 10000)
+        try:
+            if isinstance(ids, str):
+                ids = ids.split(',')
+            if not isinstance(ids, (list, tuple)) or not ids:
+                raise ValueError
+            ids = {int(pk) for pk in ids}
+        except (TypeError, ValueError):
+            return Response({'error': 'ids must be a non-empty list of property ids.'}, status=status.HTTP_400_BAD_REQUEST)
+        if len(ids) > maximum:
+            return Response({'error': f'At most {maximum} properties per request.'}, status=status.HTTP_400_BAD_REQUEST)
+        dry_run = str(request.data.get('dry_run', '')).lower() in ('1', 'true', 'yes')
+
+        try:
+            user = request.user
+            allowed = Property.objects.filter(pk__in=ids)
+            if not self._is_manager(user):
+                allowed = allowed.filter(created_by=user)
+            allowed = set(allowed.values_list('pk', flat=True))
+            if operation == 'delete':
+                report = remove_properties(allowed, dry_run=dry_run)
+            else:
+                report = archive_properties(allowed, archive=operation == 'archive', dry_run=dry_run)
+            report['not_found'] = sorted(set(report['not_found']) | (ids - allowed))
+        except Exception as e:
+            print(f"Error in bulk {operation}: {str(e)}")
+            return Response({'error': f'An error occurred during bulk {operation}'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+        return Response(report)
+
     def destroy(self, request, *args, **kwargs):
         try:
-            with transaction.atomic():
-                instance = self.get_object()
-                # Delete all associated images first
-                PropertyImage.objects.filter(property=instance).delete()
-                # Then delete the property
-                instance.delete()
+            instance = self.get_object()
+            # Same set-based path as the bulk endpoint: related rows go in one
+            # statement per table and the image files are removed after commit
+            remove_properties([instance.pk])
             return Response(status=status.HTTP_204_NO_CONTENT)
         except Exception as e:
             return Response(
@@ -0,0 +1,144 @@
+# apps/site_visits/availability.py
+"""
+Agent availability and double-booking checks.
+
+Visits store ``start``/``end`` with an (agent, start) index. Durations are
+capped at SITE_VISIT_MAX_DURATION minutes, so a visit overlapping
+[start, end) must begin in [start - max duration, end): the conflict check
+is a bounded range scan on that index rather than a scan of the agent's
+whole history.
+
+``BusyIntervals`` answers the same question in memory (bisect over sorted
+start times) for free-slot search and batch planning, after loading an
+agent's visits for the window with one query.
+"""
+from bisect import bisect_left, insort
+from datetime import datetime, time, timedelta
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.utils import timezone
+from rest_framework import serializers
+
+from .models import SiteVisit, visit_time_zone
+
+# Visits in these states occupy the agent's time
+BLOCKING_STATUSES = ('scheduled', 'confirmed', 'completed')
+
+
+def max_duration():
+    return timedelta(minutes=getattr(settings, 'SITE_VISIT_MAX_DURATION', 480))
+
+
+def conflicting_visits(agent_id, start, end, exclude_pk=None):
+    """Visits of ``agent_id`` that overlap [start, end)."""
+    queryset = SiteVisit.objects.filter(
+        agent_id=agent_id,
+        start__gt=start - max_duration(),
+        start__lt=end,
+        end__gt=start,
+        status__in=BLOCKING_STATUSES,
+    )
+    if exclude_pk:
+        queryset = queryset.exclude(pk=exclude_pk)
+    return queryset.order_by('start')
+
+
+def busy_agent_ids(start, end):
+    """Agents with a visit overlapping [start, end), in one query."""
+    return set(
+        SiteVisit.objects.filter(
+            start__gt=start - max_duration(), start__lt=end, end__gt=start, status__in=BLOCKING_STATUSES
+        ).exclude(agent=None).values_list('agent_id', flat=True).distinct()
+    )
+
+
+def ensure_agent_available(visit):
+    """
+    Raise a ValidationError if ``visit`` (saved or not) would double-book its
+    agent. Call inside a transaction: the agent's row is locked first so two
+    bookings for the same agent can't both pass the check.
+    """
+    if not visit.agent_id or visit.start is None or visit.status not in BLOCKING_STATUSES:
+        return
+    list(get_user_model().objects.select_for_update().filter(pk=visit.agent_id).values_list('pk'))
+    clash = conflicting_visits(visit.agent_id, visit.start, visit.end, exclude_pk=visit.pk).first()
+    if clash:
+        tz = visit_time_zone()
+        raise serializers.ValidationError({'agent': [
+            f"This agent already has a visit on {clash.start.astimezone(tz):%B %d, %Y} from "
+            f"{clash.start.astimezone(tz):%I:%M %p} to {clash.end.astimezone(tz):%I:%M %p}."
+        ]})
+
+
+class BusyIntervals:
+    """Sorted [start, end) intervals with overlap lookups in O(log n + k)."""
+
+    def __init__(self, intervals=()):
+        self._intervals = sorted(intervals)
+        self._longest = max((end - start for start, end in self._intervals), default=timedelta(0))
+
+    @classmethod
+    def for_agent(cls, agent_id, window_start, window_end, exclude_pks=()):
+        rows = conflicting_visits(agent_id, window_start, window_end).exclude(pk__in=exclude_pks)
+        return cls(rows.values_list('start', 'end'))
+
+    def add(self, start, end):
+        insort(self._intervals, (start, end))
+        self._longest = max(self._longest, end - start)
+
+    def overlapping(self, start, end):
+        # Anything overlapping starts after (start - longest interval)
+        first = bisect_left(self._intervals, (start - self._longest,))
+        found = []
+        for interval_start, interval_end in self._intervals[first:]:
+            if interval_start >= end:
+                break
+            if interval_end > start:
+                found.append((interval_start, interval_end))
+        return found
+
+    def is_free(self, start, end):
+        return not self.overlapping(start, end)
+
+    def __len__(self):
+        return len(self._intervals)
+
+
+def working_hours():
+    opening, closing = getattr(settings, 'SITE_VISIT_WORKING_HOURS', (9, 19))
+    return time(opening), time(closing)
+
+
+def free_slots(agent_id, days=7, duration_minutes=None, start_date=None, now=None):
+    """
+    Free slots for ``agent_id`` over ``days`` days, on the
+    SITE_VISIT_SLOT_MINUTES grid within working hours. Returns
+    ``[{'date': date, 'slots': [(start, end), ...]}, ...]``.
+    """
+    tz = visit_time_zone()
+    now = now or timezone.now()
+    duration = timedelta(minutes=duration_minutes or getattr(settings, 'SITE_VISIT_DEFAULT_DURATION', 60))
+    step = timedelta(minutes=getattr(settings, 'SITE_VISIT_SLOT_MINUTES', 30))
+    working_days = getattr(settings, 'SITE_VISIT_WORKING_DAYS', (0, 1, 2, 3, 4, 5))
+    opening, closing = working_hours()
+    first_day = start_date or now.astimezone(tz).date()
+
+    window_start = datetime.combine(first_day, opening, tzinfo=tz)
+    window_end = datetime.combine(first_day + timedelta(days=days), closing, tzinfo=tz)
+    busy = BusyIntervals.for_agent(agent_id, window_start, window_end)
+
+    result = []
+    for offset in range(days):
+        day = first_day + timedelta(days=offset)
+        if day.weekday() not in working_days:
+            continue
+        slot = datetime.combine(day, opening, tzinfo=tz)
+        day_end = datetime.combine(day, closing, tzinfo=tz)
+        slots = []
+        while slot + duration <= day_end:
+            if slot >= now and busy.is_free(slot, slot + duration):
+                slots.append((slot, slot + duration))
+            slot += step
+        result.append({'date': day, 'slots': slots})
+    return result
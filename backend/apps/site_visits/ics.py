@@ -0,0 +1,138 @@
+# apps/site_visits/ics.py
+"""
+iCalendar (RFC 5545) feed of an agent's site visits.
+
+Calendar apps subscribe to a URL and poll it without our login cookies, so
+each agent's feed URL carries a token derived from their id and password
+hash (changing the password revokes old URLs). The feed covers
+SITE_VISIT_ICS_PAST_DAYS back to SITE_VISIT_ICS_FUTURE_DAYS ahead and is
+streamed from a server-side iterator; its ETag comes from one aggregate
+query, so unchanged feeds answer 304 without reading the visits.
+"""
+import hashlib
+from datetime import timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.db.models import Count, Max
+from django.utils import timezone
+from django.utils.crypto import constant_time_compare, salted_hmac
+
+from .models import SiteVisit, visit_time_zone
+
+TOKEN_SALT = 'apps.site_visits.ics'
+STATUS_MAP = {
+    'scheduled': 'TENTATIVE',
+    'confirmed': 'CONFIRMED',
+    'completed': 'CONFIRMED',
+    'cancelled': 'CANCELLED',
+    'no_show': 'CANCELLED',
+}
+
+
+def feed_token(agent):
+    return salted_hmac(TOKEN_SALT, f"{agent.pk}:{agent.password}").hexdigest()[:32]
+
+
+def check_feed_token(agent, token):
+    return bool(token) and constant_time_compare(feed_token(agent), token)
+
+
+def feed_window(now=None):
+    today = timezone.localdate(now, visit_time_zone())
+    return (
+        today - timedelta(days=getattr(settings, 'SITE_VISIT_ICS_PAST_DAYS', 30)),
+        today + timedelta(days=getattr(settings, 'SITE_VISIT_ICS_FUTURE_DAYS', 365)),
+    )
+
+
+def feed_queryset(agent_id, window):
+    return SiteVisit.objects.filter(agent_id=agent_id, date__range=window).exclude(start=None)
+
+
+def feed_etag(agent_id, window):
+    """Changes whenever a visit in the window (or its property) is added, edited or removed."""
+    stats = feed_queryset(agent_id, window).aggregate(
+        count=Count('pk'), visits=Max('updated_at'), properties=Max('property__updated_at'),
+    )
+    key = f"{agent_id}:{window[0]}:{window[1]}:{stats['count']}:{stats['visits']}:{stats['properties']}"
+    return hashlib.md5(key.encode()).hexdigest()
+
+
+def escape(value):
+    return (
+        str(value or '').replace('\\', '\\\\').replace(';', '\\;').replace(',', '\\,')
+        .replace('\r\n', '\\n').replace('\n', '\\n')
+    )
+
+
+def fold(line):
+    """Split a content line into 75-octet pieces joined by CRLF + space."""
+    encoded = line.encode('utf-8')
+    if len(encoded) <= 75:
+        return line + '\r\n'
+    pieces = []
+    while encoded:
+        limit = 75 if not pieces else 74
+        cut = min(limit, len(encoded))
+        # Don't split a multi-byte character
+        while cut < len(encoded) and (encoded[cut] & 0xC0) == 0x80:
+            cut -= 1
+        pieces.append(encoded[:cut].decode('utf-8'))
+        encoded = encoded[cut:]
+    return '\r\n '.join(pieces) + '\r\n'
+
+
+def _stamp(value):
+    return value.astimezone(dt_timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+
+
+def _event(row, domain):
+    client = f"{row['client_user__first_name'] or ''} {row['client_user__last_name'] or ''}".strip()
+    client = client or row['client_name_manual'] or row['client_user__username'] or 'Client'
+    phone = row['client_user__phone_number'] or row['client_phone_manual'] or ''
+    description = f"Client: {client}" + (f"\nPhone: {phone}" if phone else '')
+    if row['feedback']:
+        description += f"\nFeedback: {row['feedback']}"
+    lines = [
+        'BEGIN:VEVENT',
+        f"UID:sitevisit-{row['pk']}@{domain}",
+        f"DTSTAMP:{_stamp(row['updated_at'])}",
+        f"LAST-MODIFIED:{_stamp(row['updated_at'])}",
+        f"DTSTART:{_stamp(row['start'])}",
+        f"DTEND:{_stamp(row['end'])}",
+        f"SUMMARY:{escape('Site visit: ' + row['property__title'])}",
+        f"LOCATION:{escape(row['property__location'])}",
+        f"DESCRIPTION:{escape(description)}",
+        f"STATUS:{STATUS_MAP.get(row['status'], 'TENTATIVE')}",
+        'END:VEVENT',
+    ]
+    return ''.join(fold(line) for line in lines)
+
+
+def stream_feed(agent, window, domain):
+    """Yield the feed in chunks; visits are read with a server-side iterator."""
+    name = agent.get_full_name() or agent.username
+    yield ''.join(fold(line) for line in (
+        'BEGIN:VCALENDAR',
+        'VERSION:2.0',
+        f"PRODID:-//{domain}//Site Visits//EN",
+        'CALSCALE:GREGORIAN',
+        'METHOD:PUBLISH',
+        f"X-WR-CALNAME:{escape('Site visits - ' + name)}",
+        'X-PUBLISHED-TTL:PT15M',
+        'REFRESH-INTERVAL;VALUE=DURATION:PT15M',
+    ))
+    rows = feed_queryset(agent.pk, window).order_by('start').values(
+        'pk', 'start', 'end', 'status', 'feedback', 'updated_at',
+        'property__title', 'property__location',
+        'client_user__first_name', 'client_user__last_name', 'client_user__username', 'client_user__phone_number',
+        'client_name_manual', 'client_phone_manual',
+    )
+    chunk = []
+    for row in rows.iterator(chunk_size=500):
+        chunk.append(_event(row, domain))
+        if len(chunk) == 100:
+            yield ''.join(chunk)
+            chunk = []
+    chunk.append('END:VCALENDAR\r\n')
+    yield ''.join(chunk)
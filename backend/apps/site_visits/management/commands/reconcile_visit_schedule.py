@@ -0,0 +1,42 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from apps.site_visits.models import SiteVisit
+
+
+class Command(BaseCommand):
+    help = (
+        "Fill SiteVisit.start/end from date, time and duration for visits saved before those "
+        "columns existed (or written with bulk_create/update). Upcoming visits, double-booking "
+        "checks, scheduling, workload stats and the iCalendar feeds all read start/end. "
+        "Run once after upgrading; --all recomputes every visit."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true', help="Recompute every visit, not only those without a start")
+        parser.add_argument('--batch-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        queryset = SiteVisit.objects.all() if options['all'] else SiteVisit.objects.filter(start=None)
+        batch_size = options['batch_size']
+        updated = unparsable = 0
+        last_pk = 0
+        while True:
+            # Keyset batches: rows filled in an earlier batch drop out of start=None
+            batch = list(
+                queryset.filter(pk__gt=last_pk).order_by('pk').only('pk', 'date', 'time', 'duration_minutes')[:batch_size]
+            )
+            if not batch:
+                break
+            last_pk = batch[-1].pk
+            for visit in batch:
+                visit.sync_schedule()
+                unparsable += visit.start is None
+            # bulk_update skips save() and its signals; only start/end change
+            with transaction.atomic():
+                SiteVisit.objects.bulk_update(batch, ['start', 'end'], batch_size=batch_size)
+            updated += len(batch)
+            self.stdout.write(f"Scheduled {updated} visits")
+        self.stdout.write(self.style.SUCCESS(
+            f"Filled start/end for {updated - unparsable} visits; {unparsable} have a time that can't be parsed."
+        ))
@@ -1,8 +1,39 @@
 # site_visits_app/models.py
+from datetime import datetime, timedelta
+from zoneinfo import ZoneInfo
+
 from django.db import models
 from django.conf import settings
 from apps.property.models import Property # Adjust import as per your project
 
+# Formats accepted in SiteVisit.time; the frontend sends '10:00 AM'
+TIME_FORMATS = ('%I:%M %p', '%I:%M%p', '%H:%M', '%H:%M:%S', '%I %p')
+
+
+def visit_time_zone():
+    """Zone the wall-clock date/time of visits are entered in."""
+    return ZoneInfo(getattr(settings, 'SITE_VISIT_TIME_ZONE', settings.TIME_ZONE))
+
+
+def parse_visit_time(value):
+    """'10:00 AM' / '14:30' -> datetime.time, or None if unparsable."""
+    value = str(value or '').strip().upper()
+    for fmt in TIME_FORMATS:
+        try:
+            return datetime.strptime(value, fmt).time()
+        except ValueError:
+            continue
+    return None
+
+
+def default_visit_duration():
+    return getattr(settings, 'SITE_VISIT_DEFAULT_DURATION', 60)
+
+
+def format_visit_time(value):
+    """datetime.time -> the '10:00 AM' form stored in SiteVisit.time."""
+    return value.strftime('%I:%M %p').lstrip('0')
+
 
 class SiteVisit(models.Model):
     property = models.ForeignKey(
@@ -41,13 +72,25 @@ class SiteVisit(models.Model):
         default='scheduled'
     )
     feedback = models.TextField(blank=True, null=True)
+    # Derived from date + time in save(); used for ordering and availability
+    start = models.DateTimeField(null=True, blank=True, editable=False)
+    end = models.DateTimeField(null=True, blank=True, editable=False)
+    duration_minutes = models.PositiveIntegerField(default=default_visit_duration)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
-        ordering = ['-date', '-time']
+        ordering = ['-start', '-date']
         verbose_name = "Site Visit"
         verbose_name_plural = "Site Visits"
+        indexes = [
+            # Agent schedules and the double-booking check (see availability.py)
+            models.Index(fields=['agent', 'start'], name='sitevisit_agent_start_idx'),
+            models.Index(fields=['start'], name='sitevisit_start_idx'),
+            # Calendar ranges and per-agent iCalendar feeds (see ics.py)
+            models.Index(fields=['date', 'start'], name='sitevisit_date_start_idx'),
+            models.Index(fields=['agent', 'date'], name='sitevisit_agent_date_idx'),
+        ]
 
     def __str__(self):
         client_display_name_str = "N/A Client"
@@ -58,4 +101,20 @@ class SiteVisit(models.Model):
         
         property_title_str = self.property.title if self.property else "N/A Property"
         
-        return f"Visit for {property_title_str} with {client_display_name_str} on {self.date}"
\ No newline at end of file
+        return f"Visit for {property_title_str} with {client_display_name_str} on {self.date}"
+
+    def sync_schedule(self):
+        """Recompute ``start``/``end`` from the date, time string and duration."""
+        parsed = parse_visit_time(self.time)
+        if self.date and parsed:
+            self.start = datetime.combine(self.date, parsed, tzinfo=visit_time_zone())
+            self.end = self.start + timedelta(minutes=self.duration_minutes or 0)
+        else:
+            self.start = self.end = None
+
+    def save(self, *args, **kwargs):
+        self.sync_schedule()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and {'date', 'time', 'duration_minutes'} & set(update_fields):
+            kwargs['update_fields'] = {*update_fields, 'start', 'end'}
+        super().save(*args, **kwargs)
@@ -0,0 +1,174 @@
+# apps/site_visits/scheduling.py
+"""
+Bulk and recurring site-visit scheduling (open houses).
+
+A schedule expands a recurrence (once, daily on working days, or weekly on
+chosen weekdays) and a list of slot times into slots, then fills each slot
+with up to ``capacity`` clients hosted by one agent: the given agent, or
+one picked per slot by the assignment engine among agents free at that
+time. Clients sharing a slot share the agent's time; slots clashing with
+the agent's other visits are skipped.
+
+Everything runs in one transaction: the candidate agents' rows are locked
+(as in ``ensure_agent_available``), their visits in the window read with one
+query into ``BusyIntervals``, clients resolved with ``resolve_clients``, the
+visits inserted with ``bulk_create``, and the property and workload counters
+updated once. Each agent gets a single digest email after commit.
+"""
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import transaction
+
+from apps.accounts.assignment import AgentPool, Assigner, AssignmentItem, get_policy
+from apps.accounts.identity import resolve_clients
+from apps.accounts.workload import apply_workload_deltas, visit_is_open
+from apps.core.email import queue_emails
+from apps.property.counters import record_site_visits_added
+
+from .availability import BLOCKING_STATUSES, BusyIntervals, max_duration
+from .models import SiteVisit, format_visit_time, visit_time_zone
+from .utils import site_visit_schedule_digest
+
+
+def expand_dates(start_date, end_date, recurrence, weekdays=None):
+    """Dates of a recurrence: 'once', 'daily' (working days) or 'weekly' (``weekdays``, 0 = Monday)."""
+    if recurrence == 'once':
+        return [start_date]
+    if recurrence == 'weekly':
+        allowed = set(weekdays or [start_date.weekday()])
+    else:
+        allowed = set(getattr(settings, 'SITE_VISIT_WORKING_DAYS', (0, 1, 2, 3, 4, 5)))
+    days = (end_date - start_date).days + 1
+    return [day for day in (start_date + timedelta(days=n) for n in range(days)) if day.weekday() in allowed]
+
+
+def expand_slots(dates, times, duration_minutes):
+    """(date, time string, start, end) for every date and slot time, in start order."""
+    tz = visit_time_zone()
+    duration = timedelta(minutes=duration_minutes)
+    slots = []
+    for day in dates:
+        for slot_time in sorted(set(times)):
+            start = datetime.combine(day, slot_time, tzinfo=tz)
+            slots.append((day, format_visit_time(slot_time), start, start + duration))
+    return slots
+
+
+def _busy_intervals(agent_ids, window_start, window_end):
+    """Every candidate agent's blocking visits in the window, with one query."""
+    rows = SiteVisit.objects.filter(
+        agent_id__in=agent_ids,
+        start__gt=window_start - max_duration(),
+        start__lt=window_end,
+        end__gt=window_start,
+        status__in=BLOCKING_STATUSES,
+    ).values_list('agent_id', 'start', 'end')
+    intervals = defaultdict(list)
+    for agent_id, start, end in rows:
+        intervals[agent_id].append((start, end))
+    return {agent_id: BusyIntervals(intervals[agent_id]) for agent_id in agent_ids}
+
+
+def schedule_visits(property, slots, clients, capacity=1, agent=None, status='scheduled',
+                    duration_minutes=None, policy=None, dry_run=False):
+    """
+    Book ``clients`` ((name, phone, email) tuples, in order) into ``slots``
+    from ``expand_slots``. Returns a report with one entry per slot and per
+    booked visit, plus the clients that didn't fit.
+    """
+    User = get_user_model()
+    duration_minutes = duration_minutes or getattr(settings, 'SITE_VISIT_DEFAULT_DURATION', 60)
+    blocking = status in BLOCKING_STATUSES
+
+    with transaction.atomic():
+        pool = AgentPool.load() if agent is None else AgentPool([])
+        agent_ids = sorted(pool.agents) if agent is None else [agent.pk]
+        # Same lock as a single booking takes, so they can't interleave with this batch
+        list(User.objects.select_for_update().filter(pk__in=agent_ids).order_by('pk').values_list('pk'))
+        busy = _busy_intervals(agent_ids, slots[0][2], max(end for _, _, _, end in slots)) if slots else {}
+
+        item = AssignmentItem.for_property(property)
+        policy = get_policy(policy)
+        policy.prepare(pool, [item])
+        assigner = Assigner(pool, policy, 'visit')
+
+        slot_report, planned = [], []
+        remaining = list(clients)
+        for day, time, start, end in slots:
+            entry = {'date': day, 'time': time, 'start': start, 'agent': None, 'booked': 0}
+            slot_report.append(entry)
+            if not remaining:
+                entry['status'] = 'open'
+                continue
+            count = min(capacity, len(remaining))
+            free = [agent_id for agent_id in agent_ids if not blocking or busy[agent_id].is_free(start, end)]
+            if agent is not None:
+                chosen = agent.pk if free else None
+            else:
+                chosen = assigner.choose(item, exclude=set(agent_ids) - set(free), count=count)
+            if chosen is None:
+                entry['status'] = 'conflict'
+                continue
+            if blocking:
+                busy[chosen].add(start, end)
+            entry.update(agent=chosen, booked=count, status='booked')
+            for client in remaining[:count]:
+                planned.append((day, time, chosen, client))
+            remaining = remaining[count:]
+
+        report = {
+            'dry_run': dry_run,
+            'created': 0,
+            'slots': slot_report,
+            'visits': [],
+            'unplaced': [name for name, _, _ in remaining],
+        }
+        if dry_run or not planned:
+            report['visits'] = [
+                {'id': None, 'date': day, 'time': time, 'agent': agent_id, 'client': client[0]}
+                for day, time, agent_id, client in planned
+            ]
+            return report
+
+        resolved = resolve_clients([client for _, _, _, client in planned])
+        visits = []
+        for (day, time, agent_id, (name, phone, _)), (client_user, created) in zip(planned, resolved):
+            visit = SiteVisit(
+                property=property,
+                agent_id=agent_id,
+                client_user=client_user,
+                # Same rule as SiteVisitSerializer.create
+                client_name_manual=None if created else name,
+                client_phone_manual=None if created else phone,
+                date=day,
+                time=time,
+                duration_minutes=duration_minutes,
+                status=status,
+            )
+            visit.sync_schedule()  # bulk_create skips save()
+            visits.append(visit)
+        visits = SiteVisit.objects.bulk_create(visits, batch_size=500)
+
+        # bulk_create skips the signals that keep counters and send emails
+        per_agent = Counter(visit.agent_id for visit in visits)
+        record_site_visits_added([(property.pk, status)] * len(visits))
+        apply_workload_deltas(
+            {agent_id: {'open_visits': n} for agent_id, n in per_agent.items()} if visit_is_open(status) else {},
+            assigned=list(per_agent),
+        )
+        digests = defaultdict(list)
+        for visit, (_, _, _, (name, _, _)) in zip(visits, planned):
+            digests[visit.agent_id].append({'date': visit.date, 'time': visit.time, 'client': name})
+        agents = User.objects.filter(pk__in=list(digests)).exclude(email='')
+        queue_emails([site_visit_schedule_digest(agent, property, digests[agent.pk]) for agent in agents],
+                     'site visit schedule digests')
+
+    report['created'] = len(visits)
+    report['visits'] = [
+        {'id': visit.pk, 'date': visit.date, 'time': visit.time, 'agent': visit.agent_id, 'client': name}
+        for visit, (_, _, _, (name, _, _)) in zip(visits, planned)
+    ]
+    return report
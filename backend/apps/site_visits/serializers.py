@@ -1,11 +1,19 @@
 # site_visits_app/serializers.py
 from rest_framework import serializers
 from django.contrib.auth import get_user_model
-from .models import SiteVisit
+from django.conf import settings
+from django.db import transaction
+from .availability import busy_agent_ids, ensure_agent_available
+from .models import SiteVisit, parse_visit_time
+from apps.accounts.assignment import choose_agent, get_policy
+from apps.accounts.identity import resolve_client
 from apps.property.models import Property # Adjust import as per your project
 
 User = get_user_model()
 
+# Fields that decide whether a visit double-books its agent
+SCHEDULE_FIELDS = ('agent', 'date', 'time', 'duration_minutes', 'status')
+
 class BasicUserSerializer(serializers.ModelSerializer):
     full_name = serializers.SerializerMethodField()
     phone_number = serializers.SerializerMethodField()
@@ -59,66 +67,72 @@ class SiteVisitSerializer(serializers.ModelSerializer):
             'client_user', 'client_details',      # For associating with an existing/new User model client
             'client_name', 'client_phone',        # Write-only fields for client identification/creation input
             'client_name_manual', 'client_phone_manual', # For clients not linked to a user account
-            'date', 'time', 'status', 'feedback',
+            'date', 'time', 'start', 'end', 'duration_minutes', 'status', 'feedback',
             'created_at', 'updated_at'
         ]
         # client_user, client_name_manual, client_phone_manual are now handled by create logic
-        read_only_fields = ('id', 'created_at', 'updated_at', 'client_user', 'client_name_manual', 'client_phone_manual')
-
+        read_only_fields = ('id', 'created_at', 'updated_at', 'client_user', 'client_name_manual', 'client_phone_manual', 'start', 'end')
+
+    def validate_time(self, value):
+        if parse_visit_time(value) is None:
+            raise serializers.ValidationError("Enter a time like 10:00 AM or 14:30.")
+        return value
+
+    def validate_duration_minutes(self, value):
+        longest = getattr(settings, 'SITE_VISIT_MAX_DURATION', 480)
+        if not 1 <= value <= longest:
+            raise serializers.ValidationError(f"Duration must be between 1 and {longest} minutes.")
+        return value
+
+    def check_availability(self, visit):
+        # Same start/end computation as SiteVisit.save
+        visit.sync_schedule()
+        ensure_agent_available(visit)
+
+    def assign_agent(self, validated_data):
+        # Visits booked without an agent go to one who is free at that time,
+        # picked by the assignment engine (an explicit null keeps it unassigned)
+        visit = SiteVisit(**{field: validated_data[field] for field in SCHEDULE_FIELDS if field in validated_data})
+        visit.sync_schedule()
+        busy = busy_agent_ids(visit.start, visit.end) if visit.start else set()
+        agent_id = choose_agent('visit', property=validated_data.get('property'), exclude=busy)
+        validated_data['agent'] = User.objects.filter(pk=agent_id).first() if agent_id else None
+
+    @transaction.atomic
+    def update(self, instance, validated_data):
+        candidate = SiteVisit(pk=instance.pk, **{
+            field: validated_data.get(field, getattr(instance, field)) for field in SCHEDULE_FIELDS
+        })
+        self.check_availability(candidate)
+        return super().update(instance, validated_data)
+
+    @transaction.atomic
     def create(self, validated_data):
+        if 'agent' not in validated_data and getattr(settings, 'ASSIGNMENT_AUTO_ASSIGN', True):
+            self.assign_agent(validated_data)
+
+        # Reject double-bookings before creating a client user for the visit
+        self.check_availability(SiteVisit(**{
+            field: validated_data[field] for field in SCHEDULE_FIELDS if field in validated_data
+        }))
+
         client_name_input = validated_data.pop('client_name')
         client_phone_input = validated_data.pop('client_phone', None)
         
         client_user_instance = None
         created_new_user = False # To track if a new user was made
 
-        # Attempt to find existing user by phone or email (if provided and makes sense for your User model)
-        if client_phone_input:
-            # Adjust this query based on your User model's phone number field
-            if hasattr(User, 'phone_number'): # Direct attribute on User
-                 client_user_instance = User.objects.filter(phone_number=client_phone_input).first()
-            elif hasattr(User, 'profile') and hasattr(User.profile, 'phone_number'): # On a related 'profile'
-                 client_user_instance = User.objects.filter(profile__phone_number=client_phone_input).first()
-
-        if not client_user_instance and '@' in client_name_input: # Rudimentary check if client_name might be an email
-            client_user_instance = User.objects.filter(email__iexact=client_name_input).first()
-
-        # If no existing user, create one with 'client' role
-        if not client_user_instance and client_name_input:
+        # Find the client by normalized phone/email, or create one (see accounts/identity.py)
+        if client_name_input:
             try:
-                base_username = client_name_input.lower().replace(" ", "_").replace("@", "_at_").replace(".", "_dot_")
-                username_candidate = base_username
-                counter = 1
-                while User.objects.filter(username=username_candidate).exists():
-                    username_candidate = f"{base_username}_{counter}"
-                    counter += 1
-
-                user_defaults = {
-                    'first_name': client_name_input.split(' ')[0],
-                    'last_name': " ".join(client_name_input.split(' ')[1:]) if len(client_name_input.split(' ')) > 1 else '',
-                    'email': client_name_input if '@' in client_name_input else f'{username_candidate}@example.com', # Placeholder email
-                    'role': 'client'  # MODIFIED: Assign 'client' role
-                }
-                # Add phone number to defaults if your User model supports it directly and it's unique
-                # if client_phone_input and hasattr(User, 'phone_number'):
-                #     user_defaults['phone_number'] = client_phone_input
-                
-                client_user_instance, created_new_user = User.objects.get_or_create(
-                    username=username_candidate, # Or use email if it's unique and preferred for username
-                    defaults=user_defaults
+                client_user_instance, created_new_user = resolve_client(
+                    client_name_input,
+                    phone=client_phone_input,
+                    email=client_name_input if '@' in client_name_input else None, # Rudimentary check if client_name might be an email
                 )
-                
                 if created_new_user:
-                    client_user_instance.set_unusable_password()
-                    # If role or phone_number wasn't set via defaults (e.g., on a profile), set and save here.
-                    # Example for phone on profile:
-                    # if hasattr(client_user_instance, 'profile') and client_phone_input:
-                    #     client_user_instance.profile.phone_number = client_phone_input
-                    #     client_user_instance.profile.save()
-                    client_user_instance.save()
                     print(f"Created new client user: {client_user_instance.username} with role 'client'")
-
-            except Exception as e: # Catch potential errors during user creation (e.g., IntegrityError if username/email not unique)
+            except Exception as e: # Catch potential errors during user creation
                 print(f"Error creating client user: {e}. Falling back to manual fields.")
                 # If user creation fails, save with manual fields.
                 # Ensure 'agent' is still in validated_data if it was passed.
@@ -138,4 +152,58 @@ class SiteVisitSerializer(serializers.ModelSerializer):
         }
         
         site_visit = SiteVisit.objects.create(**site_visit_data)
-        return site_visit
\ No newline at end of file
+        return site_visit
+
+
+class BulkClientSerializer(serializers.Serializer):
+    name = serializers.CharField(max_length=255)
+    phone = serializers.CharField(max_length=20, required=False, allow_blank=True)
+    email = serializers.EmailField(required=False, allow_blank=True)
+
+
+class BulkSiteVisitScheduleSerializer(serializers.Serializer):
+    """
+    Input of the bulk/recurring scheduling endpoint (see scheduling.py).
+    """
+    property = serializers.PrimaryKeyRelatedField(queryset=Property.objects.all())
+    agent = serializers.PrimaryKeyRelatedField(queryset=User.objects.filter(role='agent', is_active=True), required=False, allow_null=True)
+    start_date = serializers.DateField()
+    end_date = serializers.DateField(required=False)
+    recurrence = serializers.ChoiceField(choices=['once', 'daily', 'weekly'], default='daily')
+    weekdays = serializers.ListField(child=serializers.IntegerField(min_value=0, max_value=6), required=False, allow_empty=False)
+    times = serializers.ListField(child=serializers.CharField(max_length=20), allow_empty=False)
+    duration_minutes = serializers.IntegerField(required=False, min_value=1)
+    capacity = serializers.IntegerField(default=1, min_value=1, max_value=100)
+    status = serializers.ChoiceField(choices=['scheduled', 'confirmed'], default='scheduled')
+    policy = serializers.CharField(required=False, allow_blank=True)
+    clients = BulkClientSerializer(many=True, allow_empty=False)
+
+    def validate_times(self, value):
+        parsed = [parse_visit_time(item) for item in value]
+        if None in parsed:
+            raise serializers.ValidationError("Enter times like 10:00 AM or 14:30.")
+        return parsed
+
+    def validate_duration_minutes(self, value):
+        longest = getattr(settings, 'SITE_VISIT_MAX_DURATION', 480)
+        if value > longest:
+            raise serializers.ValidationError(f"Duration must be between 1 and {longest} minutes.")
+        return value
+
+    def validate_policy(self, value):
+        try:
+            return get_policy(value or None).name
+        except ValueError as e:
+            raise serializers.ValidationError(str(e))
+
+    def validate(self, data):
+        data.setdefault('end_date', data['start_date'])
+        if data['end_date'] < data['start_date']:
+            raise serializers.ValidationError({'end_date': "End date must be on or after the start date."})
+        longest = getattr(settings, 'SITE_VISIT_CALENDAR_MAX_DAYS', 92)
+        if (data['end_date'] - data['start_date']).days >= longest:
+            raise serializers.ValidationError({'end_date': f"Schedules can span at most {longest} days."})
+        most = getattr(settings, 'SITE_VISIT_BULK_MAX_VISITS', 500)
+        if len(data['clients']) > most:
+            raise serializers.ValidationError({'clients': f"At most {most} clients can be scheduled at once."})
+        return data
@@ -1,7 +1,9 @@
-from django.db.models.signals import pre_save
+from django.db.models.signals import pre_save, post_save, post_delete
 from django.dispatch import receiver
 from .models import SiteVisit 
 from .utils import send_site_visit_assignment_email
+from apps.accounts.workload import record_visit_assignment_change
+from apps.property.counters import record_site_visit_change
 
 @receiver(pre_save, sender=SiteVisit)
 def handle_site_visit_assignment(sender, instance, **kwargs):
@@ -12,8 +14,13 @@ def handle_site_visit_assignment(sender, instance, **kwargs):
         # If this is a new site visit, old_instance won't exist
         old_instance = SiteVisit.objects.get(pk=instance.pk)
         old_agent = old_instance.agent
+        # Remembered for the property counters in post_save
+        instance._counter_state = (old_instance.property_id, old_instance.status)
+        instance._workload_state = (old_instance.agent_id, old_instance.status)
     except SiteVisit.DoesNotExist:
         old_agent = None
+        instance._counter_state = None
+        instance._workload_state = None
     
     new_agent = instance.agent
     
@@ -22,3 +29,37 @@ def handle_site_visit_assignment(sender, instance, **kwargs):
     # 2. Site visit is reassigned to a different agent
     if new_agent and (old_agent != new_agent):
         send_site_visit_assignment_email(instance, new_agent)
+
+
+@receiver(post_save, sender=SiteVisit)
+def update_property_counters_on_save(sender, instance, **kwargs):
+    """
+    Keep the property's scheduled/completed visit counters in step with this visit.
+    """
+    new_state = (instance.property_id, instance.status)
+    old_state = getattr(instance, '_counter_state', None)
+    if old_state != new_state:
+        record_site_visit_change(old_state, new_state)
+    instance._counter_state = new_state
+
+
+@receiver(post_delete, sender=SiteVisit)
+def update_property_counters_on_delete(sender, instance, **kwargs):
+    record_site_visit_change((instance.property_id, instance.status), None)
+
+
+@receiver(post_save, sender=SiteVisit)
+def update_agent_workload_on_save(sender, instance, **kwargs):
+    """
+    Keep the agent's open visit counter in step with this visit.
+    """
+    new_state = (instance.agent_id, instance.status)
+    old_state = getattr(instance, '_workload_state', None)
+    if old_state != new_state:
+        record_visit_assignment_change(old_state, new_state)
+    instance._workload_state = new_state
+
+
+@receiver(post_delete, sender=SiteVisit)
+def update_agent_workload_on_delete(sender, instance, **kwargs):
+    record_visit_assignment_change((instance.agent_id, instance.status), None)
@@ -0,0 +1,99 @@
+# apps/site_visits/stats.py
+"""
+Site-visit statistics.
+
+``visit_summary`` groups the visits by agent once with conditional counts
+(COUNT ... FILTER on PostgreSQL) and adds the groups up in Python, so the
+totals and the per-agent breakdown come from a single query.
+``agent_workload`` lists agents with their open leads (the AgentWorkload
+counters) and upcoming visits (correlated subqueries), also in one query.
+"""
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.db.models import Count, IntegerField, Min, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from apps.accounts.workload import OPEN_VISIT_STATUSES
+
+from .models import SiteVisit, visit_time_zone
+
+COUNT_FIELDS = ('total', 'pending', 'upcoming', 'completed', 'no_show', 'cancelled')
+
+
+def _rate(part, whole):
+    return round(part * 100.0 / whole, 1) if whole else 0.0
+
+
+def visit_summary(queryset, today=None):
+    """
+    Totals over ``queryset`` plus the same counts per agent. "Pending" is
+    scheduled or confirmed, "upcoming" is dated today or later (in
+    SITE_VISIT_TIME_ZONE) and the no-show rate is no-shows over visits that
+    reached their outcome (completed or no-show).
+    """
+    today = today or timezone.localdate(timezone=visit_time_zone())
+    rows = queryset.order_by().values(
+        'agent_id', 'agent__first_name', 'agent__last_name', 'agent__username',
+    ).annotate(
+        total=Count('pk'),
+        pending=Count('pk', filter=Q(status__in=OPEN_VISIT_STATUSES)),
+        upcoming=Count('pk', filter=Q(date__gte=today)),
+        completed=Count('pk', filter=Q(status='completed')),
+        no_show=Count('pk', filter=Q(status='no_show')),
+        cancelled=Count('pk', filter=Q(status='cancelled')),
+    )
+
+    totals = dict.fromkeys(COUNT_FIELDS, 0)
+    agents = []
+    for row in rows:
+        for field in COUNT_FIELDS:
+            totals[field] += row[field]
+        if row['agent_id'] is None:
+            name = None
+        else:
+            name = f"{row['agent__first_name'] or ''} {row['agent__last_name'] or ''}".strip() or row['agent__username']
+        agents.append({
+            'agent': row['agent_id'],
+            'agent_name': name,
+            **{field: row[field] for field in COUNT_FIELDS},
+            'no_show_rate': _rate(row['no_show'], row['completed'] + row['no_show']),
+        })
+    agents.sort(key=lambda agent: (-agent['pending'], agent['agent_name'] or ''))
+    totals['no_show_rate'] = _rate(totals['no_show'], totals['completed'] + totals['no_show'])
+    return totals, agents
+
+
+def agent_workload(agent_ids=None, days=7, now=None):
+    """
+    Active agents with open leads, open visits, visits in the next ``days``
+    days and their next visit, in one query.
+    """
+    now = now or timezone.now()
+    upcoming = SiteVisit.objects.filter(agent=OuterRef('pk'), start__gte=now, status__in=OPEN_VISIT_STATUSES)
+    queryset = get_user_model().objects.filter(role='agent', is_active=True)
+    if agent_ids is not None:
+        queryset = queryset.filter(pk__in=agent_ids)
+    rows = queryset.annotate(
+        upcoming_visits=Coalesce(Subquery(
+            upcoming.filter(start__lt=now + timedelta(days=days)).order_by().values('agent')
+            .annotate(n=Count('pk')).values('n'),
+            output_field=IntegerField(),
+        ), 0),
+        next_visit=Subquery(upcoming.order_by().values('agent').annotate(first=Min('start')).values('first')),
+    ).order_by('username').values(
+        'id', 'username', 'first_name', 'last_name',
+        'workload__open_leads', 'workload__open_visits', 'upcoming_visits', 'next_visit',
+    )
+    return [
+        {
+            'agent': row['id'],
+            'agent_name': f"{row['first_name']} {row['last_name']}".strip() or row['username'],
+            'open_leads': row['workload__open_leads'] or 0,
+            'open_visits': row['workload__open_visits'] or 0,
+            'upcoming_visits': row['upcoming_visits'],
+            'next_visit': row['next_visit'],
+        }
+        for row in rows
+    ]
@@ -1,11 +1,12 @@
 # site_visits/urls.py
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import SiteVisitViewSet
+from .views import SiteVisitViewSet, agent_calendar_feed
 
 router = DefaultRouter()
 router.register(r'site-visits', SiteVisitViewSet, basename='sitevisit') # Matches your API endpoint
 
 urlpatterns = [
+    path('site-visits/agents/<int:agent_id>/calendar.ics', agent_calendar_feed, name='sitevisit-ics'),
     path('', include(router.urls)),
 ]
\ No newline at end of file
@@ -1,4 +1,4 @@
-from django.core.mail import send_mail
+from django.core.mail import EmailMessage, send_mail
 from django.conf import settings
 from django.template.loader import render_to_string
 
@@ -66,3 +66,29 @@ CRM Team
         html_message=html_message,
         fail_silently=False,
     )
+
+
+def site_visit_schedule_digest(agent, property, visits):
+    """
+    One email listing every visit a bulk schedule gave ``agent`` (``visits``
+    are dicts with date, time and client).
+    """
+    lines = "\n".join(f"- {visit['date'].strftime('%B %d, %Y')} {visit['time']}: {visit['client']}" for visit in visits)
+    plain_message = f"""
+Hi {agent.first_name or agent.username},
+
+{len(visits)} site visit{'s have' if len(visits) != 1 else ' has'} been scheduled and assigned to you at {property.title} ({property.location}):
+
+{lines}
+
+Please ensure you're available for these visits.
+
+Best regards,
+CRM Team
+    """.strip()
+    return EmailMessage(
+        subject=f"{len(visits)} Site Visit{'s' if len(visits) != 1 else ''} Scheduled: {property.title}",
+        body=plain_message,
+        from_email=settings.DEFAULT_FROM_EMAIL,
+        to=[agent.email],
+    )
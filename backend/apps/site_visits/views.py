@@ -3,11 +3,42 @@ from rest_framework import viewsets
 from rest_framework.permissions import IsAuthenticated # Or your preferred permission
 from rest_framework.decorators import action
 from rest_framework.response import Response
+from rest_framework import status
+from calendar import monthrange
+from itertools import groupby
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.http import Http404, StreamingHttpResponse
+from django.urls import reverse
 from django.utils import timezone
-from .models import SiteVisit
-from .serializers import SiteVisitSerializer
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.dateparse import parse_date
+from django.utils.http import quote_etag
+from django.views.decorators.http import require_GET
+from .availability import free_slots
+from .ics import check_feed_token, feed_etag, feed_token, feed_window, stream_feed
+from .models import SiteVisit, format_visit_time, visit_time_zone
+from .scheduling import expand_dates, expand_slots, schedule_visits
+from .serializers import BulkSiteVisitScheduleSerializer, SiteVisitSerializer
+from .stats import agent_workload, visit_summary
+from apps.core.throttling import AdmissionControlMixin
+from apps.leads.permissions import IsAdminOrManagerUser
 
-class SiteVisitViewSet(viewsets.ModelViewSet):
+# Compact projection returned by the calendar endpoint
+CALENDAR_FIELDS = (
+    'id', 'date', 'time', 'start', 'end', 'duration_minutes', 'status',
+    'agent_id', 'agent__first_name', 'agent__last_name', 'agent__username',
+    'property_id', 'property__title',
+    'client_user_id', 'client_user__first_name', 'client_user__last_name', 'client_user__username', 'client_name_manual',
+)
+
+
+def _full_name(row, prefix):
+    name = f"{row[prefix + '__first_name'] or ''} {row[prefix + '__last_name'] or ''}".strip()
+    return name or row[prefix + '__username']
+
+
+class SiteVisitViewSet(AdmissionControlMixin, viewsets.ModelViewSet):
     """
     API endpoint that allows site visits to be viewed or edited.
     """
@@ -16,27 +47,19 @@ class SiteVisitViewSet(viewsets.ModelViewSet):
 
     def get_queryset(self):
         """
-        Optionally override to customize the queryset, e.g., based on user role.
-        Admins/Managers might see all visits, Agents might see only their assigned visits.
+        Admins and managers see every visit; agents only the visits assigned to them.
         """
-        user = self.request.user
-        queryset = SiteVisit.objects.all()
-
-        # Example: If agents should only see their visits (and you have a 'role' on user model)
-        # if hasattr(user, 'role') and user.role == 'agent':
-        #     queryset = queryset.filter(agent=user)
-        # elif hasattr(user, 'role') and user.role == 'manager':
-        #     # Managers might see visits by agents they manage, or all in a region, etc.
-        #     pass # Add manager-specific filtering if needed
-
-        # Optimized queryset
-        return queryset.select_related(
+        return self.scope_queryset(SiteVisit.objects.all()).select_related(
             'property',
             'agent',    # For agent_details
             'client_user' # For client_details
-        ).prefetch_related(
-            'property__images' # Example if Property model has 'images' and it's used
-        ).order_by('-date', '-time')
+        ).order_by('-start', '-date')
+
+    def scope_queryset(self, queryset):
+        user = self.request.user
+        if getattr(user, 'role', None) == 'agent' and not user.is_superuser:
+            queryset = queryset.filter(agent=user)
+        return queryset
 
     def perform_create(self, serializer):
         # The logic for client creation/linking and agent assignment is now robustly
@@ -47,18 +70,32 @@ class SiteVisitViewSet(viewsets.ModelViewSet):
     @action(detail=False, methods=['get'])
     def upcoming(self, request):
         """
-        Returns a short list of the next upcoming site visits.
+        Returns a short list of the next upcoming site visits, with just the
+        fields the reminders and dashboard widgets show.
         """
-        today = timezone.now().date()
+        now = timezone.now()
         
-        # Filter for visits that are from today onwards and are either scheduled or confirmed
-        upcoming_visits = self.get_queryset().filter(
-            date__gte=today,
+        # Filter for visits that haven't started yet and are either scheduled or confirmed
+        rows = self.scope_queryset(SiteVisit.objects.all()).filter(
+            start__gte=now,
             status__in=['scheduled', 'confirmed']
-        ).order_by('date', 'time')[:5]  # Order by ascending date and time, limit to 5
+        ).order_by('start').values(*CALENDAR_FIELDS)[:5]  # Order by start time, limit to 5
 
-        serializer = self.get_serializer(upcoming_visits, many=True)
-        return Response(serializer.data)
+        return Response([
+            {
+                'id': row['id'],
+                'date': row['date'],
+                'time': row['time'],
+                'start': row['start'],
+                'end': row['end'],
+                'status': row['status'],
+                'client_name_manual': row['client_name_manual'],
+                'property_details': {'id': row['property_id'], 'title': row['property__title']},
+                'agent_details': {'id': row['agent_id'], 'full_name': _full_name(row, 'agent')} if row['agent_id'] else None,
+                'client_details': {'id': row['client_user_id'], 'full_name': _full_name(row, 'client_user')} if row['client_user_id'] else None,
+            }
+            for row in rows
+        ])
 
     # You can add perform_update if specific logic is needed during updates,
     # but typically serializer.save() handles it based on instance presence.
@@ -66,24 +103,203 @@ class SiteVisitViewSet(viewsets.ModelViewSet):
     #     serializer.save()
 
     @action(detail=False, methods=['get'])
-    def summary_counts(self, request):
+    def availability(self, request):
         """
-        Returns a summary count of total, pending, and upcoming site visits.
+        Free slots for an agent: ?agent=<id>&days=7&duration=60
+        Agents get their own schedule when no agent is given.
         """
-        queryset = self.get_queryset()
-        today = timezone.now().date()
+        agent_id = request.query_params.get('agent')
+        if not agent_id and getattr(request.user, 'role', None) == 'agent':
+            agent_id = request.user.pk
+        try:
+            agent_id = int(agent_id)
+            days = min(max(int(request.query_params.get('days', 7)), 1), 31)
+            duration = int(request.query_params['duration']) if request.query_params.get('duration') else None
+        except (TypeError, ValueError):
+            return Response({'error': 'agent, days and duration must be integers'}, status=status.HTTP_400_BAD_REQUEST)
+        if not get_user_model().objects.filter(pk=agent_id, role='agent').exists():
+            return Response({'error': 'Agent not found'}, status=status.HTTP_404_NOT_FOUND)
 
-        # Calculate the counts
-        total_visits = queryset.count()
-        
-        # "Pending" visits are those that are either scheduled or confirmed
-        pending_visits = queryset.filter(status__in=['scheduled', 'confirmed']).count()
-        
-        # Upcoming visits are those scheduled for today or any future date
-        upcoming_visits = queryset.filter(date__gte=today).count()
+        tz = visit_time_zone()
+        schedule = free_slots(agent_id, days=days, duration_minutes=duration)
+        return Response({
+            'agent': agent_id,
+            'time_zone': str(tz),
+            'days': [
+                {
+                    'date': day['date'],
+                    'slots': [
+                        {'start': start, 'end': end, 'time': format_visit_time(start.astimezone(tz).time())}
+                        for start, end in day['slots']
+                    ],
+                }
+                for day in schedule
+            ],
+        })
+
+    @action(detail=False, methods=['post'], permission_classes=[IsAuthenticated, IsAdminOrManagerUser],
+            throttle_scope='visit_scheduling')
+    def bulk_schedule(self, request):
+        """
+        Schedule many visits for one property (e.g. an open house): slots
+        from a recurrence (once/daily/weekly) and slot times, up to
+        `capacity` clients per slot, with one agent or auto-assigned agents.
+        Pass dry_run to preview the slot plan without creating anything.
+        """
+        serializer = BulkSiteVisitScheduleSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        data = serializer.validated_data
+        dates = expand_dates(data['start_date'], data['end_date'], data['recurrence'], data.get('weekdays'))
+        duration = data.get('duration_minutes') or getattr(settings, 'SITE_VISIT_DEFAULT_DURATION', 60)
+        slots = expand_slots(dates, data['times'], duration)
+        if not slots:
+            return Response({'error': 'The recurrence produces no slots in that date range'}, status=status.HTTP_400_BAD_REQUEST)
+
+        dry_run = str(request.data.get('dry_run', '')).lower() in ('1', 'true', 'yes')
+        try:
+            report = schedule_visits(
+                data['property'],
+                slots,
+                [(client['name'], client.get('phone') or None, client.get('email') or None) for client in data['clients']],
+                capacity=data['capacity'],
+                agent=data.get('agent'),
+                status=data['status'],
+                duration_minutes=duration,
+                policy=data.get('policy'),
+                dry_run=dry_run,
+            )
+        except Exception as e:
+            print(f"Error in bulk_schedule endpoint: {str(e)}")
+            return Response({'error': 'An error occurred while scheduling the visits'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+        return Response(report, status=status.HTTP_200_OK if dry_run or not report['created'] else status.HTTP_201_CREATED)
+
+    @action(detail=False, methods=['get'])
+    def calendar(self, request):
+        """
+        Visits between ?start= and ?end= (YYYY-MM-DD, inclusive; default the
+        current month), optionally for one ?agent=, grouped per day with a
+        compact projection.
+        """
+        today = timezone.localdate(timezone=visit_time_zone())
+        try:
+            start = parse_date(request.query_params.get('start') or str(today.replace(day=1)))
+            end = parse_date(request.query_params.get('end') or str(today.replace(day=monthrange(today.year, today.month)[1])))
+        except ValueError:
+            start = end = None
+        if start is None or end is None:
+            return Response({'error': 'start and end must be dates (YYYY-MM-DD)'}, status=status.HTTP_400_BAD_REQUEST)
+        longest = getattr(settings, 'SITE_VISIT_CALENDAR_MAX_DAYS', 92)
+        if end < start or (end - start).days >= longest:
+            return Response({'error': f'end must be on or after start and at most {longest} days later'},
+                            status=status.HTTP_400_BAD_REQUEST)
 
+        queryset = self.scope_queryset(SiteVisit.objects.filter(date__range=(start, end)))
+        agent_id = request.query_params.get('agent')
+        if agent_id:
+            try:
+                queryset = queryset.filter(agent_id=int(agent_id))
+            except ValueError:
+                return Response({'error': 'agent must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
+
+        visits = []
+        for row in queryset.order_by('date', 'start', 'pk').values(*CALENDAR_FIELDS):
+            visits.append({
+                'id': row['id'],
+                'date': row['date'],
+                'time': row['time'],
+                'start': row['start'],
+                'end': row['end'],
+                'duration_minutes': row['duration_minutes'],
+                'status': row['status'],
+                'agent': row['agent_id'],
+                'agent_name': _full_name(row, 'agent') if row['agent_id'] else None,
+                'property': row['property_id'],
+                'property_title': row['property__title'],
+                'client_name': (_full_name(row, 'client_user') if row['client_user__username'] else None) or row['client_name_manual'],
+            })
         return Response({
-            'total_visits': total_visits,
-            'pending_visits': pending_visits,
-            'upcoming_visits': upcoming_visits,
-        })
\ No newline at end of file
+            'start': start,
+            'end': end,
+            'time_zone': str(visit_time_zone()),
+            'count': len(visits),
+            'days': [{'date': day, 'visits': list(items)} for day, items in groupby(visits, key=lambda v: v['date'])],
+        })
+
+    @action(detail=False, methods=['get'])
+    def feed_url(self, request):
+        """
+        Subscription URL of an agent's iCalendar feed (?agent=; agents get
+        their own). The URL carries a token, so treat it like a password.
+        """
+        user = request.user
+        agent_id = request.query_params.get('agent')
+        if getattr(user, 'role', None) == 'agent' and not user.is_superuser:
+            if agent_id and str(agent_id) != str(user.pk):
+                return Response({'error': 'Agents can only subscribe to their own visits'}, status=status.HTTP_403_FORBIDDEN)
+            agent_id = user.pk
+        try:
+            agent = get_user_model().objects.get(pk=int(agent_id), role='agent')
+        except (TypeError, ValueError):
+            return Response({'error': 'agent must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
+        except get_user_model().DoesNotExist:
+            return Response({'error': 'Agent not found'}, status=status.HTTP_404_NOT_FOUND)
+
+        path = reverse('site_visits:sitevisit-ics', kwargs={'agent_id': agent.pk})
+        return Response({'agent': agent.pk, 'url': request.build_absolute_uri(f"{path}?token={feed_token(agent)}")})
+
+    @action(detail=False, methods=['get'])
+    def summary_counts(self, request):
+        """
+        Returns total, pending, upcoming, completed, no-show and cancelled
+        counts, the no-show rate and the same counts per agent (see stats.py).
+        """
+        totals, agents = visit_summary(self.scope_queryset(SiteVisit.objects.all()))
+        return Response({
+            'total_visits': totals['total'],
+            'pending_visits': totals['pending'],
+            'upcoming_visits': totals['upcoming'],
+            'completed_visits': totals['completed'],
+            'no_show_visits': totals['no_show'],
+            'cancelled_visits': totals['cancelled'],
+            'no_show_rate': totals['no_show_rate'],
+            'agents': agents,
+        })
+
+    @action(detail=False, methods=['get'])
+    def workload(self, request):
+        """
+        Open leads, open visits and visits in the next ?days= (default 7) per
+        active agent. Agents only see their own row.
+        """
+        try:
+            days = min(max(int(request.query_params.get('days', 7)), 1), 90)
+        except ValueError:
+            return Response({'error': 'days must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
+        user = request.user
+        agent_ids = [user.pk] if getattr(user, 'role', None) == 'agent' and not user.is_superuser else None
+        return Response(agent_workload(agent_ids, days=days))
+
+
+@require_GET
+def agent_calendar_feed(request, agent_id):
+    """
+    Streaming iCalendar feed of one agent's visits for calendar apps. No
+    session or JWT: access is by the token in the URL from feed_url. Polls
+    with If-None-Match get 304 after a single aggregate query.
+    """
+    agent = get_user_model().objects.filter(pk=agent_id, role='agent').first()
+    if agent is None or not check_feed_token(agent, request.GET.get('token')):
+        raise Http404("No such calendar feed")
+
+    window = feed_window()
+    etag = quote_etag(feed_etag(agent.pk, window))
+    not_modified = get_conditional_response(request, etag=etag)
+    if not_modified is None:
+        response = StreamingHttpResponse(stream_feed(agent, window, request.get_host()), content_type='text/calendar; charset=utf-8')
+        response['Content-Disposition'] = f'inline; filename="site-visits-{agent.pk}.ics"'
+    else:
+        response = not_modified
+    response['ETag'] = etag
+    patch_cache_control(response, private=True, max_age=0, must_revalidate=True)
+    return response
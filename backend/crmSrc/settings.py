@@ -32,6 +32,7 @@ INSTALLED_APPS = [
     'apps.leads.apps.LeadsConfig',
     'django_filters',
     'apps.site_visits',
+    'apps.core.apps.CoreConfig',
 ]
 
 MIDDLEWARE = [
@@ -42,9 +43,22 @@ MIDDLEWARE = [
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
-    'django.middleware.clickjacking.XFrameOptionsMiddleware'
+    'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'apps.core.middleware.RequestProfilingMiddleware',
 ]
 
+# Development-only N+1 detector: logs SQL shapes repeated more than this many times per request
+if DEBUG:
+    MIDDLEWARE.append('apps.core.middleware.QueryShapeMiddleware')
+QUERY_SHAPE_REPEAT_THRESHOLD = config('QUERY_SHAPE_REPEAT_THRESHOLD', default=5, cast=int)
+
+# Admin-only request profiling (?_profile=1 or X-Profile: 1 header)
+PROFILING_ENABLED = config('PROFILING_ENABLED', default=True, cast=bool)
+PROFILING_DIR = config('PROFILING_DIR', default=str(BASE_DIR / 'profiles'))
+PROFILING_MAX_FILES = config('PROFILING_MAX_FILES', default=50, cast=int)
+PROFILING_TOP_FUNCTIONS = 40
+PROFILING_EXPLAIN_SLOWEST = 3
+
 AUTH_USER_MODEL = 'accounts.User' 
 
 # CORS Configuration
@@ -81,7 +95,7 @@ CORS_ALLOW_METHODS = [
 # --- REST Framework JWT Cookie Auth ---
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        # Handles both the Authorization header and the access_token cookie
         'apps.accounts.authentication.CookieJWTAuthentication',
     ),
     'DEFAULT_PERMISSION_CLASSES': (
@@ -92,8 +106,99 @@ REST_FRAMEWORK = {
         'rest_framework.parsers.FormParser',
         'rest_framework.parsers.MultiPartParser',
     ),
+    # Only applies to views with a throttle_scope listed in THROTTLE_SCOPES
+    'DEFAULT_THROTTLE_CLASSES': (
+        'apps.core.throttling.TokenBucketThrottle',
+    ),
+    # Reverse proxies in front of the app; X-Forwarded-For is trusted only this
+    # far (0: the client address is REMOTE_ADDR, whatever the header says)
+    'NUM_PROXIES': config('NUM_PROXIES', default=0, cast=int),
 }
 
+# Rate limits and concurrency caps per throttle_scope (see apps/core/throttling.py)
+THROTTLE_ENABLED = config('THROTTLE_ENABLED', default=True, cast=bool)
+THROTTLE_STATE_PATH = config('THROTTLE_STATE_PATH', default=str(BASE_DIR / 'throttle_state.sqlite3'))
+THROTTLE_SCOPES = {
+    'login': {'user': '5/min', 'account': '30/hour', 'ip': '20/min', 'concurrency': 8},
+    'password_reset': {'user': '3/hour', 'account': '10/day', 'ip': '10/hour', 'concurrency': 2},
+    'lead_import': {'user': '10/hour', 'concurrency': 2, 'retry_after': 30},
+    'lead_export': {'user': '20/hour', 'concurrency': 2, 'retry_after': 15},
+    'team_performance': {'user': '30/min', 'concurrency': 4},
+    'user_provisioning': {'user': '10/hour', 'concurrency': 1, 'retry_after': 30},
+    'lead_assignment': {'user': '30/hour', 'concurrency': 1, 'retry_after': 15},
+    'visit_scheduling': {'user': '30/hour', 'concurrency': 2, 'retry_after': 15},
+}
+
+# Bulk user provisioning (apps/accounts/provisioning.py); hash workers default to the CPU count
+USER_PROVISIONING_MAX_ROWS = 1000
+USER_PROVISIONING_HASH_WORKERS = config('USER_PROVISIONING_HASH_WORKERS', default=0, cast=int)
+
+# Seconds the agent roster (/api/users/agents/) is cached
+AGENT_ROSTER_CACHE_TTL = 300
+
+# Automatic agent assignment (apps/accounts/assignment.py). New leads and site
+# visits submitted without an agent are assigned with the default policy.
+ASSIGNMENT_AUTO_ASSIGN = config('ASSIGNMENT_AUTO_ASSIGN', default=True, cast=bool)
+ASSIGNMENT_DEFAULT_POLICY = config('ASSIGNMENT_DEFAULT_POLICY', default='least_loaded')
+ASSIGNMENT_VISIT_WEIGHT = 1  # an open site visit counts as this many open leads
+ASSIGNMENT_AFFINITY_SLACK = 5  # extra load an affinity match may carry over the lightest agent
+ASSIGNMENT_POLICIES = {}  # extra policies: {'name': 'dotted.path.to.PolicyClass'}
+
+# Country code assumed for client phone numbers entered without one (E.164 normalization)
+DEFAULT_PHONE_COUNTRY_CODE = config('DEFAULT_PHONE_COUNTRY_CODE', default='91')
+
+# Site-visit scheduling (apps/site_visits/availability.py). Visit date/time
+# values are wall-clock times in SITE_VISIT_TIME_ZONE.
+SITE_VISIT_TIME_ZONE = config('SITE_VISIT_TIME_ZONE', default='Asia/Kolkata')
+SITE_VISIT_DEFAULT_DURATION = 60  # minutes
+SITE_VISIT_MAX_DURATION = 480  # minutes; bounds the double-booking range scan
+SITE_VISIT_SLOT_MINUTES = 30
+SITE_VISIT_WORKING_HOURS = (9, 19)
+SITE_VISIT_WORKING_DAYS = (0, 1, 2, 3, 4, 5)  # Monday to Saturday
+SITE_VISIT_CALENDAR_MAX_DAYS = 92  # longest range /api/site-visits/calendar/ returns (and bulk schedules span)
+SITE_VISIT_BULK_MAX_VISITS = 500  # clients per bulk schedule request
+SITE_VISIT_ICS_PAST_DAYS = 30  # iCalendar feed window (apps/site_visits/ics.py)
+SITE_VISIT_ICS_FUTURE_DAYS = 365
+
+# Analytics time series (apps/leads/timeseries.py): longest range per bucket, in days
+TIMESERIES_MAX_DAYS = {'day': 366, 'week': 3 * 366, 'month': 10 * 366, 'quarter': 25 * 366}
+
+# Geospatial property search (apps/property/geo.py)
+GEO_DEFAULT_RADIUS_KM = 5  # ?near= without radius_km
+GEO_MAX_RADIUS_KM = 100
+GEO_MAX_RESULTS = 500  # nearest properties ?near= returns
+GEO_MAX_CELLS = 32  # geohash cells a radius/bbox query may scan
+
+# Lead/property matching (apps/property/matching.py)
+MATCHING_WEIGHTS = {'budget': 0.35, 'type': 0.2, 'location': 0.2, 'amenities': 0.1, 'bedrooms': 0.1, 'listing': 0.05}
+MATCHING_DISTANCE_SCALE_KM = 10  # location score falls to 1/e at this distance
+MATCHING_REFRESH_SECONDS = 30  # how often the in-memory indexes look for other processes' changes
+MATCHING_MAX_RESULTS = 100
+
+# Similar properties (apps/property/similarity.py)
+SIMILAR_PROPERTIES_K = 12  # neighbours stored per property; the most /similar/ returns
+SIMILAR_PROPERTIES_CELL_PRECISION = 4  # geohash grid (~39 x 20 km cells) neighbours are looked for in
+# Patch the table after commit on a background thread; False runs it in the request
+SIMILAR_PROPERTIES_BACKGROUND = True
+
+# EMI calculator and affordability screening (apps/property/finance.py)
+EMI_DEFAULT_RATE = 8.5  # annual %, for properties without their own interest_rate
+EMI_DEFAULT_TERM_YEARS = 20
+EMI_MAX_RESULTS = 500  # properties /api/properties/affordable/ returns
+
+# Market statistics (apps/property/stats.py)
+PROPERTY_STATS_MAX_GROUPS = 500  # groups /api/properties/stats/ returns
+
+# Unit holds and bookings (apps/property/units.py)
+UNIT_HOLD_MINUTES = 30  # default hold before it expires back to available
+UNIT_HOLD_MAX_MINUTES = 24 * 60
+UNIT_MAX_PER_REQUEST = 50  # units one hold/book/release may touch
+UNIT_MAX_CREATE = 2000  # units one POST /api/properties/{id}/units/ may add
+
+# Bulk property deletion and archiving (apps/property/removal.py)
+PROPERTY_BULK_BATCH_SIZE = 500  # properties per transaction
+PROPERTY_BULK_MAX_IDS = 10000  # ids one POST /api/properties/bulk/ may name
+
 # --- SimpleJWT settings ---
 SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(minutes=60),
@@ -108,6 +213,28 @@ SIMPLE_JWT = {
     'AUTH_COOKIE_SAMESITE': None,
 }
 
+# How CookieJWTAuthentication resolves the user behind an access token:
+# 'db' (query per request), 'cache' (process-local TTL cache of user rows) or
+# 'claims' (built from token claims; other fields loaded lazily from the cache).
+# Only 'db' sees deactivation and password changes (CHECK_USER_IS_ACTIVE /
+# CHECK_REVOKE_TOKEN) made by another worker at once. 'cache' sees them within
+# AUTH_USER_CACHE_TTL. 'claims' only sees changes made in the same process; a
+# user deactivated or re-passworded elsewhere stays signed in until the access
+# token expires (ACCESS_TOKEN_LIFETIME). Use it only where that is acceptable.
+AUTH_USER_RESOLUTION = config('AUTH_USER_RESOLUTION', default='cache')
+AUTH_USER_CACHE_TTL = config('AUTH_USER_CACHE_TTL', default=60, cast=int)
+
+# Refresh-token blacklist (see apps/accounts/blacklist.py): expired rows are
+# pruned at most every TOKEN_BLACKLIST_PRUNE_INTERVAL seconds per process (0
+# disables; use the prune_token_blacklist command from cron instead), and
+# other processes' blacklistings reach the in-memory filter within
+# TOKEN_BLACKLIST_SYNC_INTERVAL seconds
+TOKEN_BLACKLIST_PRUNE_INTERVAL = config('TOKEN_BLACKLIST_PRUNE_INTERVAL', default=3600, cast=int)
+TOKEN_BLACKLIST_PRUNE_BATCH_SIZE = 5000
+TOKEN_BLACKLIST_SYNC_INTERVAL = config('TOKEN_BLACKLIST_SYNC_INTERVAL', default=5, cast=float)
+TOKEN_BLACKLIST_FILTER_CAPACITY = config('TOKEN_BLACKLIST_FILTER_CAPACITY', default=100000, cast=int)
+TOKEN_BLACKLIST_FILTER_ERROR_RATE = 0.001
+
 # --- CORS settings ---
 CORS_ALLOW_ALL_ORIGINS = False
 CORS_ALLOWED_ORIGINS = config(
@@ -126,7 +253,9 @@ CORS_ALLOW_HEADERS = [
     'user-agent',
     'x-csrftoken',
     'x-requested-with',
+    'x-profile',
 ]
+CORS_EXPOSE_HEADERS = ['X-Profile-Id']
 
 # Frontend URL for password reset links, etc.
 FRONTEND_URL = config('FRONTEND_URL', default='http://localhost:3000')